@@ -0,0 +1,111 @@
+"""Bloom filters kept beside index files for fast negative lookups.
+
+With INDEX_BLOOM_BITS_PER_KEY set, every new index file gets a filter file
+(config.cog_index_filter) holding the keys ever put into it. A lookup the
+filter rules out returns at once, without reading the index slot or the
+store. Deleted keys stay in the filter until compaction rebuilds it, so a
+filter only ever gives false positives.
+
+Once an index has a filter it is kept up to date whatever the setting, so
+it can never miss a key written later; index growth and compaction build
+a new filter for the new index.
+
+File layout (little-endian):
+    [magic 4]'CGBF'  [hashes 4 uint32]  [bits 8 uint64]  [bit array, bits / 8 bytes]
+"""
+
+import math
+import mmap
+import os
+import struct
+
+import xxhash
+
+_MAGIC = b'CGBF'
+_HEADER = struct.Struct('<4sIQ')
+
+
+def _hashes_for(bits_per_key):
+    # k = ln 2 * bits per key minimises the false positive rate.
+    return max(1, int(round(bits_per_key * math.log(2))))
+
+
+class BloomFilter:
+
+    def __init__(self, path, mem, hashes, bits):
+        self.path = path
+        self._mem = mem
+        self.hashes = hashes
+        self.bits = bits
+
+    @classmethod
+    def create(cls, path, expected_keys, bits_per_key):
+        """Write an empty filter sized for *expected_keys* at *path*,
+        replacing any file there, and return it open."""
+        bits = max(64, -(-int(expected_keys * bits_per_key) // 64) * 64)
+        hashes = _hashes_for(bits_per_key)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, _HEADER.size + bits // 8)
+            mem = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(mem, 0, _MAGIC, hashes, bits)
+        return cls(path, mem, hashes, bits)
+
+    @classmethod
+    def open(cls, path):
+        """Open the filter at *path*, or return None if there is none."""
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            return None
+        try:
+            mem = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        magic, hashes, bits = _HEADER.unpack_from(mem, 0)
+        if magic != _MAGIC or len(mem) != _HEADER.size + bits // 8:
+            mem.close()
+            raise ValueError("corrupt Bloom filter file: " + path)
+        return cls(path, mem, hashes, bits)
+
+    def _positions(self, key):
+        h = xxhash.xxh64(key, seed=5).intdigest()
+        h1 = h & 0xffffffff
+        h2 = (h >> 32) | 1
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in range(self.hashes)]
+
+    def add(self, key):
+        """Add *key*. Returns True if it may have been added before, False
+        if it certainly was not."""
+        mem = self._mem
+        present = True
+        for bit in self._positions(key):
+            offset = _HEADER.size + (bit >> 3)
+            mask = 1 << (bit & 7)
+            byte = mem[offset]
+            if not byte & mask:
+                mem[offset] = byte | mask
+                present = False
+        return present
+
+    def might_contain(self, key):
+        mem = self._mem
+        for bit in self._positions(key):
+            if not mem[_HEADER.size + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def bits_per_key(self, expected_keys):
+        return max(1, self.bits // max(1, expected_keys))
+
+    def flush(self):
+        self._mem.flush()
+
+    def close(self):
+        if self._mem is not None:
+            self._mem.flush()
+            self._mem.close()
+            self._mem = None
@@ -0,0 +1,248 @@
+"""
+Persistent catalog of one namespace: its tables, the index files and slot
+capacity of each, a key count, and the names behind hashed predicate
+tables.
+
+Without it every table lookup lists the namespace directory: Cog.list_tables
+after each graph write, every table opened on load for its index files,
+and a graph reopened with thousands of predicates does one edge set lookup
+per predicate to recover their names. The catalog is read once per
+namespace and kept in memory. A table or predicate added to it is appended
+to CATALOG_LOG, one JSON line each, so adding n of them costs O(n) rather
+than n rewrites of the whole catalog; on sync and close the catalog file is
+rewritten with the log folded in and its index details refreshed, and the
+log is removed.
+
+Layout of CATALOG_FILE (JSON):
+    {"version": 1,
+     "tables": {name: {"indexes": [index id, ...], "capacity": slots,
+                       "keys": live key estimate or null,
+                       "compacted_at": time of the last compaction (ns)}},
+     "predicates": {predicate hash: predicate}}
+
+compacted_at is only present once a table has been compacted through
+Cog.compact; point-in-time reads (cog.snapshot) refuse earlier times.
+
+Lines of CATALOG_LOG:
+    {"table": name}  or  {"predicates": {predicate hash: predicate}}
+
+The file is replaced atomically, after merging in what another Cog instance
+may have written to it since it was read. A torn last line of the log, from
+a crash mid-append, is ignored. A namespace without one, such as
+a graph written by an older version or by cog.bulk, has it rebuilt from a
+directory listing on first use. Index ids from the catalog are checked
+against the files before they are trusted (see index_ids), so a table whose
+index was grown or compacted by someone else is still found by listing.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from cog.core import TRANSIENT_FILE_SUFFIXES, STORE_SEGMENT_MARKER
+
+CATALOG_FILE = 'catalog.json'
+CATALOG_LOG = 'catalog.log'
+CATALOG_VERSION = 1
+_TMP_SUFFIX = '.tmp'
+
+
+class Catalog:
+
+    def __init__(self, config, namespace):
+        self.logger = logging.getLogger('cog.catalog')
+        self.config = config
+        self.namespace = namespace
+        self.path = os.path.join(config.cog_data_dir(namespace), CATALOG_FILE)
+        self.log_path = os.path.join(config.cog_data_dir(namespace), CATALOG_LOG)
+        self._lock = threading.Lock()
+        self._tables = {}
+        self.predicates = {}
+        self._dirty = False
+        # Bumped whenever a table is added, so callers holding a table list
+        # can tell it is stale without relisting.
+        self.generation = 0
+        on_disk = self._read()
+        if on_disk is None:
+            self.rebuild()
+        else:
+            self._tables, self.predicates = on_disk
+
+    def _read(self):
+        """(tables, predicates) from CATALOG_FILE and CATALOG_LOG, or None
+        if there is no usable catalog."""
+        log = self._read_log()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            if not log:
+                return None
+            # A new namespace whose catalog was not yet written.
+            data = {'version': CATALOG_VERSION}
+        except (OSError, ValueError) as e:
+            self.logger.warning("ignoring unreadable catalog {}: {}".format(self.path, e))
+            return None
+        if not isinstance(data, dict) or data.get('version') != CATALOG_VERSION:
+            return None
+        tables, predicates = dict(data.get('tables', {})), dict(data.get('predicates', {}))
+        for entry in log:
+            if 'table' in entry:
+                tables.setdefault(entry['table'], {})
+            predicates.update(entry.get('predicates', {}))
+        return tables, predicates
+
+    def _read_log(self):
+        try:
+            with open(self.log_path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break  # torn by a crash mid-append
+        return entries
+
+    def _append(self, entry):
+        """Append one entry to CATALOG_LOG and mark the catalog dirty."""
+        self._dirty = True
+        if not os.path.isdir(os.path.dirname(self.log_path)):
+            return  # namespace removed, e.g. by Graph.drop
+        with self._lock:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(entry, separators=(',', ':'), sort_keys=True) + '\n')
+
+    def rebuild(self):
+        """Recover the table list and index ids from the namespace directory.
+        Predicate names are not in the file names; they are filled in by
+        add_predicate as the graph finds them."""
+        tables = {}
+        ns_dir = self.config.cog_data_dir(self.namespace)
+        if os.path.isdir(ns_dir):
+            for fname in os.listdir(ns_dir):
+                if fname.endswith(TRANSIENT_FILE_SUFFIXES) or STORE_SEGMENT_MARKER in fname:
+                    continue
+                if self.config.STORE in fname:
+                    tables.setdefault(fname.split(self.config.STORE, 1)[0], {})
+                elif self.config.INDEX in fname:
+                    entry = tables.setdefault(self.config.get_table_name(fname), {})
+                    entry.setdefault('indexes', []).append(self.config.index_id(fname))
+        for entry in tables.values():
+            if 'indexes' in entry:
+                entry['indexes'].sort()
+        self._tables = tables
+        self.generation += 1
+        if tables:
+            self.logger.info("rebuilt catalog of {} with {} tables".format(self.namespace, len(tables)))
+            self._dirty = True
+            self.save()
+
+    def tables(self):
+        return list(self._tables)
+
+    def __contains__(self, name):
+        return name in self._tables
+
+    def add_table(self, name):
+        """Record a table, appending it to the log if it is new."""
+        if name not in self._tables:
+            self._tables[name] = {}
+            self.generation += 1
+            self._append({'table': name})
+
+    def add_predicate(self, predicate_hashed, predicate):
+        """Record the predicate behind a hashed predicate table, appending
+        it to the log if it is new."""
+        self.add_predicates({predicate_hashed: predicate})
+
+    def add_predicates(self, predicates):
+        """add_predicate for a dict of predicate hash -> predicate, with at
+        most one append."""
+        new = {}
+        for predicate_hashed, predicate in predicates.items():
+            if self.predicates.get(predicate_hashed) != predicate:
+                self.predicates[predicate_hashed] = new[predicate_hashed] = predicate
+        if new:
+            self._append({'predicates': new})
+
+    def index_ids(self, name, instance_id):
+        """The ids of *name*'s index files, or None if they are unknown or
+        the files no longer match: one of them is missing, or the table has
+        an index past the last recorded one. A table that is neither in the
+        catalog nor on disk has none."""
+        if name not in self._tables:
+            if not os.path.exists(self.config.cog_store(self.namespace, name, instance_id)):
+                return []
+            return None
+        ids = self._tables[name].get('indexes')
+        if not ids:
+            return None
+        for index_id in ids + [ids[-1] + 1]:
+            exists = os.path.exists(self.config.cog_index(self.namespace, name, instance_id, index_id))
+            if exists != (index_id in ids):
+                return None
+        return list(ids)
+
+    def update_table(self, table):
+        """Take the index ids, live capacity and key count of an open
+        table. Only marks the catalog dirty; see save."""
+        indexer = table.indexer
+        counts = [idx.key_count for idx in indexer.index_list]
+        entry = {
+            'indexes': sorted(idx.index_id for idx in indexer.index_list),
+            'capacity': indexer.live_index.capacity,
+            'keys': None if None in counts else sum(counts),
+        }
+        name = table.table_meta.name
+        compacted_at = self.compacted_at(name)
+        if compacted_at is not None:
+            entry['compacted_at'] = compacted_at
+        if self._tables.get(name) != entry:
+            self._tables[name] = entry
+            self._dirty = True
+
+    def compacted_at(self, name):
+        """When *name* was last compacted (nanoseconds since the epoch), or
+        None if it never was."""
+        return self._tables.get(name, {}).get('compacted_at')
+
+    def set_compacted_at(self, name, timestamp):
+        """Record a compaction of *name* and write the catalog."""
+        self._tables.setdefault(name, {})['compacted_at'] = timestamp
+        self._dirty = True
+        self.save()
+
+    def save(self):
+        """Write the catalog if it changed, merged with the file and log on
+        disk, and remove the log."""
+        with self._lock:
+            if not self._dirty:
+                return
+            on_disk = self._read()
+            if on_disk is not None:
+                tables, predicates = on_disk
+                for name, entry in tables.items():
+                    if name not in self._tables:
+                        self.generation += 1
+                    if not self._tables.get(name):
+                        self._tables[name] = entry
+                    elif entry.get('compacted_at', 0) > self._tables[name].get('compacted_at', 0):
+                        self._tables[name]['compacted_at'] = entry['compacted_at']
+                for predicate_hashed, predicate in predicates.items():
+                    self.predicates.setdefault(predicate_hashed, predicate)
+            if not os.path.isdir(os.path.dirname(self.path)):
+                return  # namespace removed, e.g. by Graph.drop
+            data = {'version': CATALOG_VERSION, 'tables': self._tables, 'predicates': self.predicates}
+            tmp = self.path + _TMP_SUFFIX
+            with open(tmp, 'w') as f:
+                json.dump(data, f, separators=(',', ':'), sort_keys=True)
+            os.replace(tmp, self.path)
+            try:
+                os.remove(self.log_path)
+            except FileNotFoundError:
+                pass
+            self._dirty = False
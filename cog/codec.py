@@ -6,12 +6,27 @@ int64 ns timestamp.
 Spindle layout:
 
     File header (offset 0, 23 bytes):
-        [magic 6]'COGDB\\x00'  [version 1]0x02  [created_at 8 int64 LE]  [reserved 8 zeros]
+        [magic 6]'COGDB\\x00'  [version 1]0x02  [created_at 8 int64 LE]  [data_end 8 int64 LE]
+
+    data_end is 0 unless the file was preallocated past its records (see
+    STORE_EXTENT_BYTES): then the records end at or after data_end and are
+    followed by zeros. No record has a zero key_link (it is -1 or a link),
+    so the real end is found by stepping over records from data_end. Files written before
+    data_end existed have zeros there.
 
     Record (little-endian, no separators):
         [key_link 8 int64]  [value_type 1]  [timestamp 8 int64]
         [value_len varint 1..5]  [payload N bytes spindle_pack (key,value)]
-        [value_link 8 int64]   -- only if value_type is list (0x01) or set (0x02)
+        [value_link 8 int64]   -- only if value_type is list (0x01), set (0x02)
+                                  or removal (0x04)
+
+    value_type 0x03 is a deletion marker: the key was deleted at the record's
+    timestamp. Markers are appended but never indexed; sequential readers of
+    the store (e.g. cog.snapshot) use them to tell when a key went away.
+
+    value_type 0x04 is a removal (tombstone) in a list's value chain: its
+    values no longer belong to the list from the records it links to (see
+    Cog.remove_value). Compaction drops removals and the values they remove.
 
 The payload uses cog.spindle_pack. Payloads are length-addressable via the outer value_len varint; spindle_pack does not
 carry its own length field for the fast-path value.
@@ -25,7 +40,7 @@ Varint scheme (little-endian):
 import struct
 import time
 
-from cog.spindle_pack import _encode_varint, _decode_varint, packb, unpackb
+from cog.spindle_pack import _encode_varint, _decode_varint, packb, unpackb, unpack_key_from
 
 # Lazy import to avoid circular dependency at module load time.
 # Resolved on first call to SpindleCodec.decode_at().
@@ -35,13 +50,20 @@ _Record = None
 V2_MAGIC = b'COGDB\x00'
 V2_VERSION = 0x02 # V2 = Spindle. Older versions are V0, V1 (no special naming)
 V2_HEADER_SIZE = 23
+V2_DATA_END_OFFSET = 15
 
 V2_VALUE_TYPE_STR = 0x00
 V2_VALUE_TYPE_LIST = 0x01
 V2_VALUE_TYPE_SET = 0x02
+V2_VALUE_TYPE_DELETED = 0x03
+V2_VALUE_TYPE_REMOVED = 0x04
 
-_V2_BYTE_TO_CHAR = {V2_VALUE_TYPE_STR: 's', V2_VALUE_TYPE_LIST: 'l', V2_VALUE_TYPE_SET: 'u'}
-_V2_CHAR_TO_BYTE = {'s': V2_VALUE_TYPE_STR, 'l': V2_VALUE_TYPE_LIST, 'u': V2_VALUE_TYPE_SET}
+_V2_BYTE_TO_CHAR = {V2_VALUE_TYPE_STR: 's', V2_VALUE_TYPE_LIST: 'l', V2_VALUE_TYPE_SET: 'u',
+                    V2_VALUE_TYPE_DELETED: 'd', V2_VALUE_TYPE_REMOVED: 'r'}
+_V2_CHAR_TO_BYTE = {'s': V2_VALUE_TYPE_STR, 'l': V2_VALUE_TYPE_LIST, 'u': V2_VALUE_TYPE_SET,
+                    'd': V2_VALUE_TYPE_DELETED, 'r': V2_VALUE_TYPE_REMOVED}
+# Value types whose records end with a value_link.
+_V2_CHAINED = ('l', 'u', 'r')
 
 
 # Varint tag -> number of extra bytes after the tag.
@@ -94,7 +116,7 @@ class SpindleCodec:
         payload = packb(record.key, record.value)
         varint = _encode_varint(len(payload))
 
-        has_vlink = record.value_type in ('l', 'u')
+        has_vlink = record.value_type in _V2_CHAINED
         total = 17 + len(varint) + len(payload) + (8 if has_vlink else 0)
         out = bytearray(total)
 
@@ -133,7 +155,7 @@ class SpindleCodec:
 
         value_link = _Record.VALUE_LINK_NULL
         end = payload_end
-        if value_type == 'l' or value_type == 'u':
+        if value_type in _V2_CHAINED:
             value_link = struct.unpack_from('<q', buf, payload_end)[0]
             end = payload_end + 8
 
@@ -142,6 +164,44 @@ class SpindleCodec:
         rec.timestamp = timestamp
         return rec, end
 
+    def peek_key_at(self, buf, offset):
+        """Return (key, key_link) of the record at *offset*, decoding the key
+        in place: the payload is not copied and the value is not decoded.
+        Lets a chain walk compare keys without building a Record."""
+        key_link = struct.unpack_from('<q', buf, offset)[0]
+        if buf[offset + 8] not in _V2_BYTE_TO_CHAR:
+            raise ValueError("unknown value type at offset " + str(offset))
+        value_len, varint_size = _decode_varint(buf, offset + 17)
+        payload_start = offset + 17 + varint_size
+        key, key_end = unpack_key_from(buf, payload_start)
+        if key_end > payload_start + value_len:
+            raise ValueError("key overruns the record payload at offset " + str(offset))
+        return key, key_link
+
+    def peek_header_at(self, buf, offset):
+        """Return (key, value_type, timestamp, end) of the record at
+        *offset*, where end is the offset of the next record. Like
+        peek_key_at, only the key is decoded; used for sequential scans."""
+        value_type = _V2_BYTE_TO_CHAR.get(buf[offset + 8])
+        if value_type is None:
+            raise ValueError("unknown value type at offset " + str(offset))
+        timestamp = struct.unpack_from('<q', buf, offset + 9)[0]
+        value_len, varint_size = _decode_varint(buf, offset + 17)
+        payload_start = offset + 17 + varint_size
+        end = payload_start + value_len
+        key, key_end = unpack_key_from(buf, payload_start)
+        if key_end > end:
+            raise ValueError("key overruns the record payload at offset " + str(offset))
+        if value_type in _V2_CHAINED:
+            end += 8
+        if end > len(buf):
+            raise ValueError("truncated record at offset " + str(offset))
+        return key, value_type, timestamp, end
+
+    def key_link_at(self, buf, offset):
+        """Return only the key_link field of the record at *offset*."""
+        return struct.unpack_from('<q', buf, offset)[0]
+
     def read_record(self, fh):
         # Fixed 17 bytes: key_link(8) + value_type(1) + timestamp(8)
         header = _read_exactly(fh, 17)
@@ -176,7 +236,7 @@ class SpindleCodec:
             return None
 
         tail = b''
-        if value_type in ('l', 'u'):
+        if value_type in _V2_CHAINED:
             vl = _read_exactly(fh, 8)
             if vl is None or len(vl) < 8:
                 return None
@@ -0,0 +1,406 @@
+"""Store compaction for CogDB tables.
+
+Stores are append-only: updates, re-linked set members, edge rewrites and
+index deletes all leave dead records behind. compact_table rewrites a table's
+store with only the records reachable from its index, rebuilds the index for
+the new positions and swaps the new files in.
+
+Usage:
+    from cog.compaction import compact_table
+    report = compact_table(table)
+
+Records are written bucket by bucket in index slot order, and each list/set
+value chain is written contiguously right before its head record, so a
+collision chain walk or a value chain load touches neighbouring pages.
+Record timestamps are preserved. Superseded versions are dropped.
+A segmented store (STORE_SEGMENT_BYTES) is rewritten into new segments.
+Value chains are repacked into segments of up to ADJACENCY_SEGMENT_SIZE
+values per record; a segment takes the newest timestamp of the values it
+holds. Removal records (see Cog.remove_value) are dropped with the values
+they remove, and a list they emptied with its key.
+The index's key filter (see cog.bloom) is rebuilt from the live keys.
+
+Compaction can run while the table is in use. Pass the lock that the
+table's writers hold (e.g. Graph._lock) and compact_table only takes it to
+start tracking writes and for the final cut-over; the copy itself runs
+unlocked. Keys written or deleted during the copy are replayed from the old
+files into the new ones before they are swapped in. Without a lock the
+caller must make sure nothing reads or writes the table while it runs.
+
+Background compaction:
+    thread = CompactionThread(cog, namespace, lock)
+    thread.start()
+    ...
+    thread.join()
+    thread.report  # or thread.error
+"""
+
+import contextlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from cog.bloom import BloomFilter
+from cog.codec import SpindleCodec
+from cog.core import (
+    Record,
+    COMPACT_TMP_SUFFIX,
+    COMPACT_BACKUP_SUFFIX,
+    _key_hash,
+    _fingerprint,
+    _pack_link,
+    _POSITION_MASK,
+    _SEGMENT_SHIFT,
+    segment_path,
+)
+from cog.migrate import _swap_files
+
+_I64 = struct.Struct('<q')
+
+logger = logging.getLogger(__name__)
+
+
+def _live_heads(indexer, store):
+    """Yield (key_hash, head record) for every live key, in slot order.
+
+    When a table has more than one index file the first index holding a key
+    wins, matching Indexer.get.
+    """
+    seen = set() if len(indexer.index_list) > 1 else None
+    for index in indexer.index_list:
+        block_len = index._block_len
+        db_mem = index.db_mem
+        mem_len = len(db_mem)
+        for slot in range(0, mem_len - block_len + 1, block_len):
+            link = _I64.unpack_from(db_mem, slot)[0]
+            if link == 0:
+                continue
+            while link != Record.RECORD_LINK_NULL:
+                record = store.read(link & _POSITION_MASK)
+                if record is None:
+                    break
+                link = record.key_link
+                if seen is not None:
+                    if record.key in seen:
+                        continue
+                    seen.add(record.key)
+                yield _key_hash(record.key), record
+
+
+def _value_chain(head, store):
+    """Records of a list/set value chain, oldest first, head last."""
+    chain = [head]
+    value_link = head.value_link
+    while value_link != Record.VALUE_LINK_NULL:
+        record = store.read(value_link)
+        chain.append(record)
+        value_link = record.value_link
+    chain.reverse()
+    return chain
+
+
+def _packed_chain(head, store, segment_size):
+    """A list/set value chain repacked into segment records, oldest first,
+    head last, without removals and the values they remove; empty if they
+    removed everything. Records are unlinked; values in a segment are
+    newest first."""
+    values = []
+    removed = set()
+    value_type = 'l'
+    # Newest first, so each removal is met before the values it removes.
+    for member in reversed(_value_chain(head, store)):
+        member_values = member.value if type(member.value) is list else [member.value]
+        if member.value_type == 'r':
+            removed.update(member_values)
+            continue
+        value_type = member.value_type
+        values.extend((value, member.timestamp) for value in member_values if value not in removed)
+    # Oldest first overall.
+    values.reverse()
+    segments = []
+    for start in range(0, len(values), segment_size):
+        chunk = values[start:start + segment_size]
+        segment = [value for value, _ in reversed(chunk)]
+        timestamps = [timestamp for _, timestamp in chunk if timestamp is not None]
+        segments.append(Record(head.key, segment if len(segment) > 1 else segment[0],
+                               value_type=value_type,
+                               timestamp=max(timestamps) if timestamps else None))
+    return segments
+
+
+class _StoreWriter:
+    """Sequential writer for a new store at *path*. With *segment_bytes*
+    it rolls over to a new segment file, as Store does; segment n is
+    written to segment_path(path, n) + *suffix*."""
+
+    def __init__(self, path, codec, segment_bytes=0, suffix=''):
+        self.path = path
+        self.codec = codec
+        self.segment_bytes = segment_bytes
+        self.suffix = suffix
+        self.paths = []
+        self.size = 0
+        self.file = None
+        self._open_segment()
+
+    def _open_segment(self):
+        if self.file is not None:
+            self._close_file()
+        path = segment_path(self.path, len(self.paths)) + self.suffix
+        self.paths.append(path)
+        self.file = open(path, 'wb')
+        self.codec.write_header(self.file)
+        self.base = (len(self.paths) - 1) << _SEGMENT_SHIFT
+        self.offset = self.codec.HEADER_SIZE
+        self.size += self.codec.HEADER_SIZE
+
+    def write(self, record):
+        data = self.codec.encode_record(record)
+        if self.segment_bytes and self.offset > self.codec.HEADER_SIZE \
+                and self.offset + len(data) > self.segment_bytes:
+            self._open_segment()
+        position = self.base + self.offset
+        self.file.write(data)
+        self.offset += len(data)
+        self.size += len(data)
+        return position
+
+    def _close_file(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    def close(self):
+        self._close_file()
+
+
+def _new_index(path, capacity, block_len):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, capacity * block_len)
+        return mmap.mmap(fd, 0)
+    finally:
+        os.close(fd)
+
+
+def _copy_record(record, store, key_link, write, segment_size):
+    """Copy a head record read from *store*, and its value chain packed into
+    segments oldest first, via *write*. Returns the position of the copied
+    head, or None if removals emptied its list and nothing was written."""
+    if record.value_type not in ('l', 'u', 'r'):
+        return write(Record(record.key, record.value, value_type=record.value_type, key_link=key_link,
+                            timestamp=record.timestamp))
+    segments = _packed_chain(record, store, segment_size)
+    if not segments:
+        return None
+    value_link = Record.VALUE_LINK_NULL
+    for segment in segments[:-1]:
+        segment.value_link = value_link
+        value_link = write(segment)
+    head = segments[-1]
+    head.key_link = key_link
+    head.value_link = value_link
+    return write(head)
+
+
+def _replay_dirty_keys(dirty_keys, old_indexer, old_store, table, segment_size):
+    """Bring keys touched during the copy phase up to date in the new files."""
+    store = table.store
+    for key in dirty_keys:
+        # A key relinked mid-copy can have been copied twice; drop every copy.
+        copied = False
+        while table.indexer.delete(key, store):
+            copied = True
+        head, _ = old_indexer.get_head_only(key, old_store)
+        if head is None:
+            if copied:
+                # Deleted during the copy: mark it so store scans
+                # (cog.snapshot, cog.repair) do not see the copy as live.
+                store.save_deletion(key)
+            continue
+        if head.value_type not in ('l', 'u', 'r'):
+            table.indexer.put_record(Record(key, head.value, value_type=head.value_type),
+                                     store, timestamp=head.timestamp)
+            continue
+        segments = _packed_chain(head, old_store, segment_size)
+        if not segments:
+            if copied:
+                store.save_deletion(key)
+            continue
+        value_link = Record.VALUE_LINK_NULL
+        for segment in segments[:-1]:
+            segment.value_link = value_link
+            value_link = store.save(segment, timestamp=segment.timestamp)
+        segments[-1].value_link = value_link
+        table.indexer.put_record(segments[-1], store, timestamp=segments[-1].timestamp)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def compact_table(table, lock=None, on_cutover=None):
+    """Rewrite *table*'s store with only its live records and rebuild its index.
+
+    lock: held by everything that writes to the table; when given, writers
+        keep running during the copy and only wait for the cut-over.
+    on_cutover: called with the table, under the lock, once the compacted
+        files are live.
+
+    Returns a dict with keys:
+        table (str): table name
+        live_keys (int): keys in the compacted table
+        records_written (int): records in the compacted store
+        bytes_before (int): store file size before compaction
+        bytes_after (int): store file size after compaction
+        bytes_reclaimed (int): bytes_before - bytes_after
+        compacted_at (int): cut-over time, in nanoseconds since the epoch;
+            the table has no history from before it
+    """
+    if lock is None:
+        lock = contextlib.nullcontext()
+    with lock:
+        table.sync()
+        store = table.store
+        indexer = table.indexer
+        live_index = indexer.live_index
+        indexer.track_dirty_keys()
+    block_len = live_index._block_len
+    capacity = live_index.capacity
+    store_path = store.store
+    index_path = live_index.name
+    bytes_before = store.size()
+    segment_size = table.config.ADJACENCY_SEGMENT_SIZE
+
+    filter_path = live_index.filter_name
+    key_filter = None
+    # The key filter is rebuilt from the live keys, dropping deleted ones;
+    # a table compacted with INDEX_BLOOM_BITS_PER_KEY set gains one.
+    bits_per_key = table.config.INDEX_BLOOM_BITS_PER_KEY
+    if not bits_per_key and live_index.key_filter is not None:
+        bits_per_key = live_index.key_filter.bits_per_key(capacity)
+    if bits_per_key:
+        key_filter = BloomFilter.create(filter_path + COMPACT_TMP_SUFFIX, capacity, bits_per_key)
+
+    writer = _StoreWriter(store_path, SpindleCodec(created_at=store.created_at),
+                          table.config.STORE_SEGMENT_BYTES, COMPACT_TMP_SUFFIX)
+    slots = _new_index(index_path + COMPACT_TMP_SUFFIX, capacity, block_len)
+    live_keys = 0
+    records_written = 0
+    try:
+        for key_hash, head in _live_heads(indexer, store):
+            slot = block_len * (key_hash % capacity)
+            key_link = _I64.unpack_from(slots, slot)[0] or Record.RECORD_LINK_NULL
+            written = [0]
+
+            def write(record):
+                written[0] += 1
+                return writer.write(record)
+            position = _copy_record(head, store, key_link, write, segment_size)
+            if position is None:
+                continue
+            if key_filter is not None:
+                key_filter.add(head.key)
+            slots[slot:slot + block_len] = _I64.pack(_pack_link(_fingerprint(key_hash), position))
+            live_keys += 1
+            records_written += written[0]
+        slots.flush()
+    except BaseException:
+        indexer.stop_tracking_dirty_keys()
+        slots.close()
+        writer.close()
+        for path in writer.paths:
+            _remove_quietly(path)
+        _remove_quietly(index_path + COMPACT_TMP_SUFFIX)
+        if key_filter is not None:
+            key_filter.close()
+            _remove_quietly(filter_path + COMPACT_TMP_SUFFIX)
+        raise
+    slots.close()
+    writer.close()
+    if key_filter is not None:
+        key_filter.close()
+
+    with lock:
+        dirty_keys = indexer.stop_tracking_dirty_keys()
+        if table.indexer is not indexer or table.store is not store or indexer.live_index is not live_index:
+            for path in writer.paths:
+                _remove_quietly(path)
+            _remove_quietly(index_path + COMPACT_TMP_SUFFIX)
+            _remove_quietly(filter_path + COMPACT_TMP_SUFFIX)
+            raise RuntimeError("Table %s was reopened during compaction" % table.table_meta.name)
+        table.sync()
+        extra_indexes = [index for index in indexer.index_list if index is not live_index]
+        # Renaming under open files is fine on POSIX: the old objects keep
+        # reading the old inodes until they are closed after the replay.
+        old_segments = store.segments()
+        for segment in range(max(old_segments, len(writer.paths))):
+            path = segment_path(store_path, segment)
+            if segment < old_segments:
+                os.replace(path, path + COMPACT_BACKUP_SUFFIX)
+            if segment < len(writer.paths):
+                os.replace(path + COMPACT_TMP_SUFFIX, path)
+        if key_filter is not None:
+            os.replace(filter_path + COMPACT_TMP_SUFFIX, filter_path)
+        _swap_files(index_path, COMPACT_TMP_SUFFIX, COMPACT_BACKUP_SUFFIX)
+        for index in extra_indexes:
+            os.remove(index.name)
+            if index.key_filter is not None:
+                os.remove(index.filter_name)
+        old_indexer, old_store = table.reopen(close=False)
+        table.indexer.live_index.key_count = live_keys
+        try:
+            _replay_dirty_keys(dirty_keys, old_indexer, old_store, table, segment_size)
+        finally:
+            old_indexer.close()
+            old_store.close()
+        table.sync()
+        for segment in range(old_segments):
+            os.remove(segment_path(store_path, segment) + COMPACT_BACKUP_SUFFIX)
+        os.remove(index_path + COMPACT_BACKUP_SUFFIX)
+        compacted_at = time.time_ns()
+        if on_cutover is not None:
+            on_cutover(table)
+        bytes_after = table.store.size()
+
+    return {
+        'table': table.table_meta.name,
+        'live_keys': live_keys,
+        'records_written': records_written,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'bytes_reclaimed': bytes_before - bytes_after,
+        'compacted_at': compacted_at,
+    }
+
+
+class CompactionThread(threading.Thread):
+    """Compacts a namespace with Cog.compact on a daemon thread.
+
+    After join(), report holds the Cog.compact result, or error the
+    exception that stopped it.
+    """
+
+    def __init__(self, cog, namespace, lock, on_cutover=None, tables=None):
+        super().__init__(name="cog-compaction-%s" % namespace, daemon=True)
+        self.cog = cog
+        self.namespace = namespace
+        self.lock = lock
+        self.on_cutover = on_cutover
+        self.tables = tables
+        self.report = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.report = self.cog.compact(self.namespace, tables=self.tables, lock=self.lock,
+                                           on_cutover=self.on_cutover)
+        except Exception as e:
+            self.error = e
+            logger.error("Compaction of %s failed: %s", self.namespace, e)
@@ -22,10 +22,24 @@ class CogConfig:
         self.INDEX = INDEX
         self.INDEX_BLOCK_LEN = INDEX_BLOCK_LEN
         self.INDEX_CAPACITY = INDEX_CAPACITY
+        self.INDEX_MAX_LOAD_FACTOR = INDEX_MAX_LOAD_FACTOR
+        self.INDEX_FILTER = INDEX_FILTER
+        self.INDEX_BLOOM_BITS_PER_KEY = INDEX_BLOOM_BITS_PER_KEY
+        self.GROUP_COMMIT_INTERVAL_MS = GROUP_COMMIT_INTERVAL_MS
+        self.GROUP_COMMIT_BYTES = GROUP_COMMIT_BYTES
+        self.ADJACENCY_SEGMENT_SIZE = ADJACENCY_SEGMENT_SIZE
         self.STORE_READ_BUFFER_SIZE = STORE_READ_BUFFER_SIZE
         self.LEVEL_2_CACHE_SIZE = LEVEL_2_CACHE_SIZE
+        self.STORE_CACHE_POLICY = STORE_CACHE_POLICY
+        self.STORE_CACHE_BYTES = STORE_CACHE_BYTES
+        self.STORE_SEGMENT_BYTES = STORE_SEGMENT_BYTES
+        self.STORE_EXTENT_BYTES = STORE_EXTENT_BYTES
+        self.SCAN_ORDER = SCAN_ORDER
+        self.MAX_CACHE_BYTES = MAX_CACHE_BYTES
         self.GRAPH_NODE_SET_TABLE_NAME = GRAPH_NODE_SET_TABLE_NAME
         self.GRAPH_EDGE_SET_TABLE_NAME = GRAPH_EDGE_SET_TABLE_NAME
+        self.GRAPH_VERTEX_DICTIONARY_TABLE_NAME = GRAPH_VERTEX_DICTIONARY_TABLE_NAME
+        self.VERTEX_DICTIONARY_CACHE_SIZE = VERTEX_DICTIONARY_CACHE_SIZE
         self.EMBEDDING_SET_TABLE_NAME = EMBEDDING_SET_TABLE_NAME
         self.CUSTOM_COG_DB_PATH = CUSTOM_COG_DB_PATH
         self.RELAY_URL = RELAY_URL
@@ -62,6 +76,9 @@ class CogConfig:
     def cog_index(self, db_name, table_name, instance_id, index_id):
         return "/".join([self.cog_db_path(), db_name, f"{table_name}{self.INDEX}{instance_id}-{index_id}"])
 
+    def cog_index_filter(self, db_name, table_name, instance_id, index_id):
+        return "/".join([self.cog_db_path(), db_name, f"{table_name}{self.INDEX_FILTER}{instance_id}-{index_id}"])
+
     def get_table_name(self, index_file_name):
         return index_file_name.split(self.INDEX)[0]
 
@@ -86,12 +103,26 @@ STORE="-store-"
 INDEX="-index-"
 INDEX_BLOCK_LEN = 8
 INDEX_CAPACITY = 100003 # must be a prime number
+INDEX_MAX_LOAD_FACTOR = 0.75 # keys per slot before the index is rehashed into a larger one, 0 disables growth
+INDEX_FILTER="-bloom-"
+INDEX_BLOOM_BITS_PER_KEY = 0 # Bloom filter bits per index slot kept beside new index files (see cog.bloom), e.g. 10; 0 = off
+GROUP_COMMIT_INTERVAL_MS = 10 # fsync-group durability: longest a write waits for its fsync
+GROUP_COMMIT_BYTES = 1048576 # fsync-group durability: commit early once this many bytes are pending
+ADJACENCY_SEGMENT_SIZE = 512 # most values packed into one list/set record by batch writes and compaction
 STORE_READ_BUFFER_SIZE = 512
 LEVEL_2_CACHE_SIZE = 100000
+STORE_CACHE_POLICY = "lru" # per-store record cache: "lru", or "slru" to keep records hit twice safe from scans
+STORE_CACHE_BYTES = None # per-store record cache budget in bytes; None caps it at 100000 records instead
+STORE_SEGMENT_BYTES = 0 # roll a store over to a new segment file once its tail segment would outgrow this (at most 64 GiB); 0 = one file
+STORE_EXTENT_BYTES = 0 # grow a store's tail file this many bytes at a time and map it ahead, so reads after writes rarely remap; 0 = grow per write
+SCAN_ORDER = "slot" # full table scans: "slot" walks index slots, "physical" reads live records in store file order
+MAX_CACHE_BYTES = None # one budget shared by every cache in the process (see cog.memory_governor); None = off
 
 ''' TORQUE '''
 GRAPH_NODE_SET_TABLE_NAME = 'TOR_NODE_SET'
 GRAPH_EDGE_SET_TABLE_NAME = 'TOR_EDGE_SET'
+GRAPH_VERTEX_DICTIONARY_TABLE_NAME = 'TOR_VERTEX_DICT'
+VERTEX_DICTIONARY_CACHE_SIZE = 100000 # vertices a vertex dictionary keeps cached; MAX_CACHE_BYTES budgets it instead when set
 EMBEDDING_SET_TABLE_NAME = 'EMBEDDING_SET'
 
 ''' CUSTOM COG DB PATH '''
@@ -144,6 +175,10 @@ def cog_index(db_name, table_name, instance_id, index_id):
     return "/".join(cog_context()[0:-2]+[db_name,table_name+INDEX+instance_id+"-"+str(index_id)])
 
 
+def cog_index_filter(db_name, table_name, instance_id, index_id):
+    return "/".join(cog_context()[0:-2]+[db_name,table_name+INDEX_FILTER+instance_id+"-"+str(index_id)])
+
+
 def get_table_name(index_file_name):
     return index_file_name.split(INDEX)[0]
 
@@ -1,3 +1,6 @@
+import array
+import contextlib
+import math
 import mmap
 import struct
 import os
@@ -10,9 +13,17 @@ import queue
 from cog.store_cache import StoreCache
 from cog.codec import (
     SpindleCodec,
+    V2_DATA_END_OFFSET,
+    V2_VALUE_TYPE_LIST,
+    V2_VALUE_TYPE_REMOVED,
+    V2_VALUE_TYPE_SET,
     detect_codec,
 )
+from cog.spindle_pack import _decode_varint
 from cog.config import INDEX_BLOCK_LEN as _DEFAULT_INDEX_BLOCK_LEN
+from cog.durability import DURABILITY_NONE, DURABILITY_OS_BUFFER, DURABILITY_FSYNC_GROUP, group_committer
+from cog.memory_governor import memory_governor
+from cog.bloom import BloomFilter
 import xxhash
 
 # Zero-byte sentinel for new indexes: ftruncate provides these for free.
@@ -24,6 +35,51 @@ _I64 = struct.Struct('<q')
 _i64_pack = _I64.pack
 _i64_unpack_from = _I64.unpack_from
 
+# Slots of the old index whose keys each write moves into the new one while
+# an index grows (see Indexer.grow). At least two per write, so the old
+# index is emptied before the new one, twice its size, fills up in turn.
+GROW_SLOTS_PER_WRITE = 4
+
+# Suffixes of the files written and replaced by cog.compaction.
+COMPACT_TMP_SUFFIX = '.compact_tmp'
+COMPACT_BACKUP_SUFFIX = '.compact_backup'
+
+# Suffix of the index and filter files being rebuilt by cog.repair.
+REPAIR_TMP_SUFFIX = '.repair_tmp'
+
+# Work files that share a table's file name prefix but are not live index or
+# store files; directory scans must skip them.
+TRANSIENT_FILE_SUFFIXES = ('.v3_backup', '.v4_tmp', COMPACT_TMP_SUFFIX,
+                           COMPACT_BACKUP_SUFFIX, REPAIR_TMP_SUFFIX)
+
+# Index slots and record key_links are links: a store position in the low 48
+# bits with a 15-bit fingerprint of the target record's key above it (the
+# sign bit stays clear so RECORD_LINK_NULL (-1) is never a valid link).
+# Chain walks compare fingerprints before touching the store; a fingerprint
+# of 0 means "unknown" (e.g. migrated files) and always falls back to a key
+# comparison.
+_POSITION_BITS = 48
+_POSITION_MASK = (1 << _POSITION_BITS) - 1
+
+# A segmented store (STORE_SEGMENT_BYTES) is a series of segment files, the
+# first at the store's path and segment n beside it at segment_path(store, n).
+# Its positions hold the segment id above a 36-bit offset into the segment
+# file, so a segment can be up to 64 GiB and a store up to 4096 segments.
+# Positions in a store that was never segmented are plain file offsets.
+_SEGMENT_SHIFT = 36
+STORE_SEGMENT_MARKER = '.segment-'
+
+# Access pattern hints for the store and index mappings: MADV_RANDOM for
+# point lookups (no readahead of pages that will not be used),
+# MADV_SEQUENTIAL while scanning (see sequential_access) and MADV_WILLNEED
+# to read a batch of pages in ahead of use (see prefetch). None where the
+# platform has no madvise.
+_HAS_MADVISE = hasattr(mmap.mmap, 'madvise')
+_MADV_RANDOM = getattr(mmap, 'MADV_RANDOM', None) if _HAS_MADVISE else None
+_MADV_SEQUENTIAL = getattr(mmap, 'MADV_SEQUENTIAL', None) if _HAS_MADVISE else None
+_MADV_WILLNEED = getattr(mmap, 'MADV_WILLNEED', None) if _HAS_MADVISE else None
+_PAGE_MASK = ~(mmap.PAGESIZE - 1)
+
 
 class TableMeta:
     __slots__ = ('name', 'namespace', 'db_instance_id', 'column_mode')
@@ -38,25 +94,57 @@ class TableMeta:
 class Table:
 
     def __init__(self, name, namespace, db_instance_id, config, column_mode=False, shared_cache=None,
-                 flush_interval=1):
+                 flush_interval=1, durability=DURABILITY_OS_BUFFER, index_ids=None):
         self.logger = logging.getLogger('cog.table')
         self.config = config
         self.shared_cache = shared_cache
         self.flush_interval = flush_interval
+        self.durability = durability
+        self.group_commit = group_committer(config) if durability == DURABILITY_FSYNC_GROUP else None
+        self.memory_governor = memory_governor(config)
         self.table_meta = TableMeta(name, namespace, db_instance_id, column_mode)
-        self.indexer = self.__create_indexer()
+        # Index files known from the namespace catalog spare listing the
+        # directory for them (see cog.catalog).
+        self.indexer = Indexer(self.table_meta, self.config, self.logger, index_ids=index_ids)
         self.store = self.__create_store(shared_cache)
+        if self.group_commit is not None:
+            self.group_commit.register(self)
 
     def __create_indexer(self):
         return Indexer(self.table_meta, self.config, self.logger)
 
     def __create_store(self, shared_cache):
         return Store(self.table_meta, self.config, self.logger, shared_cache=shared_cache,
-                     flush_interval=self.flush_interval)
+                     flush_interval=self.flush_interval, durability=self.durability,
+                     group_commit=self.group_commit, memory_governor=self.memory_governor)
 
     def sync(self):
-        """Force flush pending writes to disk."""
+        """Force flush pending writes to disk. With fsync-group durability
+        this is a barrier: everything written so far is on stable storage."""
         self.store.sync()
+        if self.group_commit is not None:
+            self.indexer.flush()
+
+    def reopen(self, close=True):
+        """Reopen the table's index and store files, e.g. after compaction has
+        replaced them. Cached records are dropped since their store positions
+        no longer apply. Returns the previous (indexer, store); with
+        close=False they are left open, uncached, for the caller to read."""
+        old_indexer, old_store = self.indexer, self.store
+        old_store.caching_enabled = False
+        old_store.store_cache.clear()
+        if close:
+            old_indexer.close()
+            old_store.close()
+        self.indexer = self.__create_indexer()
+        self.store = self.__create_store(self.shared_cache)
+        return old_indexer, old_store
+
+    def stats(self):
+        """Cache, I/O and index counters for this table since it was opened."""
+        stats = self.store.stats()
+        stats.update(self.indexer.stats())
+        return stats
 
     def close(self):
         self.indexer.close()
@@ -67,7 +155,13 @@ class Table:
 class Record:
     '''
     Record is the basic unit of storage in cog.
-    value_type: s - string, l - list, u - set
+    value_type: s - string, l - list, u - set, d - deletion marker (never
+    indexed, see Store.save_deletion), r - removal from a list (see
+    Cog.remove_value)
+    A list or set is a chain of records linked by value_link, newest first.
+    A chain record whose value is itself a list is a packed segment holding
+    several values (newest first). A removal in a list's chain takes its
+    values (one, or a packed list) out of the records older than it.
     timestamp: int64 nanoseconds since epoch. Stamped in Store.save at write time.
     '''
     __slots__ = ('key', 'value', 'timestamp',
@@ -129,11 +223,29 @@ class Record:
         return codec.decode_record(store_bytes)
 
     @classmethod
-    def __load_value(cls, store_pointer, val_list, store):
-        """loads value from the store"""
+    def __load_value(cls, store_pointer, val_list, store, removed=None):
+        """loads value from the store, leaving out values in *removed* and
+        in the removals met on the way"""
         while store_pointer != Record.VALUE_LINK_NULL:
             rec = store.read(store_pointer)
-            if rec.value_type == 'l':
+            if rec.value_type == 'r':
+                if removed is None:
+                    removed = set()
+                removed.update(rec.value if type(rec.value) is list else (rec.value,))
+            elif removed:
+                values = rec.value if type(rec.value) is list else (rec.value,)
+                values = [value for value in values if value not in removed]
+                if rec.value_type == 'l':
+                    val_list.extend(values)
+                else:
+                    val_list.update(values)
+            elif type(rec.value) is list:
+                # packed segment: many values in one record
+                if rec.value_type == 'l':
+                    val_list.extend(rec.value)
+                else:
+                    val_list.update(rec.value)
+            elif rec.value_type == 'l':
                 val_list.append(rec.value)
             else:
                 val_list.add(rec.value)
@@ -144,15 +256,25 @@ class Record:
     def materialize_values(cls, record, store):
         """Return a new Record with the full value chain materialized for
         list/set types. The original record is not mutated (important when
-        it lives in the store cache). No-op copy for scalars."""
-        if record.value_type == 'l':
-            full_value = cls.__load_value(record.value_link, [record.value], store)
-        elif record.value_type == 'u':
-            full_value = cls.__load_value(record.value_link, {record.value}, store)
+        it lives in the store cache). No-op copy for scalars. A list headed
+        by a removal comes back as a list; None if removals emptied it, as
+        the key then reads as absent."""
+        packed = type(record.value) is list
+        value_type = record.value_type
+        if value_type == 'l':
+            full_value = cls.__load_value(record.value_link, list(record.value) if packed else [record.value], store)
+        elif value_type == 'u':
+            full_value = cls.__load_value(record.value_link, set(record.value) if packed else {record.value}, store)
+        elif value_type == 'r':
+            full_value = cls.__load_value(record.value_link, [], store,
+                                          set(record.value) if packed else {record.value})
+            if not full_value:
+                return None
+            value_type = 'l'
         else:
             return record
         out = Record(record.key, full_value, store_position=record.store_position,
-                     value_type=record.value_type, key_link=record.key_link,
+                     value_type=value_type, key_link=record.key_link,
                      value_link=record.value_link, timestamp=record.timestamp)
         return out
 
@@ -167,15 +289,27 @@ class Record:
 
 class Index:
 
-    def __init__(self, table_meta, config, logger, index_id=0):
+    def __init__(self, table_meta, config, logger, index_id=0, capacity=None):
         self.logger = logging.getLogger('cog.index')
         self.table = table_meta
         self.config = config
+        self.index_id = index_id
         self.name = self.config.cog_index(table_meta.namespace, table_meta.name, table_meta.db_instance_id, index_id)
+        self.filter_name = self.config.cog_index_filter(table_meta.namespace, table_meta.name,
+                                                        table_meta.db_instance_id, index_id)
 
         # Cache hot config values as instance vars (LOAD_FAST vs LOAD_ATTR chain)
         self._block_len = config.INDEX_BLOCK_LEN
-        self._capacity = config.INDEX_CAPACITY
+        if os.path.exists(self.name):
+            # An index may have been grown past INDEX_CAPACITY: the file size
+            # is the source of truth for its slot count.
+            self._capacity = os.path.getsize(self.name) // self._block_len
+        else:
+            self._capacity = capacity or config.INDEX_CAPACITY
+
+        # Number of live keys. Computed lazily on the first write (see
+        # ensure_key_count) so opening an index for reads stays O(1).
+        self.key_count = None
 
         self.empty_block = _ZERO_BLOCK if self._block_len == _DEFAULT_INDEX_BLOCK_LEN else b'\x00' * self._block_len
 
@@ -187,12 +321,29 @@ class Index:
             os.ftruncate(fd, total_size)
             os.close(fd)
             self.logger.info("new index with capacity" + str(self._capacity) + "created: " + self.name)
+            bits_per_key = config.INDEX_BLOOM_BITS_PER_KEY
+            if bits_per_key:
+                BloomFilter.create(self.filter_name, self._capacity, bits_per_key).close()
+            elif os.path.exists(self.filter_name):
+                os.remove(self.filter_name)  # left behind by an index removed earlier
         else:
             self.logger.info("Index: "+self.name+" already exists.")
 
         self.db = open(self.name, 'r+b')
         self.db_mem = mmap.mmap(self.db.fileno(), 0)
+        _advise(self.db_mem, _MADV_RANDOM)
+        self._sequential_scans = 0
         self._closed = False
+        # Keys ever put in this index, or None (see cog.bloom).
+        self.key_filter = BloomFilter.open(self.filter_name)
+
+        # Statistics, see stats(). Plain counters: cheap, and approximate
+        # under concurrent use.
+        self.gets = 0
+        self.chain_walks = 0
+        self.chain_steps = 0
+        self.longest_chain = 0
+        self.filtered = 0
 
     def close(self):
         if self._closed:
@@ -201,10 +352,127 @@ class Index:
         self.db_mem.flush()
         self.db_mem.close()
         self.db.close()
+        if self.key_filter is not None:
+            self.key_filter.close()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @contextlib.contextmanager
+    def sequential_access(self):
+        """Advise MADV_SEQUENTIAL for the index mapping while the block
+        runs, e.g. around a scan of the slot array."""
+        self._sequential_scans += 1
+        if self._sequential_scans == 1:
+            _advise(self.db_mem, _MADV_SEQUENTIAL)
+        try:
+            yield
+        finally:
+            self._sequential_scans -= 1
+            if self._sequential_scans == 0 and not self._closed:
+                _advise(self.db_mem, _MADV_RANDOM)
+
+    def prefetch(self, keys, store):
+        """Read in the index slots of *keys* and then the store pages of
+        the records at the head of those slots with MADV_WILLNEED, so the
+        lookups that follow overlap their I/O instead of faulting in one
+        page at a time."""
+        key_filter = self.key_filter
+        capacity = self._capacity
+        block_len = self._block_len
+        slots = sorted({block_len * (_key_hash(key) % capacity) for key in keys
+                        if key_filter is None or key_filter.might_contain(key)})
+        _willneed(self.db_mem, slots)
+        db_mem = self.db_mem
+        positions = []
+        for slot in slots:
+            link = _i64_unpack_from(db_mem, slot)[0]
+            if link != 0:
+                positions.append(link & _POSITION_MASK)
+        store.prefetch(positions)
+
+    def load_factor(self):
+        self.ensure_key_count()
+        return self.key_count / self._capacity
+
+    def ensure_key_count(self):
+        """
+        Initialise key_count for an index opened from disk. Chains live in the
+        store, so an exact count would need a full table scan; instead the key
+        count is estimated from slot occupancy, which for uniform hashing is
+        occupied = capacity * (1 - e^-load).
+        """
+        if self.key_count is not None:
+            return
+        occupied = self._count_occupied_slots()
+        if occupied == 0:
+            self.key_count = 0
+        elif occupied >= self._capacity:
+            self.key_count = self._capacity * 2
+        else:
+            self.key_count = int(round(-self._capacity * math.log(1.0 - occupied / self._capacity)))
+
+    def _count_occupied_slots(self):
+        block_len = self._block_len
+        db_mem = self.db_mem
+        mem_len = len(db_mem)
+        if block_len != _DEFAULT_INDEX_BLOCK_LEN:
+            return sum(1 for off in range(0, mem_len - block_len + 1, block_len)
+                       if _i64_unpack_from(db_mem, off)[0] != 0)
+        # Count zero slots a chunk at a time: array.count runs in C and the
+        # chunking keeps memory flat for very large indexes.
+        chunk = block_len * 65536
+        empty = 0
+        for off in range(0, mem_len, chunk):
+            empty += array.array('q', db_mem[off:off + chunk]).count(0)
+        return mem_len // block_len - empty
 
     def get_index_key(self, int_store_position):
         return _i64_pack(int_store_position)
 
+    def _find(self, key, fingerprint, link, store):
+        """
+        Walk a bucket chain starting at *link* looking for *key*.
+        Links whose fingerprint differs from the key's are skipped by reading
+        only the 8-byte key_link of that record; no record is decoded. Other
+        records only have their key decoded, and only the match is read in
+        full.
+        Returns (record, store_position, previous_store_position), with
+        record None when the key is not in the chain.
+        """
+        position, prev_position = self._find_position(key, fingerprint, link, store)
+        if position is None:
+            return None, None, None
+        return store.read(position), position, prev_position
+
+    def _find_position(self, key, fingerprint, link, store):
+        """_find without reading the matching record: returns
+        (store_position, previous_store_position), or (None, None)."""
+        prev_position = None
+        steps = 0
+        while link != Record.RECORD_LINK_NULL:
+            steps += 1
+            position = link & _POSITION_MASK
+            link_fingerprint = link >> _POSITION_BITS
+            if link_fingerprint == fingerprint or link_fingerprint == 0:
+                record_key, next_link = store.read_key(position)
+                if record_key == key:
+                    self._count_walk(steps)
+                    return position, prev_position
+                link = next_link
+            else:
+                link = store.read_key_link(position)
+            prev_position = position
+        self._count_walk(steps)
+        return None, None
+
+    def _count_walk(self, steps):
+        self.chain_walks += 1
+        self.chain_steps += steps
+        if steps > self.longest_chain:
+            self.longest_chain = steps
+
     # @profile
     def put(self, key, store_position, store):
         """
@@ -224,53 +492,60 @@ class Index:
         2. k4 -> k6 -> k5 -> k3 -> k2 -> k1
 
         """
-        block_len = self._block_len
-        db_mem = self.db_mem
-        orig_position = self.get_index(key)
-        head_pos = _i64_unpack_from(db_mem, orig_position)[0]
+        slot, fingerprint, key_link, is_new = self._link_new_head(key, store)
+        store.update_record_link_inplace(store_position, key_link)
+        self._set_head(slot, fingerprint, store_position, is_new)
+        return key_link
+
+    def put_record(self, record, store, timestamp=None):
+        """
+        Like put, but links *record* into its key chain before it is saved,
+        so the record is written once instead of appended and then patched.
+        Returns the record's store position.
+        """
+        slot, fingerprint, key_link, is_new = self._link_new_head(record.key, store)
+        record.key_link = key_link
+        store_position = store.save(record, timestamp=timestamp)
+        self._set_head(slot, fingerprint, store_position, is_new)
+        return store_position
+
+    def _link_new_head(self, key, store):
+        """Unlink any current record of *key* from its chain and return
+        (slot offset, fingerprint, key_link for the new head, is_new_key)."""
+        key_hash = _key_hash(key)
+        slot = self._block_len * (key_hash % self._capacity)
+        fingerprint = _fingerprint(key_hash)
+        # Added before the key is linked, so readers never see the key
+        # without its filter bits.
+        maybe_known = self.key_filter is None or self.key_filter.add(key)
+        head_link = _i64_unpack_from(self.db_mem, slot)[0]
         if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
-            self.logger.debug('writing : %s current data at store position: %d', key, head_pos)
-        if head_pos == 0:
+            self.logger.debug('writing : %s current data at store position: %d', key, head_link & _POSITION_MASK)
+        if head_link == 0:
             # First record in the key bucket, point next link to null
-            store.update_record_link_inplace(store_position, Record.RECORD_LINK_NULL)
-            key_link = store_position
-        else:
-            # there are records in the bucket
-            # read existing record from the store - head only, not load_from_store (O(1) vs O(n))
-            existing_record = store.read(head_pos)
-
-            if existing_record.key == key:
-                # the record at the top of the bucket has the same key, update the record in place.
-                # a new entry has been made to the store, update pre and next links.
-                store.update_record_link_inplace(store_position, existing_record.key_link)
-                key_link = existing_record.key_link
-            else:
-                # this is hash collision.
-                # the record at the top of the bucket has a different key, add new record to the top of the bucket.
-                # set next link to the record at the top of the bucket, prev is null by default, no need to set.
-                store.update_record_link_inplace(store_position, existing_record.store_position)
-                key_link = existing_record.store_position
-
-                # check if this record exists in the bucket, if yes remove pointer.
-                prev_record = existing_record  # start with the head
-                while existing_record.key_link != Record.RECORD_LINK_NULL:
-                    next_pos = existing_record.key_link
-                    # Head-only read (O(1)) instead of load_from_store (O(n))
-                    existing_record = store.read(next_pos)
-                    if existing_record.key == key:
-                        """
-                        if same key found in bucket, update previous record in chain to point to key_link of this record
-                        prev_rec -> current rec.key_link
-                        curr_rec will not be linked in the bucket anymore.
-                        """
-                        store.update_record_link_inplace(prev_record.store_position, existing_record.key_link)
-                        key_link = existing_record.key_link
-                        # unlinked — don't advance prev_record
-                    else:
-                        prev_record = existing_record
-
-        db_mem[orig_position: orig_position + block_len] = _i64_pack(store_position)
-        return key_link
+            return slot, fingerprint, Record.RECORD_LINK_NULL, True
+        if not maybe_known:
+            # The filter has never seen the key: no need to look for it.
+            return slot, fingerprint, head_link, True
+        existing_record, _, prev_position = self._find(key, fingerprint, head_link, store)
+        if existing_record is None:
+            # new key or hash collision: add new record to the top of the bucket.
+            return slot, fingerprint, head_link, True
+        if prev_position is None:
+            # the record at the top of the bucket has the same key, the new
+            # record replaces it at the top.
+            return slot, fingerprint, existing_record.key_link, False
+        """
+        same key found deeper in the bucket, update previous record in chain to point to key_link of
+        this record: prev_rec -> current rec.key_link. The new record goes to the top of the bucket.
+        """
+        store.update_record_link_inplace(prev_position, existing_record.key_link)
+        return slot, fingerprint, head_link, False
+
+    def _set_head(self, slot, fingerprint, store_position, is_new):
+        self.db_mem[slot:slot + self._block_len] = _i64_pack(_pack_link(fingerprint, store_position))
+        if is_new and self.key_count is not None:
+            self.key_count += 1
 
     def get_index(self, key):
         return self._block_len * cog_hash(key, self._capacity)
@@ -279,27 +554,19 @@ class Index:
     def get(self, key, store):
         if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug("GET: Reading index: %s", self.name)
-        index_position = self.get_index(key)
-        db_mem = self.db_mem
-        store_pos = _i64_unpack_from(db_mem, index_position)[0]
-        if store_pos == 0:
+        self.gets += 1
+        if self._filtered_out(key):
+            return None
+        key_hash = _key_hash(key)
+        link = _i64_unpack_from(self.db_mem, self._block_len * (key_hash % self._capacity))[0]
+        if link == 0:
             return None
         # Walk the collision chain with head-only reads (O(1)); only
-        # load_from_store (which materializes the value chain) for the match.
-        record = store.read(store_pos)
-        if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
-            self.logger.debug("read record %s", record)
-
-        if record.key == key:
-            return Record.materialize_values(record, store)
-        while record.key_link != Record.RECORD_LINK_NULL:
-            if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
-                self.logger.debug("record.key_link: %d", record.key_link)
-            store_pos = record.key_link
-            record = store.read(store_pos)
-            if record.key == key:
-                return Record.materialize_values(record, store)
-        return None
+        # materialize the value chain for the match.
+        record = self._find(key, _fingerprint(key_hash), link, store)[0]
+        if record is None:
+            return None
+        return Record.materialize_values(record, store)
 
     def get_head_only(self, key, store):
         """
@@ -308,23 +575,31 @@ class Index:
 
         Returns: (record, store_position) or (None, None)
         """
-        index_position = self.get_index(key)
-        store_position = _i64_unpack_from(self.db_mem, index_position)[0]
-        if store_position == 0:
-            return None, None
-        # Head-only read, don't load value chain
-        record = store.read(store_position)
+        self.gets += 1
+        return self.head(key, store)
 
-        if record.key == key:
-            return record, store_position
-        else:
-            # Hash collision - follow key_link chain
-            while record.key_link != Record.RECORD_LINK_NULL:
-                store_position = record.key_link
-                record = store.read(store_position)
-                if record.key == key:
-                    return record, store_position
-        return None, None
+    def head_position(self, key, store):
+        """Store position of *key*'s head record, or None. Only keys are
+        read from the store, and no get is counted."""
+        if self._filtered_out(key):
+            return None
+        key_hash = _key_hash(key)
+        link = _i64_unpack_from(self.db_mem, self._block_len * (key_hash % self._capacity))[0]
+        if link == 0:
+            return None
+        return self._find_position(key, _fingerprint(key_hash), link, store)[0]
+
+    def head(self, key, store):
+        """get_head_only without counting a get, for lookups made by the
+        index's own upkeep."""
+        if self._filtered_out(key):
+            return None, None
+        key_hash = _key_hash(key)
+        link = _i64_unpack_from(self.db_mem, self._block_len * (key_hash % self._capacity))[0]
+        if link == 0:
+            return None, None
+        record, store_position, _ = self._find(key, _fingerprint(key_hash), link, store)
+        return record, store_position
 
     '''
         Iterates through all records in the index, following key_link chains for hash collisions.
@@ -336,19 +611,22 @@ class Index:
         mem_len = len(db_mem)
         scan_cursor = 0
         while scan_cursor + block_len <= mem_len:
-            store_position = _i64_unpack_from(db_mem, scan_cursor)[0]
-            if store_position == 0:
+            link = _i64_unpack_from(db_mem, scan_cursor)[0]
+            if link == 0:
                 scan_cursor += block_len
                 continue
 
             # Load head record and follow key_link chain to get all records in this bucket
-            while store_position != Record.RECORD_LINK_NULL:
-                record = Record.load_from_store(store_position, store)
+            while link != Record.RECORD_LINK_NULL:
+                record = store.read(link & _POSITION_MASK)
                 if record is None:  # EOF store
                     self.logger.error("Store EOF reached! Iteration terminated.")
                     return
-                yield Record(record.key, record.value)
-                store_position = record.key_link
+                link = record.key_link
+                timestamp = record.timestamp
+                record = Record.materialize_values(record, store)
+                if record is not None:
+                    yield Record(record.key, record.value, timestamp=timestamp)
 
             scan_cursor += block_len
 
@@ -361,20 +639,25 @@ class Index:
         """
         if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug("DELETE: Reading index: %s", self.name)
+        if self._filtered_out(key):
+            return False
         block_len = self._block_len
         db_mem = self.db_mem
-        index_position = self.get_index(key)
+        key_hash = _key_hash(key)
+        index_position = block_len * (key_hash % self._capacity)
 
-        head_pos = _i64_unpack_from(db_mem, index_position)[0]
-        if head_pos == 0:
+        head_link = _i64_unpack_from(db_mem, index_position)[0]
+        if head_link == 0:
             return False
 
-        # delete only needs key/key_link/store_position — head-only read (O(1))
+        # delete only needs key/key_link/store_position — head-only reads
         # instead of load_from_store, which would materialize the value chain.
-        record = store.read(head_pos)
+        record, _, prev_position = self._find(key, _fingerprint(key_hash), head_link, store)
+        if record is None:
+            return False
         if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug("read record %s", record)
-        if record.key == key:
+        if prev_position is None:
             """delete bucket => map hash table to empty block, or point to next in chain"""
             if record.key_link != Record.RECORD_LINK_NULL:
                 # Point index to next record in chain
@@ -382,28 +665,52 @@ class Index:
             else:
                 # No more records in chain, clear the bucket
                 db_mem[index_position:index_position + block_len] = self.empty_block
-            return True
         else:
-            """search bucket"""
-            prev_record = record  # Initialize to the head record
-            while record.key_link != Record.RECORD_LINK_NULL:
-                next_pos = record.key_link
-                next_record = store.read(next_pos)
-                if next_record.key == key:
-                    """
-                    if same key found in bucket, update previous record in chain to point to key_link of this record
-                    prev_rec -> current rec.key_link
-                    curr_rec will not be linked in the bucket anymore.
-                    """
-                    # update in place the key link pointer of previous record
-                    store.update_record_link_inplace(prev_record.store_position, next_record.key_link)
-                    return True
-                prev_record = next_record
-                record = next_record
-        return False
+            """
+            key found deeper in the bucket, update previous record in chain to point to key_link of this record
+            prev_rec -> current rec.key_link
+            curr_rec will not be linked in the bucket anymore.
+            """
+            store.update_record_link_inplace(prev_position, record.key_link)
+        self._key_removed()
+        return True
+
+    def _key_removed(self):
+        if self.key_count:
+            self.key_count -= 1
+
+    def chain_positions(self, slot, store):
+        """Store positions of the records in the collision chain of slot
+        number *slot*, head first."""
+        positions = []
+        link = _i64_unpack_from(self.db_mem, self._block_len * slot)[0]
+        if link == 0:
+            return positions
+        while link != Record.RECORD_LINK_NULL:
+            position = link & _POSITION_MASK
+            record = store.read(position)
+            if record is None:
+                self.logger.error("Store EOF reached while walking " + self.name)
+                break
+            positions.append(position)
+            link = record.key_link
+        return positions
 
     def flush(self):
         self.db_mem.flush()
+        if self.key_filter is not None:
+            self.key_filter.flush()
+
+    def stats(self):
+        return {'gets': self.gets, 'chain_walks': self.chain_walks, 'chain_steps': self.chain_steps,
+                'longest_chain': self.longest_chain, 'filtered': self.filtered}
+
+    def _filtered_out(self, key):
+        """True if the key filter rules *key* out of this index."""
+        if self.key_filter is None or self.key_filter.might_contain(key):
+            return False
+        self.filtered += 1
+        return True
 
 
 class Store:
@@ -415,47 +722,122 @@ class Store:
                        1 = flush every write (safest, default)
                        0 = manual flush only (fastest, use sync())
                        N>1 = flush every N writes with async background thread
+        durability: "os-buffer" (default) flushes per flush_interval,
+                    "none" never flushes on write, "fsync-group" leaves
+                    flushing and fsync to group_commit (see cog.durability).
     """
 
     def __init__(self, tablemeta, config, logger, caching_enabled=True, shared_cache=None,
-                 flush_interval=1):
+                 flush_interval=1, durability=DURABILITY_OS_BUFFER, group_commit=None, memory_governor=None):
         self.caching_enabled = caching_enabled
         self.batch_mode = False  # When True, defers flush() until end_batch()
         self.logger = logging.getLogger('cog.store')
         self.tablemeta = tablemeta
         self.config = config
         self.flush_interval = flush_interval
+        self.durability = durability
+        self.group_commit = group_commit
         self.write_count = 0
+        # Bytes written in the current batch, handed to group_commit by
+        # end_batch.
+        self._batch_bytes = 0
         self._closed = False
         # True when there are buffered writes the OS (and therefore the read
         # mmap) cannot yet see. The mmap maps the same file the buffered writer
         # appends to, so a read must flush before trusting it. Cleared whenever
         # the write buffer is actually flushed.
         self._dirty = False
+        # Statistics, see stats(). Plain counters: cheap, and approximate
+        # under concurrent use.
+        self.mmap_reads = 0
+        self.file_reads = 0
+        self.bytes_read = 0
+        self.key_reads = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.flushes = 0
+        self.fsyncs = 0
 
         self.store = self.config.cog_store(
             tablemeta.namespace, tablemeta.name, tablemeta.db_instance_id)
-        self.store_cache = StoreCache(self.store, shared_cache)
-        fd = os.open(self.store, os.O_RDWR | os.O_CREAT, 0o644)
-        self.store_file = os.fdopen(fd, 'rb+')
-
-        file_size = os.fstat(self.store_file.fileno()).st_size
-        self.codec = detect_codec(self.store_file, file_size)
+        self.store_cache = StoreCache(self.store, shared_cache, max_bytes=self.config.STORE_CACHE_BYTES,
+                                     policy=self.config.STORE_CACHE_POLICY, governor=memory_governor)
+        # One open file per segment; the last one, the tail, takes appends.
+        # Sealed segments are only written to by key_link updates.
+        self.segment_bytes = self.config.STORE_SEGMENT_BYTES
+        self.extent_bytes = getattr(self.config, 'STORE_EXTENT_BYTES', 0)
+        self._files = []
+        for path in store_segments(self.store):
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._files.append(os.fdopen(fd, 'rb+'))
+        self.store_file = self._files[-1]
+        self.tail_segment = len(self._files) - 1
+        self._segment_shift = _SEGMENT_SHIFT if self.segment_bytes or self.tail_segment else _POSITION_BITS
+        self._offset_mask = (1 << self._segment_shift) - 1
+        self._tail_base = self.tail_segment << self._segment_shift
+        # Sealed segments with key_link updates not yet fsynced.
+        self._patched_segments = set()
+
+        first = self._files[0]
+        file_size = os.fstat(first.fileno()).st_size
+        self.codec = detect_codec(first, file_size)
         if file_size == 0:
+            self.codec.write_header(first)
+            first.flush()
+        if self.tail_segment and os.fstat(self.store_file.fileno()).st_size == 0:
+            # Created by a roll over that did not get to write its header.
             self.codec.write_header(self.store_file)
             self.store_file.flush()
         self.created_at = self.codec.created_at
         self.data_start = self.codec.HEADER_SIZE
-
-        # Thread safety
+        if any(os.fstat(f.fileno()).st_size > self._offset_mask for f in self._files):
+            raise ValueError("Store {} is too large to be segmented".format(self.store))
+        # End of the tail's records. While _preallocated, the tail file runs
+        # on past it in zeros (see _extend) and its header records the end;
+        # otherwise the end of the file is the end of the records.
+        self._preallocated = False
+        self._data_end = os.fstat(self.store_file.fileno()).st_size
+        # Size of the tail file as last extended by _extend, so saves need
+        # not stat it; None until known.
+        self._extent_end = None
+        self.remaps = 0
+        for segment, f in enumerate(self._files):
+            fd = f.fileno()
+            recorded_end = _i64_unpack_from(os.pread(fd, 8, V2_DATA_END_OFFSET), 0)[0]
+            if recorded_end == 0:
+                continue
+            end = _find_data_end(fd, recorded_end)
+            if segment == self.tail_segment and self.extent_bytes:
+                self._preallocated = True
+                self._data_end = end
+            else:
+                # Left preallocated by a crash, or by a run with extents.
+                _trim_file(fd, end)
+                if segment == self.tail_segment:
+                    self._data_end = end
+
+        # Thread safety. _lock serializes writers and the shared file
+        # position; reads only take it to flush buffered writes or to fall
+        # back to a seek+read. _mmap_lock serializes remapping.
         self._lock = threading.Lock()
-
-        # Read-only mmap for fast-path reads. Writes go through the fd.
+        self._mmap_lock = threading.Lock()
+        # End of the store while the file position is known to sit there
+        # (only trusted while there are buffered writes, see save).
+        self._append_position = None
+
+        # Read-only mmaps for fast-path reads, one per segment; _mmap is the
+        # tail's. Writes go through the fds.
+        self._maps = [None] * len(self._files)
+        # Scans running under sequential_access; new mappings get their advice.
+        self._sequential_scans = 0
+        for segment, f in enumerate(self._files[:-1]):
+            if os.fstat(f.fileno()).st_size > self.data_start:
+                self._maps[segment] = self._map_file(f)
         self._mmap = None
         self._refresh_mmap()
 
         # Auto-enable async flush when interval > 1
-        self._use_async = flush_interval > 1
+        self._use_async = flush_interval > 1 and durability == DURABILITY_OS_BUFFER
         if self._use_async:
             self._flush_queue = queue.Queue()
             self._flush_thread = threading.Thread(target=self._flush_worker, daemon=True)
@@ -465,19 +847,169 @@ class Store:
         logger.info(f"Store init: {self.store} (flush_interval={flush_interval}, codec=v{self.codec.VERSION})")
 
     def _refresh_mmap(self):
+        """Map the store again if it has grown. Each mapping is an immutable
+        snapshot of the file up to its length: readers keep using the one
+        they picked up, and a replaced mapping is released once the last
+        reader drops it rather than closed under them."""
+        with self._mmap_lock:
+            try:
+                size = os.fstat(self.store_file.fileno()).st_size
+            except (OSError, ValueError):
+                return
+            if size <= self.data_start:
+                return
+            current = self._mmap
+            if current is not None and len(current) >= size:
+                return
+            self.remaps += 1
+            self._mmap = self._maps[self.tail_segment] = self._map_file(self.store_file)
+
+    def _map_file(self, f):
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _advise(mm, _MADV_SEQUENTIAL if self._sequential_scans else _MADV_RANDOM)
+        return mm
+
+    @contextlib.contextmanager
+    def sequential_access(self):
+        """Advise MADV_SEQUENTIAL for the store mappings while the block
+        runs, so a scan gets kernel readahead; point lookups otherwise run
+        under MADV_RANDOM."""
+        with self._mmap_lock:
+            self._sequential_scans += 1
+            if self._sequential_scans == 1:
+                for mm in self._maps:
+                    _advise(mm, _MADV_SEQUENTIAL)
         try:
-            size = os.fstat(self.store_file.fileno()).st_size
-        except (OSError, ValueError):
+            yield
+        finally:
+            with self._mmap_lock:
+                self._sequential_scans -= 1
+                if self._sequential_scans == 0:
+                    for mm in self._maps:
+                        _advise(mm, _MADV_RANDOM)
+
+    def prefetch(self, positions):
+        """Start reading in the pages of the records at *positions*
+        (MADV_WILLNEED) ahead of reading them. Cached records are skipped."""
+        if _MADV_WILLNEED is None:
             return
-        if size <= self.data_start:
+        if self._dirty:
+            self._flush_for_read()
+        cache = self.store_cache if self.caching_enabled else None
+        by_segment = {}
+        for position in positions:
+            if cache is not None and cache.peek(position) is not None:
+                continue
+            by_segment.setdefault(position >> self._segment_shift, []).append(position & self._offset_mask)
+        maps = self._maps
+        for segment, offsets in by_segment.items():
+            if segment < len(maps):
+                _willneed(maps[segment], offsets)
+
+    def _roll_segment(self):
+        """Seal the tail segment and start the next one. Called with _lock
+        held. Returns the store position of the new tail's first record."""
+        segment = self.tail_segment + 1
+        if segment << self._segment_shift > _POSITION_MASK:
+            raise ValueError("Store {} has no segment ids left".format(self.store))
+        self.store_file.flush()
+        self._dirty = False
+        if self._preallocated:
+            _trim_file(self.store_file.fileno(), self._data_end)
+            self._preallocated = False
+        self._extent_end = None
+        if self.group_commit is not None:
+            os.fsync(self.store_file.fileno())
+        fd = os.open(segment_path(self.store, segment), os.O_RDWR | os.O_CREAT, 0o644)
+        tail = os.fdopen(fd, 'rb+')
+        if os.fstat(fd).st_size == 0:
+            self.codec.write_header(tail)
+            tail.flush()
+        with self._mmap_lock:
+            sealed = self.store_file
+            self._maps[self.tail_segment] = self._map_file(sealed)
+            self._files.append(tail)
+            self._maps.append(None)
+            self.store_file = tail
+            self.tail_segment = segment
+            self._tail_base = segment << self._segment_shift
+            self._mmap = None
+        self.logger.info("store {} rolled over to segment {}".format(self.store, segment))
+        tail.seek(0, 2)
+        self._data_end = tail.tell()
+        return self._tail_base + self._data_end
+
+    def _seek_end(self):
+        """Seek the tail to the end of its records and return that offset.
+        Called with _lock held. Another Store on the same file may have
+        appended since this one last wrote."""
+        if self._preallocated:
+            self._data_end = _find_data_end(self.store_file.fileno(), self._data_end)
+            self.store_file.seek(self._data_end)
+        else:
+            self.store_file.seek(0, 2)
+            self._data_end = self.store_file.tell()
+        return self._data_end
+
+    def _extend(self, end):
+        """Preallocate the tail past offset *end* by whole extents, and
+        record the end of the records in its header so they are found again
+        on open. The mapping then covers the writes that fill the extent, so
+        reading them back does not remap. Called with _lock held."""
+        if self._extent_end is not None and end < self._extent_end:
             return
-        current = self._mmap
-        if current is not None and len(current) >= size:
+        f = self.store_file
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        target = (end // self.extent_bytes + 1) * self.extent_bytes
+        if target <= size:
+            self._extent_end = size
             return
-        self._mmap = mmap.mmap(self.store_file.fileno(), 0,
-                               access=mmap.ACCESS_READ)
-        if current is not None:
-            current.close()
+        # Records in the write buffer land before the recorded end.
+        f.flush()
+        self._dirty = False
+        try:
+            os.posix_fallocate(fd, size, target - size)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, target)
+        os.pwrite(fd, _i64_pack(self._data_end), V2_DATA_END_OFFSET)
+        self._preallocated = True
+        self._extent_end = target
+
+    def end_position(self):
+        """Position the next record will be written at."""
+        with self._lock:
+            if self._dirty and self._append_position is not None:
+                return self._append_position
+            return self._tail_base + self._seek_end()
+
+    def size(self):
+        """Bytes in the store files, not counting space preallocated past
+        the end of the records."""
+        with self._lock:
+            sealed = sum(os.fstat(f.fileno()).st_size for f in self._files[:-1])
+            end = self._seek_end()
+            self._append_position = self._tail_base + end if self._dirty else None
+            return sealed + end
+
+    def _map_at(self, position, length):
+        """Return (mapping, offset) for the *length* bytes at *position*,
+        with mapping None if they are not mapped."""
+        segment = position >> self._segment_shift
+        offset = position & self._offset_mask
+        maps = self._maps
+        mm = maps[segment] if segment < len(maps) else None
+        if mm is None or offset + length > len(mm):
+            self._refresh_mmap()
+            maps = self._maps
+            mm = maps[segment] if segment < len(maps) else None
+            if mm is not None and offset + length > len(mm):
+                mm = None
+        return mm, offset
+
+    def segments(self):
+        """Number of segment files; 1 for a store that is not segmented."""
+        return len(self._files)
 
     def _flush_worker(self):
         """Background thread that processes flush requests."""
@@ -512,15 +1044,23 @@ class Store:
         """Request a flush - async if interval > 1, sync otherwise."""
         if self._closed:
             return
+        self.flushes += 1
         if self._use_async:
             self._flush_queue.put("FLUSH")
         else:
             self.store_file.flush()
             self._dirty = False
 
-    def _handle_write_flush(self):
+    def _handle_write_flush(self, nbytes):
         """Increment write count and trigger flush if threshold reached."""
-        if not self.batch_mode:
+        if self.durability == DURABILITY_NONE:
+            return
+        if self.batch_mode:
+            self._batch_bytes += nbytes
+            return
+        if self.group_commit is not None:
+            self.group_commit.note_write(self, nbytes)
+        else:
             self.write_count += 1
             if self.flush_interval > 0 and self.write_count >= self.flush_interval:
                 self._request_flush()
@@ -540,6 +1080,29 @@ class Store:
         if self._use_async:
             # Wait for async queue to drain
             self._flush_queue.join()
+        if self.group_commit is not None:
+            self.fsync()
+
+    def fsync(self):
+        """Flush buffered writes and fsync the store file. The fsync runs
+        outside the store lock so writers are not held up by the disk."""
+        with self._lock:
+            if self._closed:
+                return
+            self.store_file.flush()
+            self._dirty = False
+            if self._preallocated:
+                # Shortens the walk to the end of the records after a crash.
+                os.pwrite(self.store_file.fileno(), _i64_pack(self._data_end), V2_DATA_END_OFFSET)
+            fds = [self._files[segment].fileno() for segment in self._patched_segments]
+            self._patched_segments.clear()
+            fds.append(self.store_file.fileno())
+        self.fsyncs += 1
+        try:
+            for fd in fds:
+                os.fsync(fd)
+        except (OSError, ValueError):
+            pass  # closed concurrently; close() makes its own writes durable
 
     def close(self):
         """Close the store, ensuring all data is flushed."""
@@ -554,12 +1117,27 @@ class Store:
             self._flush_queue.put("SHUTDOWN")
             self._flush_thread.join(timeout=5.0)
         
+        if self.store_cache.governor is not None:
+            self.store_cache.governor.unregister(self.store, self.store_cache)
+
         with self._lock:
             try:
                 self.store_file.flush()
+                if self._preallocated:
+                    # Closed stores are never preallocated.
+                    fd = self.store_file.fileno()
+                    _trim_file(fd, _find_data_end(fd, self._data_end))
+                    self._preallocated = False
+                    self._extent_end = None
+                if self.group_commit is not None:
+                    for segment in self._patched_segments:
+                        os.fsync(self._files[segment].fileno())
+                    os.fsync(self.store_file.fileno())
                 self._dirty = False
                 self._mmap = None
-                self.store_file.close()
+                self._maps = []
+                for f in self._files:
+                    f.close()
             except ValueError:
                 pass  # File already closed
 
@@ -572,36 +1150,106 @@ class Store:
 
     def end_batch(self):
         """
-        End batch mode and flush all pending writes to disk.
+        End batch mode and flush all pending writes to disk. With
+        fsync-group durability the batch joins the next group commit.
         """
         with self._lock:
             self.store_file.flush()
             self._dirty = False
         self.batch_mode = False
-
-    def save(self, record):
+        batch_bytes, self._batch_bytes = self._batch_bytes, 0
+        if self.group_commit is not None and batch_bytes:
+            self.group_commit.note_write(self, batch_bytes)
+
+    def stats(self):
+        """Counters since the store was opened, plus its record cache's.
+        mmap_reads and file_reads are reads that missed the cache, decoded
+        from the mapping or, as a fallback, with a seek and read, and
+        bytes_read the encoded size of those records; key_reads are
+        key-only decodes by index chain walks (see read_key)."""
+        cache = self.store_cache
+        return {'cache_hits': cache.hits, 'cache_misses': cache.misses, 'cache_size': cache.size(),
+                'cache_bytes': cache.size_bytes(), 'mmap_reads': self.mmap_reads,
+                'file_reads': self.file_reads, 'bytes_read': self.bytes_read,
+                'key_reads': self.key_reads, 'writes': self.writes,
+                'bytes_written': self.bytes_written, 'flushes': self.flushes, 'fsyncs': self.fsyncs,
+                'segments': len(self._files), 'remaps': self.remaps}
+
+    def save(self, record, timestamp=None):
         """
         Store data with configurable flush behavior.
+        A timestamp is only passed when re-writing an existing record version
+        (e.g. compaction); new writes are stamped with the current time.
         """
         # Stamp a fresh write timestamp inside the lock so positions and
         # timestamps are consistent under concurrent writers.
         with self._lock:
-            record.timestamp = time.time_ns()
-            self.store_file.seek(0, 2)
-            store_position = self.store_file.tell()
-            record.set_store_position(store_position)
+            record.timestamp = time.time_ns() if timestamp is None else timestamp
+            # A seek flushes the write buffer, so while there are buffered
+            # writes append after them. Otherwise seek: another Store on the
+            # same file may have appended since.
+            store_position = self._append_position if self._dirty else None
+            if store_position is None:
+                store_position = self._tail_base + self._seek_end()
             marshalled_record = self.codec.encode_record(record)
+            if self.segment_bytes:
+                tail_size = store_position - self._tail_base
+                if tail_size > self.data_start and tail_size + len(marshalled_record) > self.segment_bytes:
+                    store_position = self._roll_segment()
+            record.set_store_position(store_position)
+            self._append_position = store_position + len(marshalled_record)
+            if self.extent_bytes:
+                self._extend(self._append_position - self._tail_base)
             self.store_file.write(marshalled_record)
+            self._data_end = self._append_position - self._tail_base
             self._dirty = True
+            self.writes += 1
+            self.bytes_written += len(marshalled_record)
 
             if self.caching_enabled:
-                self.store_cache.put(store_position, record)
+                self.store_cache.put(store_position, record, len(marshalled_record))
 
             # Handle flush based on interval
-            self._handle_write_flush()
+            self._handle_write_flush(len(marshalled_record))
 
         return store_position
 
+    def save_deletion(self, key):
+        """Append a marker recording that *key* was deleted now. Markers are
+        not indexed; they keep deletes visible to sequential readers of the
+        store such as cog.snapshot. Returns the marker's store position."""
+        return self.save(Record(key, "", value_type='d'))
+
+    def scan_headers(self, segment=None):
+        """Yield (position, key, value_type, timestamp) for every record in
+        the store in file order, deletion markers included, decoding only
+        keys. With *segment*, only that segment's records: segments can be
+        scanned independently, e.g. in parallel. Records appended while the
+        scan runs may or may not be seen."""
+        if self._dirty:
+            self._flush_for_read()
+        self._refresh_mmap()
+        current = segment if segment is not None else 0
+        while current < len(self._maps):
+            mm = self._maps[current]
+            base = current << self._segment_shift
+            position = self.data_start
+            size = len(mm) if mm is not None else 0
+            if current == self.tail_segment and self._preallocated:
+                size = min(size, self._data_end)
+            while position < size:
+                try:
+                    key, value_type, timestamp, end = self.codec.peek_header_at(mm, position)
+                except (ValueError, IndexError, struct.error):
+                    self.logger.error("unreadable record at {} in segment {} of {}, scan stopped".format(
+                        position, current, self.store))
+                    return
+                yield base + position, key, value_type, timestamp
+                position = end
+            if segment is not None:
+                return
+            current += 1
+
     def update_record_link_inplace(self, start_pos, int_value):
         """updates record link in store file in place"""
         if type(int_value) is not int:
@@ -611,17 +1259,75 @@ class Store:
         if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug('update_record_link_inplace: %s', byte_value)
 
+        segment = start_pos >> self._segment_shift
         with self._lock:
-            self.store_file.seek(start_pos)
-            self.store_file.write(byte_value)
-            self._dirty = True
+            if segment == self.tail_segment:
+                self.store_file.seek(start_pos & self._offset_mask)
+                self._append_position = None
+                self.store_file.write(byte_value)
+                self._dirty = True
+            else:
+                # Sealed segments are not buffered: write through.
+                os.pwrite(self._files[segment].fileno(), byte_value, start_pos & self._offset_mask)
+                self._patched_segments.add(segment)
 
             if self.caching_enabled:
                 cached = self.store_cache.peek(start_pos)
                 if cached is not None:
                     cached.key_link = int_value
 
-            self._handle_write_flush()
+            self._handle_write_flush(len(byte_value))
+
+    def _flush_for_read(self):
+        with self._lock:
+            if self._dirty:
+                self.store_file.flush()
+                self.flushes += 1
+                self._dirty = False
+                self._refresh_mmap()
+
+    def read_key_link(self, position):
+        """Return the key_link of the record at *position* without decoding
+        the record. Used by index chain walks to step over records whose key
+        fingerprint does not match."""
+        if self.caching_enabled:
+            cached_record = self.store_cache.peek(position)
+            if cached_record is not None:
+                return cached_record.key_link
+        if self._dirty:
+            self._flush_for_read()
+        mm, offset = self._map_at(position, 8)
+        if mm is not None:
+            return self.codec.key_link_at(mm, offset)
+        with self._lock:
+            f = self._files[position >> self._segment_shift]
+            f.seek(offset)
+            self._append_position = None
+            raw = f.read(8)
+        return self.codec.key_link_at(raw, 0)
+
+    def read_key(self, position):
+        """Return (key, key_link) of the record at *position*, decoding only
+        the key straight from the mmap. Index chain walks use it to compare
+        keys without decoding values (such as embeddings) or caching records
+        they pass over."""
+        if self.caching_enabled:
+            cached_record = self.store_cache.peek(position)
+            if cached_record is not None:
+                return cached_record.key, cached_record.key_link
+        if self._dirty:
+            self._flush_for_read()
+        mm, offset = self._map_at(position, 17)
+        if mm is not None:
+            try:
+                key_and_link = self.codec.peek_key_at(mm, offset)
+            except (ValueError, IndexError, struct.error):
+                pass
+            else:
+                self.key_reads += 1
+                return key_and_link
+        record = self.read(position)
+        return record.key, record.key_link
 
     # @profile
     def read(self, position):
@@ -644,44 +1350,48 @@ class Store:
         # common case because _dirty is almost always False under the default
         # per-write flush.
         if self._dirty:
-            with self._lock:
-                if self._dirty:
-                    self.store_file.flush()
-                    self._dirty = False
-                    self._refresh_mmap()
+            self._flush_for_read()
 
         # mmap fast path — decode directly from the mapped region, no
         # intermediate raw-bytes copy or seek/read syscalls.
-        mm = self._mmap
-        if mm is None or position + 17 > len(mm):
-            self._refresh_mmap()
-            mm = self._mmap
-        if mm is not None and position + 17 <= len(mm):
+        segment = position >> self._segment_shift
+        offset = position & self._offset_mask
+        maps = self._maps
+        mm = maps[segment] if segment < len(maps) else None
+        if mm is None or offset + 17 > len(mm):
+            mm, offset = self._map_at(position, 17)
+        if mm is not None:
             try:
-                record, _ = self.codec.decode_at(mm, position)
+                record, end = self.codec.decode_at(mm, offset)
             except (ValueError, KeyError, struct.error):
                 pass
             else:
                 record.store_position = position
+                self.mmap_reads += 1
+                self.bytes_read += end - offset
                 if self.caching_enabled:
-                    with self._lock:
-                        self.store_cache.put(position, record)
+                    self.store_cache.put(position, record, end - offset)
                 return record
 
         # Fallback: position past the mapping or truncated mmap.
         # Acquire lock to prevent concurrent writers from moving the
         # shared fd seek pointer between our seek and read.
+        if segment >= len(self._files):
+            return None
         with self._lock:
-            self.store_file.seek(position)
-            raw = self.codec.read_record(self.store_file)
+            f = self._files[segment]
+            f.seek(offset)
+            self._append_position = None
+            raw = self.codec.read_record(f)
+        self.file_reads += 1
         if raw is None:
             return None
+        self.bytes_read += len(raw)
         record = self.codec.decode_record(raw)
         record.store_position = position
 
         if self.caching_enabled:
-            with self._lock:
-                self.store_cache.put(position, record)
+            self.store_cache.put(position, record, len(raw))
 
         return record
 
@@ -689,53 +1399,192 @@ class Store:
 class Indexer:
     '''
     Manages indexes. Creates new index when an index is full.
-    Searches all indexes for get requests.
+    Searches all indexes for get requests, newest first.
     Provides same get/put/del method as single index but over multuple files.
     '''
 
-    def __init__(self, tablemeta, config, logger):
+    def __init__(self, tablemeta, config, logger, index_ids=None):
         self.tablemeta = tablemeta
         self.config = config
         self.logger = logging.getLogger('cog.indexer')
         self.index_list = []  # future range index.
         self.index_id = 0
-        self.load_indexes()
+        self.max_load_factor = getattr(config, 'INDEX_MAX_LOAD_FACTOR', 0)
+        # Keys written or deleted since track_dirty_keys(); None when not tracking.
+        self.dirty_keys = None
+        # Index statistics carried over from indexes replaced by grow().
+        self._retired_stats = {}
+        # The older index whose keys are being moved into the live one, and
+        # the next of its slots to move; see grow().
+        self._growing = None
+        self._grow_cursor = 0
+        # Indexes emptied by grow(). They are closed at the next grow() or
+        # close() rather than at once: a lock-free reader may still be
+        # walking one.
+        self._retired = []
+        # Puts and deletes so far; lets a running scan notice writes.
+        self.mutations = 0
+        self.load_indexes(index_ids)
         # if no index currenlty exist, create new live index.
         if len(self.index_list) == 0:
             self.index_list.append(Index(tablemeta, self.config, logger, self.index_id))
             self.live_index = self.index_list[self.index_id]
+        elif len(self.index_list) > 1:
+            # A growth interrupted by close or a crash: carry on moving keys.
+            self._growing = self.index_list[-1]
 
     def close(self):
-        for idx in self.index_list:
+        for idx in self.index_list + self._retired:
             idx.close()
 
-    def load_indexes(self):
-        for f in os.listdir(self.config.cog_data_dir(self.tablemeta.namespace)):
-            if f.endswith(('.v3_backup', '.v4_tmp')):
-                continue
-            if self.config.INDEX in f:
-                if self.tablemeta.name == self.config.get_table_name(f):
+    def flush(self):
+        """msync every open index file."""
+        for idx in self.index_list:
+            if not idx._closed:
+                idx.flush()
+
+    def load_indexes(self, index_ids=None):
+        """Open the table's index files: those with *index_ids* if given,
+        otherwise every one found in the namespace directory."""
+        if index_ids is None:
+            index_ids = []
+            for f in os.listdir(self.config.cog_data_dir(self.tablemeta.namespace)):
+                if f.endswith(TRANSIENT_FILE_SUFFIXES):
+                    continue
+                if self.config.INDEX in f and self.tablemeta.name == self.config.get_table_name(f):
                     self.logger.info("loading index file: " + f)
-                    id = self.config.index_id(f)
-                    index = Index(self.tablemeta, self.config, self.logger, id)
-                    self.index_list.append(index)
-                    # make the latest index the live index.
-                    if id >= self.index_id:
-                        self.index_id = id
-                        self.live_index = index
+                    index_ids.append(self.config.index_id(f))
+        # Newest first, so lookups find a key's latest record first.
+        for id in sorted(index_ids, reverse=True):
+            index = Index(self.tablemeta, self.config, self.logger, id)
+            self.index_list.append(index)
+            # make the latest index the live index.
+            if id >= self.index_id:
+                self.index_id = id
+                self.live_index = index
+
+    def track_dirty_keys(self):
+        """Start recording every key put or deleted (see dirty_keys). Index
+        growth, and moving keys for one under way, is deferred while
+        tracking so a concurrent full index walk, such as a background
+        compaction, sees stable chains."""
+        self.dirty_keys = set()
+
+    def stop_tracking_dirty_keys(self):
+        dirty_keys = self.dirty_keys
+        self.dirty_keys = None
+        return dirty_keys
 
     def put(self, key, store_position, store):
-        resp = self.live_index.put(key, store_position, store)
-        if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
-            self.logger.debug("Key: %s indexed in: %s", key, self.live_index.name)
+        live_index = self.live_index
+        if self.max_load_factor:
+            live_index.ensure_key_count()
+        resp = live_index.put(key, store_position, store)
+        self._after_put(key, live_index, store)
         return resp
 
+    def put_record(self, record, store, timestamp=None):
+        """Save *record* to *store* and index it with a single write; see
+        Index.put_record. Returns the record's store position."""
+        live_index = self.live_index
+        if self.max_load_factor:
+            live_index.ensure_key_count()
+        store_position = live_index.put_record(record, store, timestamp)
+        self._after_put(record.key, live_index, store)
+        return store_position
+
+    def _after_put(self, key, live_index, store):
+        self.mutations += 1
+        if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Key: %s indexed in: %s", key, live_index.name)
+        if self.dirty_keys is not None:
+            self.dirty_keys.add(key)
+        elif self._growing is not None:
+            self._move_keys(store, GROW_SLOTS_PER_WRITE)
+        elif self.max_load_factor and live_index.key_count > self.max_load_factor * live_index.capacity:
+            self.grow(store)
+
+    def grow(self, store, capacity=None):
+        """
+        Give the table a new live index with roughly twice the slots (or
+        *capacity*). Growth is incremental: the new index takes every write
+        from now on while the old one is still searched, and each write
+        moves the keys of GROW_SLOTS_PER_WRITE old slots across, so no
+        write pays for a full rehash. Records in the old index's chains are
+        never relinked; a moved key gets a copy of its head record linked
+        into the new index, so the old index stays valid on disk until it
+        is emptied and removed. A table closed or crashed mid-way reopens
+        with both indexes and carries on. Returns the new live index.
+        """
+        if self._growing is not None:
+            self.finish_growth(store)
+        for index in self._retired:
+            index.close()
+        self._retired = []
+        old_index = self.live_index
+        new_capacity = capacity or _next_prime(old_index.capacity * 2)
+        new_id = self.index_id + 1
+        self.logger.info("growing index {} from {} to {} slots".format(
+            old_index.name, old_index.capacity, new_capacity))
+        new_index = Index(self.tablemeta, self.config, self.logger, new_id, capacity=new_capacity)
+        new_index.key_count = 0
+        if new_index.key_filter is None and old_index.key_filter is not None:
+            # Keep a filter the table already has, as Index does on open.
+            bits_per_key = old_index.key_filter.bits_per_key(old_index.capacity)
+            new_index.key_filter = BloomFilter.create(new_index.filter_name, new_capacity, bits_per_key)
+        # Readers take index_list without a lock: publish it whole.
+        self.index_list = [new_index] + self.index_list
+        self.index_id = new_id
+        self.live_index = new_index
+        self._growing = old_index
+        self._grow_cursor = 0
+        return new_index
+
+    def finish_growth(self, store):
+        """Move every key left in older indexes into the live one."""
+        while self._growing is not None:
+            self._move_keys(store, self._growing.capacity)
+
+    def _move_keys(self, store, slots):
+        """Copy the keys in the next *slots* slots of the index being grown
+        out of into the live index, unless a newer index already has them,
+        and retire the old index once it has been walked to the end."""
+        old_index = self._growing
+        live_index = self.live_index
+        newer = self.index_list[:self.index_list.index(old_index)]
+        end = min(self._grow_cursor + slots, old_index.capacity)
+        for slot in range(self._grow_cursor, end):
+            for position in old_index.chain_positions(slot, store):
+                record = store.read(position)
+                if any(idx.head(record.key, store)[0] is not None for idx in newer):
+                    continue  # written since the growth began
+                live_index.put_record(Record(record.key, record.value, value_type=record.value_type,
+                                             value_link=record.value_link),
+                                      store, timestamp=record.timestamp)
+        self._grow_cursor = end
+        if end < old_index.capacity:
+            return
+        # The copies must be on disk before the old index goes.
+        store.sync()
+        live_index.flush()
+        self.index_list = [idx for idx in self.index_list if idx is not old_index]
+        self._retired_stats = self._add_stats(self._retired_stats, old_index.stats())
+        os.remove(old_index.name)
+        if old_index.key_filter is not None:
+            os.remove(old_index.filter_name)
+        self._retired.append(old_index)
+        self._growing = self.index_list[-1] if len(self.index_list) > 1 else None
+        self._grow_cursor = 0
+
     # @profile
     def get(self, key, store):
         for idx in self.index_list:
-            result = idx.get(key, store)
-            if result is not None:
-                return result
+            record = idx.get_head_only(key, store)[0]
+            if record is not None:
+                # The newest index holding the key decides, even when
+                # removals emptied its value: older ones only hold earlier
+                # versions of it while an index grows.
+                return Record.materialize_values(record, store)
         return None
 
     def get_head_only(self, key, store):
@@ -746,18 +1595,243 @@ class Indexer:
                 return record, pos
         return None, None
 
-    def scanner(self, store):
+    def _head_position(self, key, store):
         for idx in self.index_list:
+            position = idx.head_position(key, store)
+            if position is not None:
+                return position
+        return None
+
+    def stats(self):
+        """Lookup counters summed over the table's indexes: gets, chain
+        walks (gets, puts and deletes), the slots stepped through on those
+        walks, the longest walk seen and lookups ruled out by key filters."""
+        stats = dict(self._retired_stats)
+        for idx in self.index_list:
+            stats = self._add_stats(stats, idx.stats())
+        stats['indexes'] = len(self.index_list)
+        stats['index_capacity'] = sum(idx.capacity for idx in self.index_list)
+        return stats
+
+    @staticmethod
+    def _add_stats(total, stats):
+        total = dict(total)
+        for name, value in stats.items():
+            if name == 'longest_chain':
+                total[name] = max(total.get(name, 0), value)
+            else:
+                total[name] = total.get(name, 0) + value
+        return total
+
+    def scanner(self, store, order=None, advise=True):
+        """
+        Yield every live record with its full value. *order* (default
+        config SCAN_ORDER) is "slot", index slot by index slot, or
+        "physical", in store order (see physical_scanner). The scan runs
+        under sequential_access unless *advise* is False, for callers that
+        pause a scan between pages and advise around each page themselves.
+        """
+        if (order or getattr(self.config, 'SCAN_ORDER', 'slot')) == 'physical':
+            scan = self.physical_scanner(store)
+        else:
+            scan = self._slot_scanner(store)
+        if not advise:
+            yield from scan
+            return
+        with self.sequential_access(store):
+            yield from scan
+
+    def _slot_scanner(self, store):
+        index_list = self.index_list
+        for i, idx in enumerate(index_list):
             if __debug__ and self.logger.isEnabledFor(logging.DEBUG):
                 self.logger.debug("SCAN: index: %s", idx.name)
+            newer, older = index_list[:i], index_list[i + 1:]
             for r in idx.scanner(store):
+                if newer or older:
+                    # While an index grows a key can be in both indexes: as
+                    # a copy, with the same timestamp, or with a newer record
+                    # in the new index. Yield a copied key from the old
+                    # index and an updated one from the new.
+                    if any(_head_timestamp(o, r.key, store) == r.timestamp for o in older):
+                        continue
+                    if any(_head_timestamp(n, r.key, store) not in (None, r.timestamp) for n in newer):
+                        continue
                 yield r
 
+    @contextlib.contextmanager
+    def sequential_access(self, store):
+        """Store.sequential_access for *store* and every index file."""
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(store.sequential_access())
+            for idx in self.index_list:
+                stack.enter_context(idx.sequential_access())
+            yield
+
+    def prefetch(self, keys, store):
+        """Index.prefetch over every index file, e.g. for the keys of a
+        whole traversal frontier before they are looked up."""
+        keys = list(keys)
+        for idx in self.index_list:
+            idx.prefetch(keys, store)
+
+    def physical_scanner(self, store):
+        """
+        Yield every live record with its full value in store order. The
+        store is streamed front to back decoding only record headers (see
+        Store.scan_headers), and a record is yielded when the index head of
+        its key is that record; superseded versions, value chain segments
+        and deletion markers are stepped over. Nothing is collected up
+        front, so the scan holds no per-key state.
+        Records appended after the scan started are not read. A key written
+        while the scan runs is yielded once, with its current record, when
+        the scan reaches one of its older records; a deleted one is skipped.
+        """
+        end = store.end_position()
+        # Keys yielded with a record written after the scan started.
+        written = set()
+        for position, key, value_type, _ in store.scan_headers():
+            if position >= end:
+                return
+            if value_type == 'd' or key in written:
+                continue
+            head_position = self._head_position(key, store)
+            if head_position != position:
+                if head_position is None or head_position < end:
+                    continue
+                written.add(key)
+            record = store.read(head_position)
+            if record is None:
+                self.logger.error("Store EOF reached! Iteration terminated.")
+                return
+            record = Record.materialize_values(record, store)
+            if record is not None:
+                yield Record(record.key, record.value)
+
     def delete(self, key, store):
+        if self.dirty_keys is not None:
+            self.dirty_keys.add(key)
+        # While an index grows the key can be in both the old and new one.
+        deleted = False
         for idx in self.index_list:
             if idx.delete(key, store):
-                return True
-        return False
+                deleted = True
+        if deleted:
+            self.mutations += 1
+        return deleted
+
+
+def _head_timestamp(index, key, store):
+    record = index.head(key, store)[0]
+    return None if record is None else record.timestamp
+
 
 def cog_hash(string, index_capacity):
     return xxhash.xxh32(string, seed=2).intdigest() % index_capacity
+
+
+def _key_hash(key):
+    return xxhash.xxh32(key, seed=2).intdigest()
+
+
+def _fingerprint(key_hash):
+    """15-bit non-zero fingerprint from the high bits of the key hash (the
+    slot comes from the hash modulo the capacity)."""
+    return (key_hash >> 17) or 1
+
+
+def _pack_link(fingerprint, store_position):
+    return (fingerprint << _POSITION_BITS) | store_position
+
+
+def _advise(mm, advice):
+    if mm is None or advice is None:
+        return
+    try:
+        mm.madvise(advice)
+    except (OSError, ValueError):
+        pass  # closed mapping
+
+
+def _willneed(mm, offsets):
+    """madvise(MADV_WILLNEED) the pages of *mm* holding *offsets*, merging
+    neighbouring pages into one call."""
+    if mm is None or _MADV_WILLNEED is None or not offsets:
+        return
+    size = len(mm)
+    pages = sorted({offset & _PAGE_MASK for offset in offsets if offset < size})
+    start = end = None
+    for page in pages:
+        if page == end:
+            end += mmap.PAGESIZE
+            continue
+        if start is not None:
+            _willneed_range(mm, start, end, size)
+        start, end = page, page + mmap.PAGESIZE
+    if start is not None:
+        _willneed_range(mm, start, end, size)
+
+
+def _willneed_range(mm, start, end, size):
+    try:
+        mm.madvise(_MADV_WILLNEED, start, min(end, size) - start)
+    except (OSError, ValueError):
+        pass
+
+
+def _find_data_end(fd, position):
+    """Return the end of the records of a store file whose records end at
+    or after *position*: step over whole records until the zeros of
+    preallocated space (no record has a zero key_link), a torn record or
+    the end of the file."""
+    while True:
+        prefix = os.pread(fd, 22, position)
+        if len(prefix) < 18 or _i64_unpack_from(prefix, 0)[0] == 0 or prefix[8] > V2_VALUE_TYPE_REMOVED:
+            return position
+        try:
+            value_len, varint_size = _decode_varint(prefix, 17)
+        except ValueError:
+            return position
+        if value_len == 0:
+            return position  # torn: a payload holds at least the key
+        end = position + 17 + varint_size + value_len
+        if prefix[8] in (V2_VALUE_TYPE_LIST, V2_VALUE_TYPE_SET, V2_VALUE_TYPE_REMOVED):
+            end += 8
+        if len(os.pread(fd, 1, end - 1)) != 1:
+            return position
+        position = end
+
+
+def _trim_file(fd, end):
+    """Cut a preallocated store file back to the end of its records."""
+    os.ftruncate(fd, end)
+    os.pwrite(fd, _ZERO_BLOCK[:8], V2_DATA_END_OFFSET)
+
+
+def segment_path(store_path, segment):
+    """Path of segment *segment* of the store at *store_path*."""
+    return store_path if segment == 0 else "{}{}{}".format(store_path, STORE_SEGMENT_MARKER, segment)
+
+
+def store_segments(store_path):
+    """Paths of the segment files of the store at *store_path*, in order;
+    just *store_path* itself for a store that is not segmented."""
+    paths = [store_path]
+    while os.path.exists(segment_path(store_path, len(paths))):
+        paths.append(segment_path(store_path, len(paths)))
+    return paths
+
+
+def _next_prime(n):
+    """Smallest prime >= n. Index capacities are kept prime so that the
+    modulo in cog_hash spreads keys evenly."""
+    if n <= 2:
+        return 2
+    candidate = n if n % 2 else n + 1
+    while True:
+        for divisor in range(3, int(candidate ** 0.5) + 1, 2):
+            if candidate % divisor == 0:
+                break
+        else:
+            return candidate
+        candidate += 2
@@ -8,13 +8,14 @@ from cog.core import Record
 import logging
 import os
 import os.path
-from os import listdir
-from os.path import isfile
-from os.path import join
 import pickle
 import socket
 import uuid
 from .core import Table
+from .catalog import Catalog
+from .durability import DURABILITY_OS_BUFFER, check_durability
+from .memory_governor import memory_governor
+from .vertex_dictionary import VertexDictionary
 from . import config
 from .config import CogConfig
 import xxhash
@@ -70,6 +71,40 @@ class CacheData:
 
     __repr__ = __str__
 
+
+# Estimated size of a Cog.cache entry and of each set member it holds.
+_SET_CACHE_ENTRY_BYTES = 200
+_SET_CACHE_VALUE_BYTES = 80
+
+
+def _set_cache_bytes(cache_data):
+    return _SET_CACHE_ENTRY_BYTES + _SET_CACHE_VALUE_BYTES * len(cache_data.value)
+
+
+class _SetCacheBudget:
+    """Cog.cache's part in the process-wide memory budget (see cog.memory_governor)."""
+
+    def __init__(self, cache, governor):
+        self.cache = cache
+        self.governor = governor
+        self.budget = governor.max_bytes
+        self.hits = 0
+
+    def size_bytes(self):
+        return sum(_set_cache_bytes(cache_data) for cache_data in list(self.cache.values()))
+
+    def take_hits(self):
+        hits, self.hits = self.hits, 0
+        return hits
+
+    def set_budget(self, nbytes):
+        self.budget = nbytes
+        size = self.size_bytes()
+        while size > nbytes and self.cache:
+            _, cache_data = self.cache.popitem(last=False)
+            size -= _set_cache_bytes(cache_data)
+
+
 class Cog:
     """
     Read index file, record records stored in 'store' and write out new store file. 
@@ -80,17 +115,29 @@ class Cog:
                        1 = flush every write (safest, default)
                        0 = manual flush only (fastest, use sync())
                        N>1 = flush every N writes with async background threads
+        durability: "none", "os-buffer" (default) or "fsync-group"; see cog.durability.
     """
 
-    def __init__(self, shared_cache=None, flush_interval=1, config=None):
+    def __init__(self, shared_cache=None, flush_interval=1, config=None, durability=DURABILITY_OS_BUFFER):
         self.logger = logging.getLogger(__name__)
         self.config = config if config is not None else CogConfig()
         self.flush_interval = flush_interval
-        self.logger.info(f"Cog init (flush_interval={flush_interval})")
+        self.durability = check_durability(durability)
+        self.logger.info(f"Cog init (flush_interval={flush_interval}, durability={durability})")
         self.namespaces = {}
         self.current_table = None
         self.shared_cache = shared_cache
         self.cache = OrderedDict()
+        self.memory_governor = memory_governor(self.config)
+        self._set_cache_budget = None
+        if self.memory_governor is not None:
+            self._set_cache_budget = _SetCacheBudget(self.cache, self.memory_governor)
+            self.memory_governor.register(("set-cache", id(self)), self._set_cache_budget)
+        self.vertex_dictionaries = {}
+        self.catalogs = {}
+        # Namespaces between begin_batch and end_batch; tables opened there
+        # meanwhile join the batch.
+        self.batch_namespaces = set()
         '''creates Cog instance files.'''
         if os.path.exists(self.config.cog_instance_sys_file()):
             f = open(self.config.cog_instance_sys_file(), "rb")
@@ -148,27 +195,40 @@ class Cog:
         return os.path.exists(self.config.cog_data_dir(namespace))
 
     def create_table(self, table_name, namespace):
-        table = Table(table_name, namespace, self.instance_id, self.config, 
-                      shared_cache=self.shared_cache, flush_interval=self.flush_interval)
+        table = self._open_table(table_name, namespace)
         self.current_namespace = namespace
         self.current_table = table
         self.namespaces[namespace][table_name] = table
 
     def load_namespace(self, namespace):
+        # Tables are opened on first use (see get_table), so opening a
+        # namespace costs one catalog read rather than a scan of every
+        # table. Use warmup to fill the caches ahead of queries.
         if namespace not in self.namespaces:
             self.namespaces[namespace] = {}
-            for index_file_name in os.listdir(self.config.cog_data_dir(namespace)):
-                table_names = set()
-                if self.config.INDEX in index_file_name:
-                    id = self.config.index_id(index_file_name)
-                    table_name = self.config.get_table_name(index_file_name)
-                    if table_name not in table_names:
-                        table_names.add(table_name)
-                        self.logger.info("loading index: id: {}, table name: {}".format(id, table_name))
-                        self.load_table(table_name, namespace)
-                        self.refresh_cache(table_name, namespace)
+            self.logger.info("namespace {} has {} tables".format(namespace, len(self.catalog(namespace).tables())))
         self.current_namespace = namespace
 
+    def catalog(self, namespace=None):
+        """The namespace's Catalog (see cog.catalog), read on first use."""
+        namespace = namespace or self.current_namespace
+        catalog = self.catalogs.get(namespace)
+        if catalog is None:
+            catalog = self.catalogs[namespace] = Catalog(self.config, namespace)
+        return catalog
+
+    def _open_table(self, name, namespace):
+        catalog = self.catalog(namespace)
+        table = Table(name, namespace, self.instance_id, self.config,
+                      shared_cache=self.shared_cache,
+                      flush_interval=self.flush_interval,
+                      durability=self.durability,
+                      index_ids=catalog.index_ids(name, self.instance_id))
+        catalog.add_table(name)
+        if namespace in self.batch_namespaces:
+            table.store.begin_batch()
+        return table
+
     def load_table(self, name, namespace):
         # this method should not refresh cache since it's used in many places, this is basically "context switch" method.
         if namespace not in self.namespaces:
@@ -176,9 +236,7 @@ class Cog:
         self.logger.debug("loading table: " + name)
 
         if name not in self.namespaces[namespace]:
-            self.namespaces[namespace][name] = Table(name, namespace, self.instance_id, self.config,
-                                                     shared_cache=self.shared_cache,
-                                                     flush_interval=self.flush_interval)
+            self.namespaces[namespace][name] = self._open_table(name, namespace)
             self.logger.debug("created new table: " + name)
 
         self.current_table = self.namespaces[namespace][name]
@@ -207,6 +265,7 @@ class Cog:
         Enable batch mode on all tables in the current namespace.
         Defers flush() until end_batch() is called for better bulk insert performance.
         """
+        self.batch_namespaces.add(self.current_namespace)
         if self.current_namespace in self.namespaces and self.namespaces[self.current_namespace]:
             for table in self.namespaces[self.current_namespace].values():
                 if table:
@@ -216,6 +275,7 @@ class Cog:
         """
         End batch mode and flush all pending writes to disk.
         """
+        self.batch_namespaces.discard(self.current_namespace)
         if self.current_namespace in self.namespaces and self.namespaces[self.current_namespace]:
             for table in self.namespaces[self.current_namespace].values():
                 if table:
@@ -232,8 +292,24 @@ class Cog:
             for table_name, table in space.items():
                 if table:
                     table.sync()
+        self._save_catalogs()
+
+    def _save_catalogs(self):
+        """Record the index files, capacity and key count of every open
+        table in its namespace's catalog."""
+        for namespace, catalog in self.catalogs.items():
+            for table in list((self.namespaces.get(namespace) or {}).values()):
+                if table:
+                    catalog.update_table(table)
+            catalog.save()
 
     def close(self):
+        if self._set_cache_budget is not None:
+            self.memory_governor.unregister(("set-cache", id(self)), self._set_cache_budget)
+        for dictionary in self.vertex_dictionaries.values():
+            if dictionary is not None:
+                dictionary.close()
+        self._save_catalogs()
         for name, space in self.namespaces.items():
             if space is None:
                 continue
@@ -241,16 +317,110 @@ class Cog:
                 self.logger.info("closing.. : " + table.table_meta.name)
                 table.close()
 
-    def list_tables(self):
-        p = set(())
-        self.logger.debug("LIST TABLES, current namespace: " + str(self.current_namespace))
-        path = self.config.cog_data_dir(self.current_namespace)
-        if not os.path.exists(path):
-            return p
-        files = [f for f in listdir(path) if isfile(join(path, f))]
-        for f in files:
-            p.add(f.split("-")[0])
-        return list(p)
+    def compact(self, namespace=None, tables=None, lock=None, on_cutover=None):
+        """
+        Compact the stores of a namespace, dropping dead records (see
+        cog.compaction). Without a lock no other reader or writer may use the
+        namespace while it runs; with one, writers only wait for each table's
+        cut-over.
+        :param namespace: namespace to compact, defaults to the current one.
+        :param tables: optional list of table names, defaults to all tables.
+        :param lock: lock held by the namespace's readers and writers.
+        :param on_cutover: called with each table once its compacted files are live.
+        :return: dict with per-table reports and byte totals.
+        """
+        from cog.compaction import compact_table
+        namespace = namespace or self.current_namespace
+        if tables is None:
+            tables = self.list_tables(namespace)
+
+        def cutover(table):
+            # put_set dedupe entries hold store positions of the old file.
+            name = table.table_meta.name
+            for cache_key in [k for k in self.cache if k[0] == name]:
+                del self.cache[cache_key]
+            if on_cutover is not None:
+                on_cutover(table)
+
+        reports = []
+        catalog = self.catalog(namespace)
+        for name in sorted(tables):
+            report = compact_table(self.get_table(name, namespace), lock=lock, on_cutover=cutover)
+            # Snapshots from before this time can no longer read the table.
+            catalog.set_compacted_at(name, report['compacted_at'])
+            reports.append(report)
+        bytes_before = sum(r['bytes_before'] for r in reports)
+        bytes_after = sum(r['bytes_after'] for r in reports)
+        return {
+            'tables': reports,
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_reclaimed': bytes_before - bytes_after,
+        }
+
+    def warmup(self, namespace=None, tables=None, budget_bytes=None, lock=None):
+        """
+        Read the live records of a namespace's tables into their caches, up
+        to budget_bytes read from disk (see cog.warmup).
+        :param namespace: namespace to warm, defaults to the current one.
+        :param tables: optional list of table names, in the order to warm them.
+        :param budget_bytes: most store bytes to read, None for no limit.
+        :param lock: lock held by the namespace's readers and writers.
+        :return: dict with per-table record counts and totals.
+        """
+        from cog.warmup import warm_tables
+        return warm_tables(self, namespace or self.current_namespace, tables=tables,
+                           budget_bytes=budget_bytes, lock=lock)
+
+    def table_stats(self, namespace=None):
+        """
+        Cache, I/O and index counters (see Table.stats) for every table of
+        the namespace that has been opened, keyed by table name.
+        :param namespace: namespace to report on, defaults to the current one.
+        """
+        namespace = namespace or self.current_namespace
+        tables = self.namespaces.get(namespace) or {}
+        return {name: table.stats() for name, table in list(tables.items())}
+
+    def list_tables(self, namespace=None):
+        namespace = namespace or self.current_namespace
+        self.logger.debug("LIST TABLES, namespace: " + str(namespace))
+        return self.catalog(namespace).tables()
+
+    def vertex_dictionary(self, namespace=None):
+        """Return the namespace's VertexDictionary, or None if its edge tables
+        hold vertex strings."""
+        namespace = namespace or self.current_namespace
+        if namespace not in self.vertex_dictionaries:
+            name = self.config.GRAPH_VERTEX_DICTIONARY_TABLE_NAME
+            dictionary = None
+            if name in self.list_tables(namespace):
+                dictionary = VertexDictionary(self.get_table(name, namespace), governor=self.memory_governor)
+            self.vertex_dictionaries[namespace] = dictionary
+        return self.vertex_dictionaries[namespace]
+
+    def enable_vertex_dictionary(self, namespace=None):
+        """Create the namespace's vertex dictionary, so edge tables store
+        integer vertex ids. Only an empty namespace can be switched over."""
+        namespace = namespace or self.current_namespace
+        dictionary = self.vertex_dictionary(namespace)
+        if dictionary is None:
+            if self.list_tables(namespace):
+                raise ValueError("Namespace '{}' already holds data; a vertex dictionary "
+                                 "can only be enabled on an empty graph.".format(namespace))
+            name = self.config.GRAPH_VERTEX_DICTIONARY_TABLE_NAME
+            dictionary = VertexDictionary(self.get_table(name, namespace), governor=self.memory_governor)
+            self.vertex_dictionaries[namespace] = dictionary
+        return dictionary
+
+    def _edge_vertex(self, vertex, create=True):
+        """The form *vertex* takes in edge tables: the vertex itself, or its
+        dictionary id. None if the vertex has no id and create is off."""
+        dictionary = self.vertex_dictionary()
+        if dictionary is None:
+            return vertex
+        vertex_id = dictionary.id_of(vertex, create)
+        return None if vertex_id is None else str(vertex_id)
 
     def get_table(self, name, namespace=None):
         """Return a Table object without mutating current_table.
@@ -264,9 +434,7 @@ class Cog:
             self.namespaces[ns] = {}
         tables = self.namespaces[ns]
         if name not in tables:
-            tables[name] = Table(name, ns, self.instance_id, self.config,
-                                 shared_cache=self.shared_cache,
-                                 flush_interval=self.flush_interval)
+            tables[name] = self._open_table(name, ns)
         return tables[name]
 
     def use_namespace(self, namespace):
@@ -288,8 +456,7 @@ class Cog:
 
     def put(self, data):
         assert isinstance(data.key, (str, bytes)), "key must be str or bytes."
-        position = self.current_table.store.save(data)
-        self.current_table.indexer.put(data.key, position, self.current_table.store)
+        self.current_table.indexer.put_record(data, self.current_table.store)
 
     def put_list(self, data):
         '''
@@ -305,8 +472,7 @@ class Cog:
         new_record = Record(data.key, data.value, value_type='l')
         if record is not None:
             new_record.set_value_link(head_pos)
-        position = self.current_table.store.save(new_record)
-        self.current_table.indexer.put(new_record.key, position, self.current_table.store)
+        self.current_table.indexer.put_record(new_record, self.current_table.store)
 
     def put_set(self, data):
         """
@@ -315,52 +481,81 @@ class Cog:
         """
         assert isinstance(data.key, (str, bytes)), "key must be str or bytes."
         assert isinstance(data.value, str), "Only string type is supported."
+        self.put_set_many(data.key, (data.value,))
 
-        cache_key = (self.current_table.table_meta.name, data.key)
-
-        # Check cache for deduplication
+    def put_set_many(self, key, values):
+        """
+        Add several values to a set. New values are written as packed
+        segments of up to ADJACENCY_SEGMENT_SIZE values per record instead
+        of one record each. Deduplicates via in-memory cache.
+        """
+        assert isinstance(key, (str, bytes)), "key must be str or bytes."
+        table = self.current_table
+        cache_key = (table.table_meta.name, key)
+        cache_data = self.cache.get(cache_key)
+        budget = self._set_cache_budget
+        if cache_data is not None and budget is not None:
+            budget.hits += 1
+        grown = 0
+        if cache_data is None:
+            # Cache miss - use O(1) head lookup instead of O(n) full load
+            head_record, head_pos = table.indexer.get_head_only(key, table.store)
+            if head_record is None:
+                cache_data = CacheData(None, set())
+            else:
+                # Key exists but not in cache - load full record for deduplication
+                record = Record.materialize_values(head_record, table.store)
+                # set() works on both list and set; None when removals emptied it
+                cache_data = CacheData(head_pos, set(record.value) if record is not None else set())
+            self.cache[cache_key] = cache_data
+            grown = _set_cache_bytes(cache_data)
+            # Cache eviction
+            if len(self.cache) > self.config.LEVEL_2_CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+        new_values = []
+        for value in values:
+            assert isinstance(value, str), "Only string type is supported."
+            if value not in cache_data.value:
+                cache_data.value.add(value)
+                new_values.append(value)
+        if budget is not None:
+            budget.governor.note_growth(grown + _SET_CACHE_VALUE_BYTES * len(new_values))
+
+        segment_size = self.config.ADJACENCY_SEGMENT_SIZE
+        for start in range(0, len(new_values), segment_size):
+            # A segment holds its values newest first, like the chain itself.
+            segment = new_values[start:start + segment_size][::-1]
+            new_record = Record(key, segment if len(segment) > 1 else segment[0], value_type='l')
+            if cache_data.store_position is not None:
+                new_record.set_value_link(cache_data.store_position)
+            cache_data.store_position = table.indexer.put_record(new_record, table.store)
         if cache_key in self.cache:
-            cache_data = self.cache[cache_key]
-            if data.value in cache_data.value:
-                # Already exists, skip write
-                return
-            # Add to existing set
-            new_record = Record(data.key, data.value, value_type='l')
-            new_record.set_value_link(cache_data.store_position)
-            position = self.current_table.store.save(new_record)
-            self.current_table.indexer.put(new_record.key, position, self.current_table.store)
-            cache_data.value.add(data.value)
-            cache_data.store_position = position
             self.cache.move_to_end(cache_key)
-            return
 
-        # Cache miss - use O(1) head lookup instead of O(n) full load
-        head_record, head_pos = self.current_table.indexer.get_head_only(data.key, self.current_table.store)
-        
-        if head_record is None:
-            # First value for this key
-            new_record = Record(data.key, data.value, value_type='l')
-            position = self.current_table.store.save(new_record)
-            self.current_table.indexer.put(new_record.key, position, self.current_table.store)
-            self.cache[cache_key] = CacheData(position, {data.value})
-        else:
-            # Key exists but not in cache - load full record for deduplication
-            record = self.current_table.indexer.get(data.key, self.current_table.store)
-            existing_values = set(record.value)  # set() works on both list and set
-            if data.value not in existing_values:
-                new_record = Record(data.key, data.value, value_type='l')
-                new_record.set_value_link(head_pos)
-                position = self.current_table.store.save(new_record)
-                self.current_table.indexer.put(new_record.key, position, self.current_table.store)
-                existing_values.add(data.value)
-                self.cache[cache_key] = CacheData(position, existing_values)
-            else:
-                self.cache[cache_key] = CacheData(head_pos, existing_values)
-
-        # Cache eviction (once, outside if/else)
-        if len(self.cache) > self.config.LEVEL_2_CACHE_SIZE:
-            self.cache.popitem(last=False)
-        self.cache.move_to_end(cache_key)
+    def remove_value(self, key, value):
+        """
+        Remove *value* from the list at *key* by appending one removal
+        record (value_type 'r') to the head of its value chain, instead of
+        rewriting the list. Reads leave the value out of the records older
+        than the removal, and compaction drops both. A key holding only
+        *value*, or a single value or a set, is deleted instead.
+        """
+        assert isinstance(key, (str, bytes)), "key must be str or bytes."
+        table = self.current_table
+        head, head_pos = table.indexer.get_head_only(key, table.store)
+        if head is None:
+            return
+        if head.value_type not in ('l', 'r') or (
+                head.value_type == 'l' and head.value == value and head.value_link == Record.VALUE_LINK_NULL):
+            self.delete(key)
+            return
+        removal = Record(key, value, value_type='r', value_link=head_pos)
+        position = table.indexer.put_record(removal, table.store)
+        cache_data = self.cache.get((table.table_meta.name, key))
+        if cache_data is not None:
+            cache_data.value.discard(value)
+            cache_data.store_position = position
 
     def get(self, key):
         """Retrieve the record for *key* from the current table.
@@ -382,52 +577,29 @@ class Cog:
                 yield r
 
     def delete(self, key):
-        self.current_table.indexer.delete(key, self.current_table.store)
+        if self.current_table.indexer.delete(key, self.current_table.store):
+            # Keeps the delete visible to snapshot reads (Graph.as_of).
+            self.current_table.store.save_deletion(key)
         cache_key = (self.current_table.table_meta.name, key)
         if cache_key in self.cache:
             del self.cache[cache_key]
 
     def delete_edge(self, vertex1, predicate, vertex2):
         """
-        Deletes edge in both directions.
+        Deletes edge in both directions. Each adjacency list loses the edge
+        with one removal record (see remove_value), whatever its length.
         :param vertex1:
         :param predicate:
         :param vertex2:
         :return:
         """
         predicate_hashed = hash_predicate(predicate)
-        out_object = self.use_table(predicate_hashed).get(out_nodes(vertex1))
-
-        # if out vertex1 points to a list, then update else delete.
-        if out_object:
-            if out_object.value_type == 'l':
-                other_values = []
-                for v in out_object.value:
-                    if v != vertex2:
-                        other_values.append(v)
-
-                # update: delete and put_set
-                self.use_table(predicate_hashed).delete(out_nodes(vertex1))
-                for ov in other_values:
-                    self.use_table(predicate_hashed).put_set(Record(out_nodes(vertex1), ov))
-            else:
-                self.use_table(predicate_hashed).delete(out_nodes(vertex1))
-
-        in_object = self.use_table(predicate_hashed).get(in_nodes(vertex2))
-        # if in vertex2 points to a list, then update else delete.
-        if in_object:
-            if in_object.value_type == 'l':
-                other_values = []
-                for v in in_object.value:
-                    if v != vertex1:
-                        other_values.append(v)
-
-                # update: delete and put_set
-                self.use_table(predicate_hashed).delete(in_nodes(vertex2))
-                for ov in other_values:
-                    self.use_table(predicate_hashed).put_set(Record(in_nodes(vertex2), ov))
-            else:
-                self.use_table(predicate_hashed).delete(in_nodes(vertex2))
+        vertex1 = self._edge_vertex(vertex1, create=False)
+        vertex2 = self._edge_vertex(vertex2, create=False)
+        if vertex1 is None or vertex2 is None:
+            return  # a vertex the dictionary has never seen has no edges
+        self.use_table(predicate_hashed).remove_value(out_nodes(vertex1), vertex2)
+        self.use_table(predicate_hashed).remove_value(in_nodes(vertex2), vertex1)
 
     def put_node(self, vertex1, predicate, vertex2):
         """
@@ -451,11 +623,48 @@ class Cog:
         # add to node set
         predicate_hashed = hash_predicate(predicate)
         self.use_table(self.config.GRAPH_EDGE_SET_TABLE_NAME).put(Record(str(predicate_hashed), predicate))
+        self.catalog().add_predicate(predicate_hashed, predicate)
         self.use_table(self.config.GRAPH_NODE_SET_TABLE_NAME).put(Record(vertex1, ""))
         self.use_table(self.config.GRAPH_NODE_SET_TABLE_NAME).put(Record(vertex2, ""))
+        vertex1, vertex2 = self._edge_vertex(vertex1), self._edge_vertex(vertex2)
         self.use_table(predicate_hashed).put_set(Record(out_nodes(vertex1), vertex2))
         self.use_table(predicate_hashed).put_set(Record(in_nodes(vertex2), vertex1))
 
+    def put_nodes(self, triples):
+        """
+        Graph method: put_node for many (vertex1, predicate, vertex2) triples.
+        Each vertex and predicate is recorded once, and the edges of each
+        adjacency key are added with one put_set_many call, so they land in
+        packed segments rather than one record per edge.
+        :param triples: iterable of (vertex1, predicate, vertex2)
+        :return:
+        """
+        predicates = {}
+        vertices = {}
+        adjacency = {}
+        dictionary = self.vertex_dictionary()
+        for vertex1, predicate, vertex2 in triples:
+            predicate_hashed = hash_predicate(predicate)
+            predicates[predicate_hashed] = predicate
+            vertices[vertex1] = None
+            vertices[vertex2] = None
+            if dictionary is not None:
+                vertex1 = str(dictionary.id_of(vertex1, create=True))
+                vertex2 = str(dictionary.id_of(vertex2, create=True))
+            adjacency.setdefault((predicate_hashed, out_nodes(vertex1)), []).append(vertex2)
+            adjacency.setdefault((predicate_hashed, in_nodes(vertex2)), []).append(vertex1)
+
+        edge_set = self.use_table(self.config.GRAPH_EDGE_SET_TABLE_NAME)
+        catalog = self.catalog()
+        for predicate_hashed, predicate in predicates.items():
+            edge_set.put(Record(str(predicate_hashed), predicate))
+            catalog.add_predicate(predicate_hashed, predicate)
+        node_set = self.use_table(self.config.GRAPH_NODE_SET_TABLE_NAME)
+        for vertex in vertices:
+            node_set.put(Record(vertex, ""))
+        for (predicate_hashed, key), values in adjacency.items():
+            self.use_table(predicate_hashed).put_set_many(key, values)
+
     def put_new_edge(self, vertex1, predicate, vertex2):
         """
         Graph method
@@ -466,8 +675,10 @@ class Cog:
         """
         predicate_hashed = hash_predicate(predicate)
         self.use_table(self.config.GRAPH_EDGE_SET_TABLE_NAME).put(Record(str(predicate_hashed), predicate))
+        self.catalog().add_predicate(predicate_hashed, predicate)
         self.use_table(self.config.GRAPH_NODE_SET_TABLE_NAME).put(Record(vertex1, ""))
         self.use_table(self.config.GRAPH_NODE_SET_TABLE_NAME).put(Record(vertex2, ""))
+        vertex1, vertex2 = self._edge_vertex(vertex1), self._edge_vertex(vertex2)
         self.use_table(predicate_hashed).put(Record(out_nodes(vertex1), vertex2))
         self.use_table(predicate_hashed).put(Record(in_nodes(vertex2), vertex1))
 
@@ -493,9 +704,10 @@ class Cog:
         access, external synchronization (e.g., locking) is required.
         """
         predicate_hashed = hash_predicate(predicate)
+        edge_vertex1 = self._edge_vertex(vertex1, create=False)
 
         # Get vertex1's current outgoing edges (the old targets)
-        out_object = self.use_table(predicate_hashed).get(out_nodes(vertex1))
+        out_object = self.use_table(predicate_hashed).get(out_nodes(edge_vertex1)) if edge_vertex1 is not None else None
         if out_object:
             # Collect old targets to clean up their incoming edges
             if out_object.value_type == 'l' or out_object.value_type == 'u':
@@ -504,22 +716,25 @@ class Cog:
                 old_targets = [out_object.value]
             
             # Delete vertex1's outgoing edges
-            self.use_table(predicate_hashed).delete(out_nodes(vertex1))
+            self.use_table(predicate_hashed).delete(out_nodes(edge_vertex1))
             
             # Remove vertex1 from each old target's incoming edge list
             for old_target in old_targets:
-                in_object = self.use_table(predicate_hashed).get(in_nodes(old_target))
-                if in_object:
-                    if in_object.value_type == 'l' or in_object.value_type == 'u':
-                        # Multi-value: keep all incoming edges except from vertex1
-                        other_sources = [v for v in in_object.value if v != vertex1]
-                        self.use_table(predicate_hashed).delete(in_nodes(old_target))
-                        for src in other_sources:
-                            self.use_table(predicate_hashed).put_set(Record(in_nodes(old_target), src))
-                    else:
-                        # Single value: delete only if it's from vertex1
-                        if in_object.value == vertex1:
-                            self.use_table(predicate_hashed).delete(in_nodes(old_target))
+                table = self.use_table(predicate_hashed).current_table
+                in_object, _ = table.indexer.get_head_only(in_nodes(old_target), table.store)
+                if in_object is None:
+                    continue
+                if in_object.value_type == 'l' or in_object.value_type == 'r':
+                    # Multi-value: one removal record for vertex1
+                    self.remove_value(in_nodes(old_target), edge_vertex1)
+                elif in_object.value_type == 'u':
+                    in_object = self.get(in_nodes(old_target))
+                    other_sources = [v for v in in_object.value if v != edge_vertex1]
+                    self.delete(in_nodes(old_target))
+                    self.put_set_many(in_nodes(old_target), other_sources)
+                elif in_object.value == edge_vertex1:
+                    # Single value: delete only if it's from vertex1
+                    self.delete(in_nodes(old_target))
 
         # Create the new edge (both directions)
         self.put_node(vertex1, predicate, vertex2)
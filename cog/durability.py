@@ -0,0 +1,100 @@
+"""Durability modes and the process-wide group committer.
+
+    none         writes stay in the process's write buffers until sync(),
+                 close() or a read needs them; a crash loses them.
+    os-buffer    (default) writes are handed to the OS per flush_interval;
+                 they survive a process crash but not a power loss.
+    fsync-group  writes from every table sharing the same settings are
+                 coalesced into one fsync (and index msync) every
+                 GROUP_COMMIT_INTERVAL_MS, or sooner once GROUP_COMMIT_BYTES
+                 have been written. A crash loses at most that window;
+                 sync() is a durability barrier.
+"""
+
+import logging
+import threading
+import weakref
+
+DURABILITY_NONE = "none"
+DURABILITY_OS_BUFFER = "os-buffer"
+DURABILITY_FSYNC_GROUP = "fsync-group"
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_OS_BUFFER, DURABILITY_FSYNC_GROUP)
+
+logger = logging.getLogger(__name__)
+
+
+def check_durability(durability):
+    if durability not in DURABILITY_MODES:
+        raise ValueError("Unknown durability mode: {!r}, expected one of {}".format(
+            durability, ", ".join(DURABILITY_MODES)))
+    return durability
+
+
+class GroupCommitter:
+    """Background thread that makes the writes of many stores durable together.
+
+    Stores report each write with note_write(); tables register so their
+    index files are msynced along with their store.
+    """
+
+    def __init__(self, interval_ms, max_bytes):
+        self.interval = interval_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.commits = 0
+        self._cond = threading.Condition()
+        self._dirty = {}
+        self._pending_bytes = 0
+        self._tables = weakref.WeakSet()
+        self._thread = None
+
+    def register(self, table):
+        self._tables.add(table)
+
+    def note_write(self, store, nbytes):
+        with self._cond:
+            first = not self._dirty
+            self._dirty[store] = True
+            self._pending_bytes += nbytes
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cog-group-commit", daemon=True)
+                self._thread.start()
+            if first or self._pending_bytes >= self.max_bytes:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+                # The first write of a group waits at most one interval.
+                self._cond.wait_for(lambda: self._pending_bytes >= self.max_bytes, timeout=self.interval)
+                stores = self._dirty
+                self._dirty = {}
+                self._pending_bytes = 0
+            try:
+                self.commit(stores)
+            except Exception as e:
+                logger.error("group commit failed: %s", e)
+
+    def commit(self, stores):
+        for store in stores:
+            store.fsync()
+        for table in list(self._tables):
+            if table.store in stores:
+                table.indexer.flush()
+        self.commits += 1
+
+
+_committers = {}
+_committers_lock = threading.Lock()
+
+
+def group_committer(config):
+    """The shared GroupCommitter for *config*'s interval and byte settings."""
+    key = (config.GROUP_COMMIT_INTERVAL_MS, config.GROUP_COMMIT_BYTES)
+    with _committers_lock:
+        committer = _committers.get(key)
+        if committer is None:
+            committer = _committers[key] = GroupCommitter(*key)
+        return committer
+
@@ -64,22 +64,37 @@ def get_triples(graph):
     vertices = [r.key for r in graph.cog.scanner()]
 
     # Collect valid predicate hashes (skip internal tables)
-    internal = (graph.config.GRAPH_NODE_SET_TABLE_NAME, graph.config.GRAPH_EDGE_SET_TABLE_NAME)
+    internal = (graph.config.GRAPH_NODE_SET_TABLE_NAME, graph.config.GRAPH_EDGE_SET_TABLE_NAME,
+                graph.config.GRAPH_VERTEX_DICTIONARY_TABLE_NAME)
     predicates = [
         (ph, graph._predicate_reverse_lookup_cache.get(ph, ph))
         for ph in graph.all_predicates if ph not in internal
     ]
 
+    # Edge tables of a graph with a vertex dictionary hold vertex ids
+    dictionary = graph.cog.vertex_dictionary(graph.graph_name)
+
     # For each predicate, check outgoing edges from each vertex
     for pred_hash, predicate_name in predicates:
         for vertex in vertices:
-            record = graph.cog.use_table(pred_hash).get(out_nodes(vertex))
+            key = vertex
+            if dictionary is not None:
+                key = dictionary.id_of(vertex)
+                if key is None:
+                    continue
+                key = str(key)
+            record = graph.cog.use_table(pred_hash).get(out_nodes(key))
             if record is not None:
                 if record.value_type == "s":
-                    yield (vertex, predicate_name, str(record.value))
+                    objects = [str(record.value)]
                 elif record.value_type in ("l", "u"):
-                    for obj in record.value:
-                        yield (vertex, predicate_name, obj)
+                    objects = record.value
+                else:
+                    continue
+                if dictionary is not None:
+                    objects = dictionary.names_of(objects)
+                for obj in objects:
+                    yield (vertex, predicate_name, obj)
 
 
 def export_triples(graph, filepath, fmt="nt", strict=False, triples_iter=None):
@@ -0,0 +1,109 @@
+"""Process-wide memory budget for CogDB caches.
+
+With MAX_CACHE_BYTES set, every store record cache, every Cog set cache
+(Cog.cache), every MemoryView and every VertexDictionary registers with one
+MemoryGovernor, which splits the budget between them. A quarter of the budget is shared evenly;
+the rest follows the hits each cache saw since the previous rebalance, so
+capacity moves toward the hottest tables. A rebalance runs whenever the
+caches have grown by a sixteenth of the budget since the last one.
+
+Sizes are estimates: encoded record sizes plus a fixed per-object
+overhead, not exact Python heap usage.
+
+A cache taking part implements:
+    size_bytes()        -> estimated bytes held
+    take_hits()         -> hits since the last call
+    set_budget(nbytes)  -> shrink to at most nbytes, and stay under it
+    budget              -> the last nbytes set
+"""
+
+import logging
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Part of the budget split evenly, whatever the hit counts.
+EVEN_SHARE = 0.25
+# Growth, as a fraction of the budget, that triggers a rebalance.
+REBALANCE_FRACTION = 16
+
+
+class MemoryGovernor:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.rebalances = 0
+        self._caches = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self._growth = 0
+
+    def register(self, key, cache):
+        """Add *cache* under *key*; a cache registered under the same key
+        before is replaced. The new cache starts with an even share. The
+        other caches keep their budgets until the next rebalance, so a
+        register costs the same however many caches there are; the caches
+        can only grow past the budget by what triggers that rebalance."""
+        with self._lock:
+            self._caches[key] = cache
+            count = len(self._caches)
+        cache.set_budget(self.max_bytes // count)
+
+    def unregister(self, key, cache):
+        """Remove *cache*; its budget goes to the others at the next
+        rebalance."""
+        with self._lock:
+            if self._caches.get(key) is cache:
+                del self._caches[key]
+
+    def note_growth(self, nbytes):
+        """Called by caches as they grow; rebalances every so often."""
+        self._growth += nbytes
+        if self._growth >= self.max_bytes // REBALANCE_FRACTION:
+            self.rebalance()
+
+    def budget_of(self, key):
+        cache = self._caches.get(key)
+        return None if cache is None else cache.budget
+
+    def rebalance(self):
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is already rebalancing
+        try:
+            self._growth = 0
+            caches = list(self._caches.values())
+            if not caches:
+                return
+            hits = [cache.take_hits() for cache in caches]
+            even = int(self.max_bytes * EVEN_SHARE) // len(caches)
+            by_hits = self.max_bytes - even * len(caches)
+            total_hits = sum(hits)
+            for cache, cache_hits in zip(caches, hits):
+                if total_hits:
+                    share = by_hits * cache_hits // total_hits
+                else:
+                    share = by_hits // len(caches)
+                cache.set_budget(even + share)
+            self.rebalances += 1
+        finally:
+            self._lock.release()
+
+    def size_bytes(self):
+        return sum(cache.size_bytes() for cache in list(self._caches.values()))
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def memory_governor(config):
+    """The shared MemoryGovernor for *config*'s MAX_CACHE_BYTES, or None
+    when no process-wide budget is set."""
+    max_bytes = config.MAX_CACHE_BYTES
+    if max_bytes is None:
+        return None
+    with _governors_lock:
+        governor = _governors.get(max_bytes)
+        if governor is None:
+            governor = _governors[max_bytes] = MemoryGovernor(max_bytes)
+        return governor
@@ -8,6 +8,12 @@ result so the same vertex never misses twice.
 Writes are applied inline via add_edge / remove_edge so the view
 never goes stale relative to disk.
 
+For a graph with a vertex dictionary the view holds integer ids and
+translates at its edges: vertex strings in, vertex strings out.
+
+With a memory governor (MAX_CACHE_BYTES, see cog.memory_governor) a view
+that outgrows its share is emptied and refills on demand.
+
 Pure Python, no external dependencies.
 """
 
@@ -17,11 +23,19 @@ _PRESENT = True
 
 DEFAULT_PAGE_SIZE = 50_000
 
+# Estimated size of one adjacency entry and of each neighbour in it.
+_ENTRY_BYTES = 250
+_TARGET_BYTES = 60
+
 
 class MemoryView:
 
-    def __init__(self, table, page_size=None, shared_out=None, shared_in=None):
+    def __init__(self, table, page_size=None, shared_out=None, shared_in=None, dictionary=None, governor=None):
         self._table = table
+        self._dictionary = dictionary
+        self.hits = 0
+        self.budget = None
+        self._governor = None
         self._page_size = page_size or DEFAULT_PAGE_SIZE
         self._out = shared_out if shared_out is not None else {}
         self._in = shared_in if shared_in is not None else {}
@@ -30,52 +44,91 @@ class MemoryView:
             self._scanner = None
             self._fully_loaded = True
         else:
-            self._scanner = table.indexer.scanner(table.store)
+            self._scanner = table.indexer.scanner(table.store, advise=False)
             self._fully_loaded = False
+            if governor is not None:
+                self._governor = governor
+                governor.register(("memory-view", id(self)), self)
             self._load_page()
 
     def _load_page(self):
         if self._fully_loaded:
             return
         count = 0
-        for record in self._scanner:
-            self._ingest_record(record)
-            count += 1
-            if count >= self._page_size:
-                return
-        self._fully_loaded = True
-        self._scanner = None
+        grown = 0
+        # Sequential advice per page only: between pages the table serves
+        # point lookups and keeps its random-access advice.
+        try:
+            with self._table.indexer.sequential_access(self._table.store):
+                for record in self._scanner:
+                    grown += self._ingest_record(record)
+                    count += 1
+                    if count >= self._page_size:
+                        return
+            self._fully_loaded = True
+            self._scanner = None
+        finally:
+            if self._governor is not None:
+                self._governor.note_growth(grown)
 
     def _ingest_record(self, record):
+        """Add a scanned record; returns its estimated size."""
         key_bytes = record.key
         if not isinstance(key_bytes, (bytes, bytearray)):
-            return
+            return 0
         prefix = key_bytes[0:1]
-        node = key_bytes[1:].decode('utf-8')
-        targets = dict.fromkeys(record.value, _PRESENT)
+        if self._dictionary is not None:
+            node = int(key_bytes[1:])
+        else:
+            node = key_bytes[1:].decode('utf-8')
+        targets = self._targets(record)
         if prefix == b'\x00':
             self._out[node] = targets
         elif prefix == b'\x01':
             self._in[node] = targets
+        return _ENTRY_BYTES + _TARGET_BYTES * len(targets)
+
+    def _targets(self, record):
+        if self._dictionary is None:
+            return dict.fromkeys(record.value, _PRESENT)
+        # Scanned records come back without their value type.
+        values = record.value if isinstance(record.value, (list, set)) else [record.value]
+        return dict.fromkeys(map(int, values), _PRESENT)
 
     def _demand_load(self, node_id, direction):
         """Single-key disk read on cache miss. Caches the result."""
-        indexer = self._table.indexer
-        store = self._table.store
+        key = str(node_id) if self._dictionary is not None else node_id
         if direction == 'out':
-            record = indexer.get(out_nodes(node_id), store)
-            if record is not None:
-                self._out[node_id] = dict.fromkeys(record.value, _PRESENT)
-                return self._out[node_id]
-            self._out[node_id] = {}
-            return None
+            adjacency, key = self._out, out_nodes(key)
         else:
-            record = indexer.get(in_nodes(node_id), store)
-            if record is not None:
-                self._in[node_id] = dict.fromkeys(record.value, _PRESENT)
-                return self._in[node_id]
-            self._in[node_id] = {}
+            adjacency, key = self._in, in_nodes(key)
+        record = self._table.indexer.get(key, self._table.store)
+        if record is None:
+            adjacency[node_id] = {}
             return None
+        targets = adjacency[node_id] = self._targets(record)
+        if self._governor is not None:
+            self._governor.note_growth(_ENTRY_BYTES + _TARGET_BYTES * len(targets))
+        return targets
+
+    def _id(self, node_id, create=False):
+        """Internal key for a vertex string: itself, or its dictionary id."""
+        if self._dictionary is None:
+            return node_id
+        return self._dictionary.id_of(node_id, create)
+
+    def missing(self, node_ids, direction):
+        """The vertices in *node_ids* whose *direction* adjacency is not in
+        the view yet, so reading them would go to disk."""
+        if self._fully_loaded:
+            return []
+        adjacency = self._out if direction == 'out' else self._in
+        missing = []
+        for node_id in node_ids:
+            key = self._id(node_id)
+            if key is not None and key not in adjacency:
+                missing.append(node_id)
+        return missing
 
     def load_more(self):
         self._load_page()
@@ -85,6 +138,7 @@ class MemoryView:
         return self._fully_loaded
 
     def add_edge(self, src, tgt):
+        src, tgt = self._id(src, True), self._id(tgt, True)
         o = self._out.get(src)
         if o is None:
             self._out[src] = {tgt: _PRESENT}
@@ -97,6 +151,7 @@ class MemoryView:
             i[src] = _PRESENT
 
     def remove_edge(self, src, tgt):
+        src, tgt = self._id(src), self._id(tgt)
         o = self._out.get(src)
         if o is not None:
             o.pop(tgt, None)
@@ -105,6 +160,7 @@ class MemoryView:
             i.pop(src, None)
 
     def replace_out(self, src, new_tgt):
+        src, new_tgt = self._id(src, True), self._id(new_tgt, True)
         old = self._out.get(src)
         if old:
             for t in old:
@@ -122,21 +178,44 @@ class MemoryView:
         self._out.clear()
         self._in.clear()
         if not self._shared:
-            self._scanner = self._table.indexer.scanner(self._table.store)
+            self._scanner = self._table.indexer.scanner(self._table.store, advise=False)
             self._fully_loaded = False
 
     def get_out(self, node_id):
-        result = self._out.get(node_id)
-        if result is not None:
-            return result if result else None
-        if not self._fully_loaded:
-            return self._demand_load(node_id, 'out')
-        return None
+        if self._dictionary is not None:
+            return self._names(self._get(self._out, self._id(node_id), 'out'))
+        return self._get(self._out, node_id, 'out')
 
     def get_in(self, node_id):
-        result = self._in.get(node_id)
+        if self._dictionary is not None:
+            return self._names(self._get(self._in, self._id(node_id), 'in'))
+        return self._get(self._in, node_id, 'in')
+
+    def _get(self, adjacency, node_id, direction):
+        if node_id is None:
+            return None
+        result = adjacency.get(node_id)
         if result is not None:
+            self.hits += 1
             return result if result else None
         if not self._fully_loaded:
-            return self._demand_load(node_id, 'in')
+            return self._demand_load(node_id, direction)
         return None
+
+    def size_bytes(self):
+        return sum(_ENTRY_BYTES + _TARGET_BYTES * len(targets)
+                   for adjacency in (self._out, self._in) for targets in list(adjacency.values()))
+
+    def take_hits(self):
+        hits, self.hits = self.hits, 0
+        return hits
+
+    def set_budget(self, nbytes):
+        """Memory governor hook: empty the view if it holds more than
+        *nbytes*; it then refills page by page and on demand."""
+        self.budget = nbytes
+        if self.size_bytes() > nbytes:
+            self.clear()
+
+    def _names(self, ids):
+        return self._dictionary.names_of(ids) if ids else None
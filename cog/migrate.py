@@ -19,7 +19,7 @@ import time
 from cog.codec import SpindleCodec, V2_MAGIC, V2_HEADER_SIZE
 from cog import spindle_pack
 from cog.config import INDEX_BLOCK_LEN as _NEW_INDEX_BLOCK_LEN, INDEX_CAPACITY as _NEW_INDEX_CAPACITY
-from cog.core import cog_hash
+from cog.core import cog_hash, TRANSIENT_FILE_SUFFIXES
 
 # ---------------------------------------------------------------------------
 # Legacy constants (duplicated here so the migrate module is self-contained
@@ -321,7 +321,7 @@ def migrate(db_path, remove_backups=False):
             fpath = os.path.join(ns_dir, fname)
             if not os.path.isfile(fpath):
                 continue
-            if fname.endswith(('.v3_backup', '.v4_tmp')):
+            if fname.endswith(TRANSIENT_FILE_SUFFIXES):
                 continue
 
             if STORE_MARKER in fname:
@@ -0,0 +1,447 @@
+"""Verify and rebuild CogDB index files from their stores.
+
+Usage:
+    from cog.repair import repair
+    report = repair("/path/to/cog-data")                   # every graph
+    report = repair("/path/to/cog-data", "social", verify_only=True)
+
+or from a shell:
+    python -m cog.repair /path/to/cog-data [graph ...] [--verify-only] [--force] [--workers N]
+
+An index only points into its store, so it can always be recovered from the
+store alone: the newest record of a key in file order is its head, unless a
+deletion marker (see Store.save_deletion) came after it. Each store is
+scanned once through an mmap, decoding only record headers. The index is
+then checked against that scan, and rebuilt if any key is missing, stale,
+left over from a delete, or reached through a broken link. Rebuilding
+relinks the collision chains through the head records' key_links in place,
+writes a single new index file (and Bloom filter, see cog.bloom) and swaps
+it in, removing any other index files of the table. A store ending in a
+torn record (a crash mid-append) is truncated to its last whole record.
+Every segment of a segmented store (STORE_SEGMENT_BYTES) is scanned. A
+store left preallocated (STORE_EXTENT_BYTES) ends at the zeros past its
+records; it is cut back to them when the index is rebuilt.
+
+Tables are independent, so they are processed in a pool of worker
+processes, largest store first.
+
+The graph must not be open while it is repaired. An interrupted repair
+leaves the old index possibly stale; run it again. Keys deleted by a
+version of CogDB that did not write deletion markers, and not compacted
+since, come back.
+"""
+
+import argparse
+import concurrent.futures
+import mmap
+import os
+import struct
+import sys
+import time
+
+from cog.bloom import BloomFilter
+from cog.codec import SpindleCodec, V2_MAGIC, V2_HEADER_SIZE, V2_DATA_END_OFFSET
+from cog.config import CogConfig
+from cog.core import (
+    Record,
+    REPAIR_TMP_SUFFIX,
+    TRANSIENT_FILE_SUFFIXES,
+    _key_hash,
+    _fingerprint,
+    _next_prime,
+    _pack_link,
+    _POSITION_BITS,
+    _POSITION_MASK,
+    _SEGMENT_SHIFT,
+    STORE_SEGMENT_MARKER,
+    store_segments,
+)
+from cog.spindle_pack import _decode_varint
+
+_I64 = struct.Struct('<q')
+# key_link, value type and timestamp precede every record's payload.
+_RECORD_PREFIX_LEN = 17
+
+
+class _Unreadable(Exception):
+    """A record inside the store, not at its end, cannot be decoded."""
+
+
+class _MappedStore:
+    """The segment files of a store, mapped for reading and relinking."""
+
+    def __init__(self, paths, segmented):
+        self.shift = _SEGMENT_SHIFT if segmented else _POSITION_BITS
+        self.mask = (1 << self.shift) - 1
+        self.files = []
+        self.mems = []
+        self.sizes = []
+        # Nonzero for a segment preallocated past its records: the header's
+        # record of where they end (see cog.codec).
+        self.data_ends = []
+        # Offset just past the last whole record of each segment, and the
+        # bytes of torn record after it.
+        self.ends = []
+        self.torn = []
+        try:
+            for path in paths:
+                f = open(path, 'r+b')
+                self.files.append(f)
+                size = os.fstat(f.fileno()).st_size
+                if size < V2_HEADER_SIZE or f.read(len(V2_MAGIC)) != V2_MAGIC:
+                    raise ValueError("{} is not a Spindle store (see cog.migrate)".format(path))
+                self.sizes.append(size)
+                self.mems.append(mmap.mmap(f.fileno(), 0))
+                self.data_ends.append(_I64.unpack_from(self.mems[-1], V2_DATA_END_OFFSET)[0])
+        except BaseException:
+            self.close()
+            raise
+
+    def locate(self, position):
+        """Return (mapping, offset) of a record position, mapping None if
+        it does not point at the data of a segment."""
+        segment = position >> self.shift
+        offset = position & self.mask
+        if segment >= len(self.ends) or not V2_HEADER_SIZE <= offset < self.ends[segment]:
+            return None, offset
+        return self.mems[segment], offset
+
+    def close(self):
+        for mem in self.mems:
+            mem.close()
+        for f in self.files:
+            f.close()
+
+
+def _scan_store(store, codec):
+    """Scan every segment of *store*, setting store.ends. Returns (heads,
+    records, deleted): heads maps every live key to its newest record."""
+    heads = {}
+    records = 0
+    last = len(store.mems) - 1
+    for segment, mem in enumerate(store.mems):
+        base = segment << store.shift
+        position = V2_HEADER_SIZE
+        size = len(mem)
+        data_end = store.data_ends[segment]
+        torn = 0
+        while position < size:
+            if (data_end and position >= data_end and position + _RECORD_PREFIX_LEN <= size
+                    and _I64.unpack_from(mem, position)[0] == 0):
+                break  # preallocated space
+            try:
+                if position + _RECORD_PREFIX_LEN > size:
+                    raise ValueError("truncated record header")
+                key, value_type, _, end = codec.peek_header_at(mem, position)
+            except (ValueError, IndexError, struct.error) as e:
+                if data_end and position >= data_end:
+                    # Torn by a crash while preallocated: up to the zeros.
+                    zeros = mem.find(bytes(_RECORD_PREFIX_LEN), position)
+                    torn = (zeros if zeros != -1 else size) - position
+                    break
+                # Only the tail segment can end in a torn append.
+                if segment == last and _runs_past(mem, position):
+                    torn = size - position
+                    break
+                raise _Unreadable("segment {} offset {}: {}".format(segment, position, e))
+            heads[key] = base + position if value_type != 'd' else None
+            records += 1
+            position = end
+        store.ends.append(position)
+        store.torn.append(torn)
+    deleted = 0
+    for key in [key for key, head in heads.items() if head is None]:
+        del heads[key]
+        deleted += 1
+    return heads, records, deleted
+
+
+def _runs_past(mem, position):
+    """True if the record at *position* claims to end past the end of the
+    store, as one torn by a crash mid-append does."""
+    if position + _RECORD_PREFIX_LEN > len(mem):
+        return True
+    try:
+        value_len, varint_size = _decode_varint(mem, position + _RECORD_PREFIX_LEN)
+    except ValueError:
+        # A length cut short counts as torn; a varint is at most 9 bytes.
+        return position + _RECORD_PREFIX_LEN + 9 > len(mem)
+    return position + _RECORD_PREFIX_LEN + varint_size + value_len > len(mem)
+
+
+def _check_index(path, block_len, store, codec, max_steps, reached):
+    """Walk every chain of the index at *path*, adding each key reached to
+    *reached* (the first index reaching a key wins, as in Indexer.get).
+    Returns the number of broken links found."""
+    broken = 0
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 1
+        slots = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if len(slots) % block_len:
+            broken += 1
+        capacity = len(slots) // block_len
+        for slot in range(capacity):
+            link = _I64.unpack_from(slots, slot * block_len)[0]
+            steps = 0
+            while link != 0 and link != Record.RECORD_LINK_NULL:
+                steps += 1
+                position = link & _POSITION_MASK
+                mem, offset = store.locate(position)
+                if link < 0 or steps > max_steps or mem is None:
+                    broken += 1
+                    break
+                try:
+                    key, link = codec.peek_key_at(mem, offset)
+                except (ValueError, IndexError, struct.error):
+                    broken += 1
+                    break
+                if _key_hash(key) % capacity != slot:
+                    broken += 1
+                    break
+                reached.setdefault(key, position)
+    finally:
+        slots.close()
+    return broken
+
+
+def _write_index(path, capacity, block_len, heads, store, filter_path, bits_per_key):
+    """Chain every head into a new index at *path*, relinking key_links in
+    the mapped store, and fill a new Bloom filter at *filter_path*."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, block_len * capacity)
+        slots = mmap.mmap(fd, 0)
+    finally:
+        os.close(fd)
+    key_filter = BloomFilter.create(filter_path, capacity, bits_per_key) if bits_per_key else None
+    try:
+        for key, position in heads.items():
+            key_hash = _key_hash(key)
+            slot = block_len * (key_hash % capacity)
+            head = _I64.unpack_from(slots, slot)[0]
+            mem, offset = store.locate(position)
+            _I64.pack_into(mem, offset, head if head != 0 else Record.RECORD_LINK_NULL)
+            slots[slot:slot + 8] = _I64.pack(_pack_link(_fingerprint(key_hash), position))
+            if key_filter is not None:
+                key_filter.add(key)
+        slots.flush()
+    finally:
+        slots.close()
+        if key_filter is not None:
+            key_filter.close()
+
+
+def _repair_table(job):
+    """Verify one table's index files against its store and, unless
+    verify_only, rebuild them when damaged (or always, with force).
+    Runs in a worker process: *job* is a dict of plain values."""
+    report = {'namespace': job['namespace'], 'table': job['table'], 'records': 0, 'keys': 0, 'deleted': 0,
+              'missing': 0, 'stale': 0, 'extra': 0, 'broken': 0, 'torn_bytes': 0,
+              'damaged': False, 'rebuilt': False, 'error': None}
+    started = time.time()
+    store_path = job['store'][0]
+    block_len = job['block_len']
+    codec = SpindleCodec()
+    try:
+        store = _MappedStore(job['store'], job['segmented'])
+        try:
+            heads, records, deleted = _scan_store(store, codec)
+            torn_bytes = sum(store.torn)
+            report.update(records=records, keys=len(heads), deleted=deleted, torn_bytes=torn_bytes)
+
+            reached = {}
+            # Newest first: a growing table's keys are copied into its newest
+            # index, and the old one keeps their earlier records until removed.
+            for path in reversed(job['indexes']):
+                report['broken'] += _check_index(path, block_len, store, codec, records + 1, reached)
+            for key, position in reached.items():
+                expected = heads.get(key)
+                if expected is None:
+                    report['extra'] += 1
+                elif expected != position:
+                    report['stale'] += 1
+            report['missing'] = sum(1 for key in heads if key not in reached)
+            report['damaged'] = bool(not job['indexes'] or torn_bytes or report['missing']
+                                     or report['stale'] or report['extra'] or report['broken'])
+
+            if job['verify_only'] or not (report['damaged'] or job['force']):
+                return report
+            capacity = job['capacity']
+            if job['max_load_factor'] and len(heads) > job['max_load_factor'] * capacity:
+                capacity = _next_prime(int(len(heads) / job['max_load_factor']) + 1)
+            index_path, filter_path = job['index_path'], job['filter_path']
+            _write_index(index_path + REPAIR_TMP_SUFFIX, capacity, block_len, heads, store,
+                         filter_path + REPAIR_TMP_SUFFIX, job['bits_per_key'])
+            for mem in store.mems:
+                mem.flush()
+            for segment, f in enumerate(store.files):
+                if store.torn[segment] or store.data_ends[segment]:
+                    f.truncate(store.ends[segment])
+                    if store.data_ends[segment]:
+                        os.pwrite(f.fileno(), bytes(8), V2_DATA_END_OFFSET)
+            for f in store.files:
+                os.fsync(f.fileno())
+        finally:
+            store.close()
+        if job['bits_per_key']:
+            # Filter first, so the new index is never opened without it.
+            os.replace(filter_path + REPAIR_TMP_SUFFIX, filter_path)
+        elif os.path.exists(filter_path):
+            os.remove(filter_path)
+        os.replace(index_path + REPAIR_TMP_SUFFIX, index_path)
+        for path in job['indexes'] + job['filters']:
+            if path not in (index_path, filter_path) and os.path.exists(path):
+                os.remove(path)
+        report['rebuilt'] = True
+    except (OSError, ValueError, _Unreadable) as e:
+        report['error'] = "{}: {}".format(store_path, e)
+    finally:
+        report['seconds'] = round(time.time() - started, 3)
+    return report
+
+
+def _table_jobs(ns_dir, namespace, config, verify_only, force):
+    stores = {}
+    indexes = {}
+    filters = {}
+    for fname in sorted(os.listdir(ns_dir)):
+        path = os.path.join(ns_dir, fname)
+        if fname.endswith(TRANSIENT_FILE_SUFFIXES) or not os.path.isfile(path):
+            continue
+        if STORE_SEGMENT_MARKER in fname:
+            continue  # found from the first segment, see store_segments
+        if config.STORE in fname:
+            stores[tuple(fname.split(config.STORE, 1))] = path
+        elif config.INDEX in fname or config.INDEX_FILTER in fname:
+            marker, found = (config.INDEX, indexes) if config.INDEX in fname else (config.INDEX_FILTER, filters)
+            table, rest = fname.split(marker, 1)
+            instance_id, index_id = rest.rsplit('-', 1)
+            found.setdefault((table, instance_id), []).append((int(index_id), path))
+
+    jobs = []
+    for (table, instance_id), store_path in stores.items():
+        table_indexes = sorted(indexes.get((table, instance_id), []))
+        index_id = table_indexes[-1][0] if table_indexes else 0
+        if table_indexes:
+            capacity = os.path.getsize(table_indexes[-1][1]) // config.INDEX_BLOCK_LEN or config.INDEX_CAPACITY
+        else:
+            capacity = config.INDEX_CAPACITY
+        table_filters = [path for _, path in sorted(filters.get((table, instance_id), []))]
+        # Keep a filter the table already has, as Index does.
+        bits_per_key = config.INDEX_BLOOM_BITS_PER_KEY
+        if not bits_per_key and table_filters:
+            key_filter = BloomFilter.open(table_filters[-1])
+            bits_per_key = key_filter.bits_per_key(capacity)
+            key_filter.close()
+        name = "{}{}{}-{}".format(table, config.INDEX, instance_id, index_id)
+        filter_name = "{}{}{}-{}".format(table, config.INDEX_FILTER, instance_id, index_id)
+        segments = store_segments(store_path)
+        jobs.append({
+            'namespace': namespace,
+            'table': table,
+            'store': segments,
+            'segmented': len(segments) > 1 or bool(config.STORE_SEGMENT_BYTES),
+            'store_size': sum(os.path.getsize(path) for path in segments),
+            'indexes': [path for _, path in table_indexes],
+            'filters': table_filters,
+            'index_path': os.path.join(ns_dir, name),
+            'filter_path': os.path.join(ns_dir, filter_name),
+            'capacity': capacity,
+            'block_len': config.INDEX_BLOCK_LEN,
+            'max_load_factor': getattr(config, 'INDEX_MAX_LOAD_FACTOR', 0),
+            'bits_per_key': bits_per_key,
+            'verify_only': verify_only,
+            'force': force,
+        })
+    return jobs
+
+
+def repair(db_path, graph_name=None, verify_only=False, force=False, workers=None, config=None):
+    """Verify, and where needed rebuild, the index files of every table
+    under *db_path*.
+
+    Args:
+        db_path: Root database directory (the value of COG_HOME or
+                 CUSTOM_COG_DB_PATH).
+        graph_name: Only this graph (namespace), or a list of graphs.
+                    Defaults to all of them.
+        verify_only: Only report damage, change nothing.
+        force: Rebuild every index, damaged or not.
+        workers: Worker processes, defaults to the CPU count; 1 runs
+                 everything in this process.
+        config: CogConfig for the index settings (capacity, load factor,
+                block length, Bloom filter bits), defaults to CogConfig().
+
+    Returns:
+        dict with keys:
+            tables (list[dict]): one report per table: namespace, table,
+                records, keys, deleted (keys whose last record is a
+                deletion marker), missing / stale / extra keys and broken
+                links found in the index, torn_bytes at the end of the
+                store, damaged, rebuilt, seconds, error
+            damaged (int): tables whose index did not match their store
+            rebuilt (int): tables whose index was rebuilt
+            errors (list[str]): per-table error messages, if any
+
+    Raises nothing for damaged tables — errors are collected and returned.
+    """
+    if not os.path.isdir(db_path):
+        raise FileNotFoundError(f"Database path does not exist: {db_path}")
+    config = config if config is not None else CogConfig()
+    if graph_name is None:
+        namespaces = [ns for ns in sorted(os.listdir(db_path))
+                      if ns not in (config.COG_SYS_DIR, config.VIEWS) and os.path.isdir(os.path.join(db_path, ns))]
+    else:
+        namespaces = [graph_name] if isinstance(graph_name, str) else list(graph_name)
+
+    jobs = []
+    for namespace in namespaces:
+        ns_dir = os.path.join(db_path, namespace)
+        if not os.path.isdir(ns_dir):
+            raise FileNotFoundError(f"Graph does not exist: {ns_dir}")
+        jobs.extend(_table_jobs(ns_dir, namespace, config, verify_only, force))
+    # Largest first, so one big table does not start last and finish late.
+    jobs.sort(key=lambda job: job['store_size'], reverse=True)
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        tables = [_repair_table(job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            tables = list(pool.map(_repair_table, jobs))
+    tables.sort(key=lambda report: (report['namespace'], report['table']))
+    return {
+        'tables': tables,
+        'damaged': sum(1 for report in tables if report['damaged']),
+        'rebuilt': sum(1 for report in tables if report['rebuilt']),
+        'errors': [report['error'] for report in tables if report['error']],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cog.repair",
+                                     description="Verify and rebuild CogDB index files from their stores.")
+    parser.add_argument("db_path", help="database directory (COG_HOME or CUSTOM_COG_DB_PATH)")
+    parser.add_argument("graphs", nargs="*", help="graphs to repair, default all")
+    parser.add_argument("--verify-only", action="store_true", help="report damage without changing anything")
+    parser.add_argument("--force", action="store_true", help="rebuild every index, damaged or not")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default the CPU count")
+    args = parser.parse_args(argv)
+    report = repair(args.db_path, args.graphs or None, verify_only=args.verify_only, force=args.force,
+                    workers=args.workers)
+    for table in report['tables']:
+        if table['damaged'] or table['error']:
+            print("{namespace}/{table}: {keys} keys, missing {missing}, stale {stale}, extra {extra}, "
+                  "broken {broken}, torn bytes {torn_bytes}{done}".format(
+                      done=", rebuilt" if table['rebuilt'] else "", **table))
+    for error in report['errors']:
+        print("error: " + error, file=sys.stderr)
+    print("{} tables checked, {} damaged, {} rebuilt".format(len(report['tables']), report['damaged'],
+                                                             report['rebuilt']))
+    return 1 if report['errors'] or (args.verify_only and report['damaged']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -267,7 +267,8 @@ class CogDBRequestHandler(BaseHTTPRequestHandler):
             'edges': edge_count,
             'uptime_seconds': int(time.time() - start_time),
             'queries_served': state['queries_served'],
-            'writable': state['writable']
+            'writable': state['writable'],
+            'tables': graph.stats()
         }
         self._send_json(stats)
     
@@ -430,7 +431,9 @@ class CogDBServer:
                 'queries_served': 0,
                 'last_query_time': None,
                 'writable': writable,
-                'query_lock': threading.Lock()  # Per-graph lock for thread-safe queries
+                # Per-graph lock for thread-safe queries; shared with the graph's
+                # own mutations and background compaction.
+                'query_lock': getattr(graph, '_lock', None) or threading.Lock()
             }
             # Update server's graph reference
             if self.server:
@@ -0,0 +1,158 @@
+"""Point-in-time reads over a namespace (Graph.as_of).
+
+Stores are append-only and every record carries its write timestamp, so a
+past state of a table is still on disk: for each key, the newest record
+written at or before the snapshot time, unless a deletion marker (see
+Store.save_deletion) followed it. A list or set value read from that record
+only reaches older records through its value chain.
+
+The first read of a table in a snapshot scans its store once in file order,
+decoding only keys, and keeps a key -> store position map; later reads go
+straight to those positions. Writes made after the snapshot time are never
+seen, so a snapshot in the past is a stable view while writers continue.
+
+Compaction drops superseded records: a snapshot reaches back no further
+than a table's last compaction, and one taken before a compaction can no
+longer read that table afterwards. The catalog records when each table was
+last compacted (see cog.catalog), so reading a table at an earlier time
+raises RuntimeError instead of returning a partial history.
+"""
+
+import contextlib
+import logging
+
+from cog.core import Record
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotIndexer:
+    """Read side of an Indexer, resolving keys as of *timestamp*."""
+
+    def __init__(self, store, timestamp):
+        self.store = store
+        self.timestamp = timestamp
+        self._positions = None
+
+    def _load(self):
+        if self.store._closed:
+            raise RuntimeError("Store {} was closed or compacted after the snapshot was taken".format(self.store.store))
+        if self._positions is None:
+            timestamp = self.timestamp
+            newest = {}
+            with self.store.sequential_access():
+                for position, key, value_type, record_timestamp in self.store.scan_headers():
+                    if record_timestamp > timestamp:
+                        continue
+                    current = newest.get(key)
+                    # Equal timestamps: the later record in the file wins.
+                    if current is None or record_timestamp >= current[0]:
+                        newest[key] = (record_timestamp, position, value_type == 'd')
+            self._positions = {key: position for key, (_, position, deleted) in newest.items() if not deleted}
+            logger.debug("snapshot of %s at %d: %d keys", self.store.store, timestamp, len(self._positions))
+        return self._positions
+
+    def get(self, key, store=None):
+        position = self._load().get(key)
+        if position is None:
+            return None
+        return Record.load_from_store(position, self.store)
+
+    def get_head_only(self, key, store=None):
+        position = self._load().get(key)
+        if position is None:
+            return None, None
+        return self.store.read(position), position
+
+    def scanner(self, store=None, order=None, advise=True):
+        # Store order: the scan reads the store sequentially.
+        positions = sorted(self._load().values())
+        with self.store.sequential_access() if advise else contextlib.nullcontext():
+            for position in positions:
+                record = Record.load_from_store(position, self.store)
+                if record is not None:
+                    yield Record(record.key, record.value)
+
+    def sequential_access(self, store=None):
+        return self.store.sequential_access()
+
+    def prefetch(self, keys, store=None):
+        positions = self._load()
+        self.store.prefetch([positions[key] for key in keys if key in positions])
+
+    def __len__(self):
+        return len(self._load())
+
+
+class SnapshotTable:
+
+    def __init__(self, table, timestamp):
+        self.table_meta = table.table_meta
+        self.config = table.config
+        self.store = table.store
+        self.indexer = SnapshotIndexer(table.store, timestamp)
+
+
+class Snapshot:
+    """Read-only stand-in for a Cog, seeing its tables as of *timestamp*
+    (int nanoseconds since the epoch, as Record timestamps). Any write
+    raises RuntimeError."""
+
+    def __init__(self, cog, timestamp):
+        self.cog = cog
+        self.timestamp = timestamp
+        self.config = cog.config
+        self.memory_governor = None
+        self.current_namespace = cog.current_namespace
+        self.current_table = None
+        self._tables = {}
+
+    def get_table(self, name, namespace=None):
+        namespace = namespace or self.current_namespace
+        table = self._tables.get((namespace, name))
+        if table is None:
+            compacted_at = self.cog.catalog(namespace).compacted_at(name)
+            if compacted_at is not None and self.timestamp < compacted_at:
+                raise RuntimeError("Table {} was compacted at {}; its history before then is gone, so it "
+                                   "cannot be read as of {}".format(name, compacted_at, self.timestamp))
+            table = self._tables[(namespace, name)] = SnapshotTable(self.cog.get_table(name, namespace),
+                                                                    self.timestamp)
+        return table
+
+    def use_namespace(self, namespace):
+        self.current_namespace = namespace
+        return self
+
+    def use_table(self, name):
+        self.current_table = self.get_table(name)
+        return self
+
+    def get(self, key):
+        return self.current_table.indexer.get(key)
+
+    def scanner(self, table=None, scan_filter=None):
+        table = table or self.current_table
+        for r in table.indexer.scanner():
+            if scan_filter:
+                yield scan_filter.process(r.key)
+            else:
+                yield r
+
+    def list_tables(self, namespace=None):
+        return self.cog.list_tables(namespace or self.current_namespace)
+
+    def vertex_dictionary(self, namespace=None):
+        # Ids are never reassigned, so the current dictionary names every id
+        # a past edge table can hold.
+        return self.cog.vertex_dictionary(namespace or self.current_namespace)
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        raise RuntimeError("Snapshots are read-only: '{}' is not available on a snapshot".format(name))
@@ -9,6 +9,13 @@ Wire format per field:
     type 'b' (0x62): [varint length] [raw bytes]
     type 'B' (0x42): [1B]  0x01 = True, 0x00 = False
     type 'a' (0x61): [varint count] [count × 8B float64 LE]  — array of doubles
+    type 'S' (0x53): [varint count] [count × ([varint length] [utf-8 bytes])]  — array of strings
+    type 'I' (0x49): [varint count] [count × zigzag delta LEB128]  — array of integer-id strings
+
+A string array whose elements are all canonical decimal integers (the form
+str(int) produces, within int64) is written as 'I': each element as the
+zigzag-encoded difference from the previous one, in LEB128. It decodes back
+to the same strings in the same order. Anything else falls back to 'S'.
 
 Varint scheme (little-endian, used for string/bytes length prefixes):
     tag <= 0x7f         -> value = tag                       (1 byte total)
@@ -34,6 +41,7 @@ _unpack_u16le = struct.Struct('<H').unpack_from
 _unpack_u32le = struct.Struct('<I').unpack_from
 
 _SINGLE_BYTES = [bytes([i]) for i in range(128)]
+_CONTINUATION_BYTES = [bytes([i | 0x80]) for i in range(128)]
 
 
 def _encode_varint(length):
@@ -90,6 +98,8 @@ def _encode_field(f):
         return b'b' + _encode_varint(len(f)) + f
     if type(f) is list:
         n = len(f)
+        if n and type(f[0]) is str:
+            return _encode_str_array(f)
         for i, elem in enumerate(f):
             if type(elem) is not int and type(elem) is not float:
                 raise ValueError(
@@ -102,6 +112,46 @@ def _encode_field(f):
     return b's' + _encode_varint(len(b)) + b
 
 
+def _encode_int_ids(f):
+    """Encode a list of canonical integer strings as 'I', or return None."""
+    parts = [b'I', _encode_varint(len(f))]
+    previous = 0
+    for elem in f:
+        if type(elem) is not str or not elem or len(elem) > 20:
+            return None
+        try:
+            n = int(elem)
+        except ValueError:
+            return None
+        if n < -9223372036854775808 or n > 9223372036854775807 or str(n) != elem:
+            return None
+        delta = n - previous
+        previous = n
+        zigzag = (delta << 1) if delta >= 0 else ((-delta << 1) - 1)
+        while zigzag > 0x7f:
+            parts.append(_CONTINUATION_BYTES[zigzag & 0x7f])
+            zigzag >>= 7
+        parts.append(_SINGLE_BYTES[zigzag])
+    return b''.join(parts)
+
+
+def _encode_str_array(f):
+    packed = _encode_int_ids(f)
+    if packed is not None:
+        return packed
+    parts = [b'S', _encode_varint(len(f))]
+    for i, elem in enumerate(f):
+        if type(elem) is not str:
+            raise ValueError(
+                "string array elements must be str, "
+                "got " + type(elem).__name__ + " at index " + str(i)
+            )
+        b = elem.encode('utf-8')
+        parts.append(_encode_varint(len(b)))
+        parts.append(b)
+    return b''.join(parts)
+
+
 def _decode_field(buf, offset):
     """Decode a single field starting at *offset*.
 
@@ -156,6 +206,42 @@ def _decode_field(buf, offset):
         values = list(struct.unpack_from(f'<{length}d', buf, offset))
         return values, end
 
+    if t == 0x53:  # 'S' — array of strings
+        values = []
+        for _ in range(length):
+            size, vsize = _decode_varint(buf, offset)
+            offset += vsize
+            end = offset + size
+            if end > len(buf):
+                raise ValueError(
+                    "truncated buffer: string array element needs " + str(size)
+                    + " bytes at offset " + str(offset)
+                    + " but buffer has " + str(len(buf))
+                )
+            values.append(sys.intern(buf[offset:end].decode('utf-8')))
+            offset = end
+        return values, offset
+
+    if t == 0x49:  # 'I' — array of integer-id strings
+        values = []
+        previous = 0
+        size = len(buf)
+        for _ in range(length):
+            zigzag = 0
+            shift = 0
+            while True:
+                if offset >= size:
+                    raise ValueError("truncated buffer: integer id at offset " + str(offset))
+                byte = buf[offset]
+                offset += 1
+                zigzag |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            previous += (zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1)
+            values.append(sys.intern(str(previous)))
+        return values, offset
+
     end = offset + length
     if end > len(buf):
         raise ValueError(
@@ -174,6 +260,15 @@ def packb(key, value):
     return _encode_field(key) + _encode_field(value)
 
 
+def unpack_key_from(buf, offset=0):
+    """Decode only the key of a (key, value) pair packed at *offset* in *buf*,
+    leaving the value undecoded. Returns (key, offset just past the key)."""
+    key, end = _decode_field(buf, offset)
+    if type(key) is str:
+        key = sys.intern(key)
+    return key, end
+
+
 def unpackb(buf):
     """Deserialize bytes to a (key, value) pair."""
     key, offset = _decode_field(buf, 0)
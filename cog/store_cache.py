@@ -1,54 +1,229 @@
 import logging
+import threading
 from collections import OrderedDict
 
 
 DEFAULT_MAX_SIZE = 100000
+# Independent LRU stripes per cache; a power of two.
+DEFAULT_STRIPES = 16
 
-# LRU cache for Store record lookups by position.
+POLICY_LRU = "lru"
+POLICY_SLRU = "slru"
+POLICIES = (POLICY_LRU, POLICY_SLRU)
+# Share of a stripe's capacity kept for records hit at least twice (slru).
+PROTECTED_SHARE = 0.8
+# Rough per-record Python overhead charged on top of its encoded size when
+# the cache has a byte budget.
+ENTRY_OVERHEAD_BYTES = 120
+
+
+class _Stripe:
+    """One LRU stripe, split in two segments.
+
+    New records enter probation. A hit there promotes the record to the
+    protected segment, whose least recently used records are demoted back to
+    probation when it is full. Evictions come from probation only, so a scan
+    that touches every record once cannot push out records hit repeatedly.
+    With the lru policy the protected segment has no room and this is a
+    plain LRU.
+    """
+    __slots__ = ('lock', 'probation', 'protected', 'capacity', 'protected_capacity',
+                 'probation_used', 'protected_used')
+
+    def __init__(self, capacity, protected_capacity):
+        self.lock = threading.Lock()
+        # key -> (value, charge)
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.capacity = capacity
+        self.protected_capacity = protected_capacity
+        self.probation_used = 0
+        self.protected_used = 0
+
+    def get(self, key, promote):
+        entry = self.protected.get(key)
+        if entry is not None:
+            if promote:
+                self.protected.move_to_end(key)
+            return entry[0]
+        entry = self.probation.get(key)
+        if entry is None:
+            return None
+        if promote:
+            if self.protected_capacity and entry[1] <= self.protected_capacity:
+                del self.probation[key]
+                self.probation_used -= entry[1]
+                self.protected[key] = entry
+                self.protected_used += entry[1]
+                self._demote()
+            else:
+                self.probation.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, charge):
+        entry = self.protected.get(key)
+        if entry is not None:
+            self.protected[key] = (value, charge)
+            self.protected.move_to_end(key)
+            self.protected_used += charge - entry[1]
+            self._demote()
+        else:
+            entry = self.probation.pop(key, None)
+            if entry is not None:
+                self.probation_used -= entry[1]
+            self.probation[key] = (value, charge)
+            self.probation_used += charge
+        self._evict()
+
+    def pop(self, key):
+        entry = self.protected.pop(key, None)
+        if entry is not None:
+            self.protected_used -= entry[1]
+            return
+        entry = self.probation.pop(key, None)
+        if entry is not None:
+            self.probation_used -= entry[1]
+
+    def _demote(self):
+        while self.protected_used > self.protected_capacity:
+            key, entry = self.protected.popitem(last=False)
+            self.protected_used -= entry[1]
+            self.probation[key] = entry
+            self.probation_used += entry[1]
+        self._evict()
+
+    def _evict(self):
+        while self.probation_used + self.protected_used > self.capacity and self.probation:
+            _, entry = self.probation.popitem(last=False)
+            self.probation_used -= entry[1]
+
+    def clear(self):
+        self.probation.clear()
+        self.protected.clear()
+        self.probation_used = 0
+        self.protected_used = 0
+
+    def __len__(self):
+        return len(self.probation) + len(self.protected)
+
+
+# Cache for Store record lookups by position.
+#
+# Positions are spread over independent stripes, each with its own lock, so
+# concurrent readers of one store rarely wait on each other and never on the
+# store's write lock. Capacity is max_size records, or max_bytes of encoded
+# record size (plus ENTRY_OVERHEAD_BYTES each) when a byte budget is given,
+# split evenly over the stripes. policy is "lru" or the scan-resistant
+# "slru" (segmented LRU, see _Stripe). With a governor (see
+# cog.memory_governor) the cache is byte-budgeted and the governor sets
+# the budget.
 class StoreCache:
 
-    def __init__(self, cache_id, shared_cache=None, max_size=DEFAULT_MAX_SIZE):
+    def __init__(self, cache_id, shared_cache=None, max_size=DEFAULT_MAX_SIZE, stripes=DEFAULT_STRIPES,
+                 max_bytes=None, policy=POLICY_LRU, governor=None):
         self.logger = logging.getLogger(__name__)
+        if policy not in POLICIES:
+            raise ValueError("Unknown store cache policy '{}', expected one of {}".format(policy, POLICIES))
         self.cache_id = cache_id
         self.max_size = max_size
+        if governor is not None and max_bytes is None:
+            max_bytes = governor.max_bytes
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.governor = governor
+        self.budget = max_bytes if max_bytes is not None else max_size
+        # Lookups since the cache was created; take_hits() reports hits
+        # since its last call.
+        self.hits = 0
+        self.misses = 0
+        self._hits_taken = 0
         if shared_cache is not None:
             if cache_id not in shared_cache:
-                shared_cache[cache_id] = OrderedDict()
-            self.cache = shared_cache[cache_id]
+                shared_cache[cache_id] = self._new_stripes(stripes)
+            self.stripes = shared_cache[cache_id]
         else:
-            self.cache = OrderedDict()
-        self.logger.info("cache init {}, size: {}".format(self.cache_id, str(len(self.cache))))
+            self.stripes = self._new_stripes(stripes)
+        self._mask = len(self.stripes) - 1
+        if governor is not None:
+            governor.register(cache_id, self)
+        self.logger.info("cache init {}, size: {}".format(self.cache_id, str(self.size())))
+
+    def _capacities(self, budget, stripes):
+        capacity = max(1, budget // stripes)
+        protected = int(capacity * PROTECTED_SHARE) if self.policy == POLICY_SLRU else 0
+        return capacity, protected
+
+    def _new_stripes(self, stripes):
+        capacity, protected = self._capacities(self.budget, stripes)
+        return [_Stripe(capacity, protected) for _ in range(stripes)]
+
+    def set_budget(self, nbytes):
+        """Resize to *nbytes* (records without a byte budget), evicting as needed."""
+        self.budget = nbytes
+        capacity, protected = self._capacities(nbytes, len(self.stripes))
+        for stripe in self.stripes:
+            with stripe.lock:
+                stripe.capacity = capacity
+                stripe.protected_capacity = protected
+                stripe._demote()
+
+    def take_hits(self):
+        hits = self.hits
+        taken, self._hits_taken = self._hits_taken, hits
+        return hits - taken
+
+    def _stripe(self, key):
+        return self.stripes[(key ^ (key >> 7)) & self._mask]
 
-    def put(self, key, value):
+    def _charge(self, nbytes):
+        if self.max_bytes is None:
+            return 1
+        return (nbytes or 0) + ENTRY_OVERHEAD_BYTES
+
+    def put(self, key, value, nbytes=None):
+        """Cache *value* at *key*; *nbytes* is its encoded size, used by the
+        byte budget."""
         key = int(key)
-        if key in self.cache:
-            self.cache[key] = value
-            self.cache.move_to_end(key)
-        else:
-            self.cache[key] = value
-            if len(self.cache) > self.max_size:
-                self.cache.popitem(last=False)
+        stripe = self._stripe(key)
+        charge = self._charge(nbytes)
+        with stripe.lock:
+            stripe.put(key, value, charge)
+        if self.governor is not None:
+            self.governor.note_growth(charge)
 
     def get(self, key):
         key = int(key)
-        try:
-            value = self.cache[key]
-            self.cache.move_to_end(key)
-            return value
-        except KeyError:
-            return None
+        stripe = self._stripe(key)
+        with stripe.lock:
+            value = stripe.get(key, True)
+        if value is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
 
     def peek(self, key):
         """Return cached value without promoting in LRU order."""
         key = int(key)
-        return self.cache.get(key)
+        stripe = self._stripe(key)
+        with stripe.lock:
+            return stripe.get(key, False)
 
     def evict(self, key):
         key = int(key)
-        try:
-            del self.cache[key]
-        except KeyError:
-            pass
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.pop(key)
+
+    def clear(self):
+        for stripe in self.stripes:
+            with stripe.lock:
+                stripe.clear()
 
     def size(self):
-        return len(self.cache)
+        return sum(len(stripe) for stripe in self.stripes)
+
+    def size_bytes(self):
+        """Charged size of the cached records: bytes with a byte budget,
+        otherwise the record count."""
+        return sum(stripe.probation_used + stripe.protected_used for stripe in self.stripes)
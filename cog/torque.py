@@ -1,6 +1,10 @@
 from cog.database import Cog
 from cog.database import in_nodes, out_nodes, hash_predicate, parse_tripple
 from cog.memory_view import MemoryView
+from cog.snapshot import Snapshot
+import copy
+import datetime
+import functools
 import json
 import logging
 from . import config as cfg
@@ -14,11 +18,16 @@ from os import listdir
 from cog.cloud_client import CloudClient
 import time
 import random
+import threading
 import warnings
 
 NOTAG = "NOTAG"
 
 # Sort direction constants for order()
+# Smallest hop frontier whose adjacency records are prefetched from disk
+# before the hop resolves them one by one (see Graph._prefetch_neighbors).
+PREFETCH_MIN_FRONTIER = 8
+
 ASC = "asc"
 DESC = "desc"
 
@@ -63,6 +72,15 @@ class BlankNode(object):
         return label.startswith("_:" + BlankNode.ID_PREFIX)
 
 
+
+def _locked(method):
+    """Run a Graph method under the graph's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class Graph(EmbeddingMixin, TraversalMixin):
     """
     Creates a graph object.
@@ -82,10 +100,15 @@ class Graph(EmbeddingMixin, TraversalMixin):
         api_key: API key for CogDB Cloud. When provided (or set via
                  COGDB_API_KEY env var), the graph operates in cloud mode —
                  all operations go over HTTP and no local files are created.
+        durability: Local mode only. "os-buffer" (default) hands writes to the
+                 OS per flush_interval, "none" keeps them buffered until sync(),
+                 "fsync-group" fsyncs writes across all tables in groups every
+                 GROUP_COMMIT_INTERVAL_MS (see cog.durability).
     """
 
     def __init__(self, graph_name="default", cog_home="cog_home", cog_path_prefix=None, enable_caching=True,
-                 flush_interval=1, config=None, api_key=None, use_memory_view=True):
+                 flush_interval=1, config=None, api_key=None, use_memory_view=True, durability="os-buffer",
+                 vertex_dictionary=False):
         """
         :param graph_name: Name of the graph (default: "default")
         :param cog_home: Home directory name, for most use cases use default.
@@ -94,11 +117,17 @@ class Graph(EmbeddingMixin, TraversalMixin):
         :param config: Optional CogConfig instance. Overrides cog_home and cog_path_prefix when provided.
         :param api_key: API key for CogDB Cloud mode.
         :param use_memory_view: When True (default), traversals use an in-memory adjacency cache. When False, every traversal reads from disk.
+        :param durability: "none", "os-buffer" (default) or "fsync-group".
+        :param vertex_dictionary: When True, a new graph maps vertex strings to integer ids and its edge tables store the ids. Graphs created this way keep using it when reopened.
         """
 
 
         self.graph_name = graph_name
         self.logger = logging.getLogger(__name__)
+        # Serializes mutations against background work such as compaction;
+        # the server also holds it around queries.
+        self._lock = threading.RLock()
+        self._warmup_threads = []  # started by warmup(), stopped on close
 
         # Resolve API key: explicit param > env var > None
         resolved_key = api_key or os.environ.get("COGDB_API_KEY")
@@ -149,10 +178,12 @@ class Graph(EmbeddingMixin, TraversalMixin):
 
         self.logger.debug(f"Torque init on graph: {graph_name} (flush_interval={flush_interval})")
 
-        self.cog = Cog(self.cache, flush_interval=flush_interval, config=self.config)
+        self.cog = Cog(self.cache, flush_interval=flush_interval, config=self.config, durability=durability)
         self.cog.create_or_load_namespace(self.graph_name)
+        if vertex_dictionary:
+            self.cog.enable_vertex_dictionary(self.graph_name)
 
-        self.all_predicates = self.cog.list_tables()
+        self.all_predicates = self._list_predicates()
         self.views_dir = self.config.cog_views_dir()
 
         if not os.path.exists(self.views_dir):
@@ -160,16 +191,8 @@ class Graph(EmbeddingMixin, TraversalMixin):
         self.logger.debug("predicates: " + str(self.all_predicates))
 
         self.last_visited_vertices = None
-        self._predicate_reverse_lookup_cache = {}  # hash -> human-readable predicate name
-        # Hydrate predicate names from persisted edge set for reopened graphs
-        try:
-            self.cog.use_namespace(self.graph_name)
-            for pred_hash in self.all_predicates:
-                edge_record = self.cog.use_table(self.config.GRAPH_EDGE_SET_TABLE_NAME).get(pred_hash)
-                if edge_record is not None:
-                    self._predicate_reverse_lookup_cache[pred_hash] = edge_record.value
-        except Exception:
-            pass  # Edge set table may not exist yet for new graphs
+        # hash -> human-readable predicate name, hydrated for reopened graphs
+        self._predicate_reverse_lookup_cache = self._load_predicate_names()
         self._server_port = None  # Port this graph is being served on
         self._default_provider = "cogdb"  # Provider for auto-embed in queries
         self._default_provider_kwargs = {}  # Provider kwargs (e.g. api_key)
@@ -340,6 +363,7 @@ class Graph(EmbeddingMixin, TraversalMixin):
         from cog.remote import RemoteGraph
         return RemoteGraph(url, timeout=timeout)
 
+    @_locked
     def sync(self):
         """
         Force flush all pending writes to disk (local) or cloud.
@@ -359,6 +383,144 @@ class Graph(EmbeddingMixin, TraversalMixin):
         self._mg.clear()
         self.cog.refresh_all()
 
+    def compact(self, background=False):
+        """
+        Rewrite this graph's store files keeping only live records, reclaiming
+        the space left behind by updates and deletes.
+
+        Other threads must hold the graph's lock (as the server does) to use
+        the graph while it compacts; they are only blocked while each table
+        cuts over to its compacted files.
+
+        Args:
+            background: Compact on a daemon thread and return it at once.
+
+        Returns:
+            dict: per-table reports plus 'bytes_before', 'bytes_after' and
+            'bytes_reclaimed' totals. With background=True, the started
+            CompactionThread; its report attribute holds the dict once joined.
+
+        Example:
+            g.delete("alice", "follows", "bob")
+            g.compact()['bytes_reclaimed']
+        """
+        if self._cloud:
+            raise RuntimeError("g.compact() is not available in cloud mode.")
+        if background:
+            from cog.compaction import CompactionThread
+            thread = CompactionThread(self.cog, self.graph_name, self._lock, on_cutover=self._after_compaction)
+            thread.start()
+            return thread
+        return self.cog.compact(self.graph_name, lock=self._lock, on_cutover=self._after_compaction)
+
+    def warmup(self, predicates=None, budget_bytes=None, background=True):
+        """
+        Read the graph's records into its caches ahead of queries. Opening a
+        graph does not read its tables, so the first queries after open go
+        to disk; warmup moves that cost off the query path. Writers and
+        queries holding the graph's lock go on while it runs.
+
+        Args:
+            predicates: predicates whose edge tables to warm, in order.
+                Defaults to every table of the graph.
+            budget_bytes: stop after reading this many bytes of records
+                from disk. Defaults to no limit beyond the caches' own.
+            background: warm on a daemon thread and return it at once.
+
+        Returns:
+            The started WarmupThread, whose report attribute holds the
+            result once joined; with background=False the result itself:
+            dict with 'tables' (name -> records read), 'records',
+            'bytes_read' and 'complete'.
+
+        Example:
+            g = Graph("social")
+            g.warmup(["follows"], budget_bytes=256 << 20)
+        """
+        if self._cloud:
+            raise RuntimeError("g.warmup() is not available in cloud mode.")
+        tables = None
+        if predicates is not None:
+            tables = [hash_predicate(predicate) for predicate in predicates]
+            tables = [name for name in tables if name in self.cog.catalog(self.graph_name)]
+        if not background:
+            return self.cog.warmup(self.graph_name, tables=tables, budget_bytes=budget_bytes, lock=self._lock)
+        from cog.warmup import WarmupThread
+        thread = WarmupThread(self.cog, self.graph_name, self._lock, tables=tables, budget_bytes=budget_bytes)
+        self._warmup_threads.append(thread)
+        thread.start()
+        return thread
+
+    def _stop_warmups(self):
+        # A warmup waiting for the lock stops before reading closed tables.
+        for thread in self._warmup_threads:
+            thread.stop()
+        self._warmup_threads = []
+
+    def stats(self):
+        """
+        Per-table cache and I/O counters for this graph, to tune cache sizes
+        and index capacity. Only tables opened since the graph was loaded are
+        listed; edge tables are keyed by predicate name.
+
+        Returns:
+            dict: table name -> counters: cache_hits, cache_misses,
+            cache_size, cache_bytes, mmap_reads, file_reads, bytes_read, key_reads, writes,
+            bytes_written, flushes, fsyncs, gets, chain_walks, chain_steps,
+            longest_chain, filtered (lookups ruled out by a Bloom filter), indexes
+            and index_capacity.
+
+        Example:
+            g.v("alice").out("follows").all()
+            g.stats()["follows"]["cache_hits"]
+        """
+        if self._cloud:
+            raise RuntimeError("g.stats() is not available in cloud mode.")
+        names = self._predicate_reverse_lookup_cache
+        return {names.get(name, name): stats
+                for name, stats in self.cog.table_stats(self.graph_name).items()}
+
+    def as_of(self, timestamp):
+        """
+        Read-only view of the graph as it was at *timestamp*: each key
+        resolves to its newest version written at or before it. Use it for
+        consistent analytics at a fixed point in time, or to give a long
+        scan a stable view while writers continue. See cog.snapshot.
+
+        History reaches back to each table's last compaction: reading a
+        table compacted after *timestamp* raises RuntimeError, and compacting
+        the graph invalidates views taken earlier. Memory views are not used.
+
+        Args:
+            timestamp: nanoseconds since the epoch (as time.time_ns()), or a
+                datetime.
+
+        Returns:
+            Graph: a view that runs queries; writes raise RuntimeError.
+
+        Example:
+            before = time.time_ns()
+            g.put("alice", "follows", "carol")
+            g.as_of(before).v("alice").out("follows").all()  # without carol
+        """
+        if self._cloud:
+            raise RuntimeError("g.as_of() is not available in cloud mode.")
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = round(timestamp.timestamp() * 1_000_000) * 1000
+        view = copy.copy(self)
+        view.cog = Snapshot(self.cog, timestamp)
+        view._use_memory_view = False
+        view._mg = {}
+        view.last_visited_vertices = None
+        view._server_port = None
+        return view
+
+    def _after_compaction(self, table):
+        # A partially loaded view is still paging through the old index.
+        mg = self._mg.get(table.table_meta.name)
+        if mg is not None and not mg._fully_loaded:
+            del self._mg[table.table_meta.name]
+
     def ls(self):
         """
         List all graph names accessible from this connection.
@@ -420,19 +582,10 @@ class Graph(EmbeddingMixin, TraversalMixin):
         self.graph_name = graph_name
         self.cog.create_or_load_namespace(graph_name)
         self.cog.use_namespace(graph_name)
-        self.all_predicates = self.cog.list_tables()
+        self.all_predicates = self._list_predicates()
         # Rebuild predicate reverse lookup cache for the new graph
-        self._predicate_reverse_lookup_cache = {}
+        self._predicate_reverse_lookup_cache = self._load_predicate_names()
         self._mg.clear()
-        try:
-            for pred_hash in self.all_predicates:
-                edge_record = self.cog.use_table(
-                    self.config.GRAPH_EDGE_SET_TABLE_NAME
-                ).get(pred_hash)
-                if edge_record is not None:
-                    self._predicate_reverse_lookup_cache[pred_hash] = edge_record.value
-        except Exception:
-            pass  # Edge set table may not exist yet for new graphs
         return self
 
     def updatej(self, json_object):
@@ -538,7 +691,7 @@ class Graph(EmbeddingMixin, TraversalMixin):
 
         graph_name = self.graph_name if graph_name is None else graph_name
         self.cog.load_triples(graph_data_path, graph_name)
-        self.all_predicates = self.cog.list_tables()
+        self.all_predicates = self._list_predicates()
         self._mg.clear()
         # Rebuild _predicate_reverse_lookup_cache by parsing the triples file
         with open(graph_data_path) as f:
@@ -580,7 +733,7 @@ class Graph(EmbeddingMixin, TraversalMixin):
             return None
         graph_name = self.graph_name if graph_name is None else graph_name
         self.cog.load_csv(csv_path, id_column_name, graph_name)
-        self.all_predicates = self.cog.list_tables()
+        self.all_predicates = self._list_predicates()
         self._mg.clear()
         # Rebuild _predicate_reverse_lookup_cache from CSV column headers
         import csv
@@ -590,13 +743,16 @@ class Graph(EmbeddingMixin, TraversalMixin):
                 for col in reader.fieldnames:
                     self._predicate_reverse_lookup_cache[hash_predicate(col)] = col
 
+    @_locked
     def close(self):
         if self._cloud:
             self._cloud_client.sync()  # flush any pending mutations
             return
         self.logger.info("closing graph: " + self.graph_name)
+        self._stop_warmups()
         self.cog.close()
 
+    @_locked
     def put(self, vertex1, predicate, vertex2, update=False, create_new_edge=False):
         if self._cloud:
             self._cloud_client.mutate_put(vertex1, predicate, vertex2,
@@ -618,9 +774,10 @@ class Graph(EmbeddingMixin, TraversalMixin):
                 mg.replace_out(str(vertex1), str(vertex2))
             else:
                 mg.add_edge(str(vertex1), str(vertex2))
-        self.all_predicates = self.cog.list_tables()
+        self._refresh_predicates()
         return self
 
+    @_locked
     def put_batch(self, triples):
         """
         Insert multiple triples efficiently using batch mode.
@@ -647,20 +804,24 @@ class Graph(EmbeddingMixin, TraversalMixin):
                 self._cloud_client.mutate_put_batch(batch)
             return self
         self.cog.use_namespace(self.graph_name)
+        triples = list(triples)
         self.cog.begin_batch()
         try:
+            # Grouped by adjacency key so each vertex's new edges are packed
+            # into a few segment records.
+            self.cog.put_nodes(triples)
             for v1, pred, v2 in triples:
                 pred_h = hash_predicate(pred)
                 self._predicate_reverse_lookup_cache[pred_h] = pred
-                self.cog.put_node(v1, pred, v2)
                 mg = self._mg.get(pred_h)
                 if mg is not None:
                     mg.add_edge(str(v1), str(v2))
         finally:
             self.cog.end_batch()
-        self.all_predicates = self.cog.list_tables()
+        self._refresh_predicates()
         return self
 
+    @_locked
     def delete(self, vertex1, predicate, vertex2):
         """
         Removes a specific triple/edge from the graph.
@@ -684,6 +845,7 @@ class Graph(EmbeddingMixin, TraversalMixin):
             mg.remove_edge(str(vertex1), str(vertex2))
         return self
 
+    @_locked
     def drop(self, *args):
         """
         Deletes the entire graph and its persistent storage from disk.
@@ -742,10 +904,13 @@ class Graph(EmbeddingMixin, TraversalMixin):
         # This correctly handles CUSTOM_COG_DB_PATH if set
         graph_path = self.config.cog_data_dir(self.graph_name)
         
-        # Save flush_interval before closing (access while cog is still open)
+        # Save flush_interval and durability before closing (access while cog is still open)
         flush_interval = self.cog.flush_interval
+        durability = self.cog.durability
+        vertex_dictionary = self.cog.vertex_dictionary(self.graph_name) is not None
         
         # Close current connections
+        self._stop_warmups()
         self.cog.close()
         
         try:
@@ -765,13 +930,16 @@ class Graph(EmbeddingMixin, TraversalMixin):
         finally:
             # Re-initialize the graph to ensure the object remains usable,
             # even if some files could not be deleted.
-            self.cog = Cog(self.cache, flush_interval=flush_interval, config=self.config)
+            self.cog = Cog(self.cache, flush_interval=flush_interval, config=self.config, durability=durability)
             self.cog.create_or_load_namespace(self.graph_name)
-            self.all_predicates = self.cog.list_tables()
+            if vertex_dictionary:
+                self.cog.enable_vertex_dictionary(self.graph_name)
+            self.all_predicates = self._list_predicates()
         
         return self
 
 
+    @_locked
     def update(self, vertex1, predicate, vertex2):
         self.updatej(vertex1, predicate, vertex2)
         return self
@@ -868,24 +1036,92 @@ class Graph(EmbeddingMixin, TraversalMixin):
         if isinstance(lvv, set):
             self.last_visited_vertices = [Vertex(nid) for nid in lvv]
 
+    def _list_predicates(self):
+        # The vertex dictionary is graph metadata, not an edge table.
+        self._predicates_generation = self.cog.catalog(self.graph_name).generation
+        return [name for name in self.cog.list_tables(self.graph_name)
+                if name != self.config.GRAPH_VERTEX_DICTIONARY_TABLE_NAME]
+
+    def _refresh_predicates(self):
+        """Relist all_predicates if a table was added to the graph since
+        they were last listed; puts of known predicates skip the listing."""
+        if self.cog.catalog(self.graph_name).generation != self._predicates_generation:
+            self.all_predicates = self._list_predicates()
+
+    def _load_predicate_names(self):
+        """Hash -> predicate name for the graph's predicate tables, from its
+        catalog. Names the catalog lacks, for a graph written before it
+        kept them, are looked up in the edge set once and recorded."""
+        catalog = self.cog.catalog(self.graph_name)
+        names = {}
+        found = {}
+        edge_set = None
+        internal = (self.config.GRAPH_NODE_SET_TABLE_NAME, self.config.GRAPH_EDGE_SET_TABLE_NAME)
+        for pred_hash in self.all_predicates:
+            name = catalog.predicates.get(pred_hash)
+            if name is None and pred_hash not in internal:
+                if edge_set is None:
+                    if self.config.GRAPH_EDGE_SET_TABLE_NAME not in catalog:
+                        continue
+                    edge_set = self.cog.get_table(self.config.GRAPH_EDGE_SET_TABLE_NAME, self.graph_name)
+                edge_record = edge_set.indexer.get(pred_hash, edge_set.store)
+                if edge_record is not None:
+                    name = found[pred_hash] = edge_record.value
+            if name is not None:
+                names[pred_hash] = name
+        if found:
+            catalog.add_predicates(found)
+        return names
+
     def _get_mg(self, pred_hash):
         if not self._use_memory_view:
             return None
         mg = self._mg.get(pred_hash)
         if mg is None:
             table = self.cog.get_table(pred_hash, self.graph_name)
-            mg = MemoryView(table)
+            mg = MemoryView(table, dictionary=self.cog.vertex_dictionary(self.graph_name),
+                            governor=self.cog.memory_governor)
             self._mg[pred_hash] = mg
         return mg
 
     def _disk_get_neighbors(self, pred_hash, node_id, direction='out'):
         table = self.cog.get_table(pred_hash, self.graph_name)
         key_fn = out_nodes if direction == 'out' else in_nodes
+        dictionary = self.cog.vertex_dictionary(self.graph_name)
+        if dictionary is not None:
+            node_id = dictionary.id_of(node_id)
+            if node_id is None:
+                return None
+            node_id = str(node_id)
         record = table.indexer.get(key_fn(node_id), table.store)
         if record is not None:
+            if dictionary is not None:
+                values = [record.value] if record.value_type == 's' else record.value
+                return dictionary.names_of(values)
             return record.value
         return None
 
+    def _prefetch_neighbors(self, pred_hash, node_ids, direction='out'):
+        """Start reading the adjacency records of a whole hop frontier
+        (Indexer.prefetch) so the lookups in __hop overlap their I/O."""
+        if len(node_ids) < PREFETCH_MIN_FRONTIER:
+            return
+        table = self.cog.get_table(pred_hash, self.graph_name)
+        key_fn = out_nodes if direction == 'out' else in_nodes
+        dictionary = self.cog.vertex_dictionary(self.graph_name)
+        if dictionary is not None:
+            ids = (dictionary.id_of(node_id) for node_id in node_ids)
+            node_ids = [str(node_id) for node_id in ids if node_id is not None]
+        table.indexer.prefetch([key_fn(node_id) for node_id in node_ids], table.store)
+
+    def _prefetch_frontier(self, pred_hash, mg, node_ids, direction):
+        """_prefetch_neighbors for the vertices a hop will read from disk:
+        all of them without a memory view, otherwise those the view has not
+        loaded, which it demand-loads one by one."""
+        if mg is not None:
+            node_ids = mg.missing(node_ids, direction)
+        self._prefetch_neighbors(pred_hash, node_ids, direction)
+
     def __adjacent_vertices(self, vertex, predicates, direction='out'):
         self.cog.use_namespace(self.graph_name)
         adjacent_vertices = []
@@ -1004,6 +1240,7 @@ class Graph(EmbeddingMixin, TraversalMixin):
             result_ids = set()
             for predicate in predicates:
                 mg = self._get_mg(predicate)
+                self._prefetch_frontier(predicate, mg, frontier_ids, direction)
                 for nid in frontier_ids:
                     if mg is not None:
                         nbrs = mg.get_out(nid) if direction == "out" else mg.get_in(nid)
@@ -1022,6 +1259,7 @@ class Graph(EmbeddingMixin, TraversalMixin):
             self.logger.debug("__hop predicate: " + predicate + " of " + str(predicates))
             mg = self._get_mg(predicate)
             edge_label = self._predicate_reverse_lookup_cache.get(predicate, predicate)
+            self._prefetch_frontier(predicate, mg, [v.id for v in self.last_visited_vertices], direction)
             for v in self.last_visited_vertices:
                 if mg is not None:
                     neighbors = mg.get_out(v.id) if direction == "out" else mg.get_in(v.id)
@@ -1082,6 +1320,8 @@ class Graph(EmbeddingMixin, TraversalMixin):
             result = set()
             for predicate in predicates:
                 mg = self._get_mg(predicate)
+                self._prefetch_frontier(predicate, mg, frontier, 'out')
+                self._prefetch_frontier(predicate, mg, frontier, 'in')
                 for nid in frontier:
                     if mg is not None:
                         nbrs = mg.get_out(nid)
@@ -1102,6 +1342,9 @@ class Graph(EmbeddingMixin, TraversalMixin):
         for predicate in predicates:
             mg = self._get_mg(predicate)
             edge_label = self._predicate_reverse_lookup_cache.get(predicate, predicate)
+            frontier = [v.id for v in self.last_visited_vertices]
+            self._prefetch_frontier(predicate, mg, frontier, 'out')
+            self._prefetch_frontier(predicate, mg, frontier, 'in')
             for v in self.last_visited_vertices:
                 if mg is not None:
                     out_neighbors = mg.get_out(v.id) or ()
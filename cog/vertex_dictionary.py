@@ -0,0 +1,155 @@
+"""
+Persistent vertex dictionary: a two-way map between vertex strings and
+dense integer ids for one graph.
+
+A graph created with Graph(..., vertex_dictionary=True) keeps its vertex
+strings in the node set and in this table only; edge tables store the
+decimal ids instead, which are shorter, hash faster and pack into 'I'
+segments (see cog.spindle_pack).
+
+Layout of the dictionary table:
+    vertex (str)                 -> id (int)
+    b'\\x02' + id (ascii digits)  -> vertex (str)
+
+Ids are handed out in order and the id -> vertex entry is written before
+the vertex -> id entry, so the next free id can be recovered on open by
+searching for the first missing id -> vertex entry; no counter is stored.
+
+Looked up vertices are cached both ways, least recently used first, up to
+VERTEX_DICTIONARY_CACHE_SIZE of them. With a memory governor (see
+cog.memory_governor) the cache is byte-budgeted and the governor sets the
+budget instead.
+"""
+
+from collections import OrderedDict
+
+from cog.core import Record
+
+_ID_PREFIX = b'\x02'
+# Estimated bytes per cached vertex besides its string: the id, the
+# string object and an entry in each of the two maps.
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def _id_key(vertex_id):
+    return _ID_PREFIX + str(vertex_id).encode('ascii')
+
+
+class VertexDictionary:
+
+    def __init__(self, table, max_entries=None, governor=None):
+        self.table = table
+        # vertex -> id, least recently used first, and id -> vertex for
+        # the same vertices.
+        self._ids = OrderedDict()
+        self._names = {}
+        if max_entries is None:
+            max_entries = table.config.VERTEX_DICTIONARY_CACHE_SIZE
+        self.governor = governor
+        self.budget = governor.max_bytes if governor is not None else max_entries
+        self.hits = 0
+        self._used = 0
+        self.next_id = self._find_next_id()
+        if governor is not None:
+            governor.register(("vertex-dictionary", id(self)), self)
+
+    def close(self):
+        if self.governor is not None:
+            self.governor.unregister(("vertex-dictionary", id(self)), self)
+
+    def _charge(self, vertex):
+        if self.governor is None:
+            return 1
+        return len(vertex) + _ENTRY_OVERHEAD_BYTES
+
+    def _cache(self, vertex, vertex_id):
+        if vertex in self._ids:
+            return
+        self._ids[vertex] = vertex_id
+        self._names[vertex_id] = vertex
+        charge = self._charge(vertex)
+        self._used += charge
+        self._evict_to(self.budget)
+        if self.governor is not None:
+            self.governor.note_growth(charge)
+
+    def _evict_to(self, budget):
+        while self._used > budget and self._ids:
+            vertex, vertex_id = self._ids.popitem(last=False)
+            self._names.pop(vertex_id, None)
+            self._used -= self._charge(vertex)
+
+    def size_bytes(self):
+        """Charged size of the cached vertices: bytes with a governor,
+        otherwise the vertex count."""
+        return self._used
+
+    def take_hits(self):
+        hits, self.hits = self.hits, 0
+        return hits
+
+    def set_budget(self, nbytes):
+        """Memory governor hook: evict down to *nbytes* and stay under it."""
+        self.budget = nbytes
+        self._evict_to(nbytes)
+
+    def _has_id(self, vertex_id):
+        return self.table.indexer.get(_id_key(vertex_id), self.table.store) is not None
+
+    def _find_next_id(self):
+        if not self._has_id(0):
+            return 0
+        low, high = 0, 1
+        while self._has_id(high):
+            low, high = high, high * 2
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self._has_id(middle):
+                low = middle
+            else:
+                high = middle
+        return high
+
+    def __len__(self):
+        return self.next_id
+
+    def id_of(self, vertex, create=False):
+        """Return the id of *vertex*. Unknown vertices get the next id when
+        *create* is set, otherwise None is returned."""
+        vertex_id = self._ids.get(vertex)
+        if vertex_id is not None:
+            self.hits += 1
+            self._ids.move_to_end(vertex)
+            return vertex_id
+        table = self.table
+        record = table.indexer.get(vertex, table.store)
+        if record is not None:
+            vertex_id = record.value
+        elif create:
+            vertex_id = self.next_id
+            table.indexer.put_record(Record(_id_key(vertex_id), vertex), table.store)
+            table.indexer.put_record(Record(vertex, vertex_id), table.store)
+            self.next_id += 1
+        else:
+            return None
+        self._cache(vertex, vertex_id)
+        return vertex_id
+
+    def name_of(self, vertex_id):
+        """Return the vertex string for *vertex_id*, or None if it was never assigned."""
+        vertex_id = int(vertex_id)
+        name = self._names.get(vertex_id)
+        if name is not None:
+            self.hits += 1
+            self._ids.move_to_end(name)
+            return name
+        record = self.table.indexer.get(_id_key(vertex_id), self.table.store)
+        if record is None:
+            return None
+        name = record.value
+        self._cache(name, vertex_id)
+        return name
+
+    def names_of(self, vertex_ids):
+        """Vertex strings for an iterable of ids, in the same order."""
+        return [self.name_of(i) for i in vertex_ids]
@@ -0,0 +1,111 @@
+"""
+Cache warming for the tables of a namespace.
+
+Opening a namespace no longer reads its tables (see Cog.load_namespace), so
+the first queries after open go to disk. warm_tables reads the live records
+of the chosen tables, in order, into their store caches and the page cache,
+stopping once budget_bytes of records have been read from the store files.
+Records already cached cost nothing against the budget.
+
+Writers are not shut out: the graph's lock is taken for one chunk of
+WARMUP_CHUNK records at a time. A table whose indexes are replaced while it
+is warmed, by index growth or compaction, is left as far as it got.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Records read per acquisition of the lock.
+WARMUP_CHUNK = 256
+
+
+def warm_tables(cog, namespace, tables=None, budget_bytes=None, lock=None, stop=None):
+    """
+    Read the live records of *tables* (default: all tables of *namespace*)
+    into their caches; see the module docstring.
+    :param lock: lock held by the namespace's readers and writers.
+    :param stop: optional threading.Event; warming ends once it is set.
+    :return: dict with 'tables' (name -> records read), 'records',
+        'bytes_read' and 'complete' (False if the budget or stop ended it).
+    """
+    if tables is None:
+        tables = cog.list_tables(namespace)
+    lock = lock if lock is not None else threading.RLock()
+    report = {'tables': {}, 'records': 0, 'bytes_read': 0, 'complete': True}
+    for name in tables:
+        with lock:
+            if stop is not None and stop.is_set():
+                report['complete'] = False
+                break
+            table = cog.get_table(name, namespace)
+            indexer, store = table.indexer, table.store
+            index_list = list(indexer.index_list)
+            scan = indexer.scanner(store)
+            bytes_before = store.bytes_read
+        records = 0
+        try:
+            while True:
+                with lock:
+                    if stop is not None and stop.is_set():
+                        report['complete'] = False
+                        break
+                    if table.indexer is not indexer or indexer.index_list != index_list:
+                        logger.info("warmup of %s stopped: its indexes were replaced", name)
+                        break
+                    budget_left = None if budget_bytes is None else (
+                        budget_bytes - report['bytes_read'] - (store.bytes_read - bytes_before))
+                    if budget_left is not None and budget_left <= 0:
+                        report['complete'] = False
+                        break
+                    done = False
+                    for _ in range(WARMUP_CHUNK):
+                        if next(scan, None) is None:
+                            done = True
+                            break
+                        records += 1
+                if done:
+                    break
+        finally:
+            with lock:
+                scan.close()
+            report['tables'][name] = records
+            report['records'] += records
+            report['bytes_read'] += store.bytes_read - bytes_before
+        if not report['complete']:
+            break
+    logger.info("warmed %d records (%d bytes) of %s", report['records'], report['bytes_read'], namespace)
+    return report
+
+
+class WarmupThread(threading.Thread):
+    """Runs warm_tables on a daemon thread.
+
+    After join(), report holds the warm_tables result, or error the
+    exception that stopped it. stop() ends the warmup after its current
+    chunk.
+    """
+
+    def __init__(self, cog, namespace, lock, tables=None, budget_bytes=None):
+        super().__init__(name="cog-warmup-%s" % namespace, daemon=True)
+        self.cog = cog
+        self.namespace = namespace
+        self.lock = lock
+        self.tables = tables
+        self.budget_bytes = budget_bytes
+        self._stop_event = threading.Event()
+        self.report = None
+        self.error = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            self.report = warm_tables(self.cog, self.namespace, tables=self.tables,
+                                      budget_bytes=self.budget_bytes, lock=self.lock,
+                                      stop=self._stop_event)
+        except Exception as e:
+            self.error = e
+            logger.error("Warmup of %s failed: %s", self.namespace, e)
@@ -18,6 +18,7 @@ import os
 import shutil
 import timeit
 import argparse
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import List, Tuple
 
@@ -26,6 +27,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from cog.torque import Graph
+from cog.core import Indexer
 from cog import config
 
 BENCHMARK_DIR = "/tmp/CogBenchmark"
@@ -156,6 +158,39 @@ def benchmark_reads(graph_name: str, sample_vertices: List[str]) -> BenchmarkRes
     )
 
 
+@contextmanager
+def append_then_patch():
+    """Route Indexer.put_record through the old write path: append the record
+    with a null key link, then patch the link in place."""
+    def put_record(self, record, store, timestamp=None):
+        position = store.save(record, timestamp=timestamp)
+        self.put(record.key, position, store)
+        return position
+    original = Indexer.put_record
+    Indexer.put_record = put_record
+    try:
+        yield
+    finally:
+        Indexer.put_record = original
+
+
+def run_write_path_benchmarks(sizes: List[int]):
+    """Compare write-once puts against append-then-patch."""
+    print("\n--- Write Path: append-then-patch vs write-once ---")
+    for size in sizes:
+        triples = generate_social_graph(max(size // 10, 2), avg_connections=10)[:size]
+        for label, bench in (("put", benchmark_individual_puts), ("put_batch", benchmark_batch_puts)):
+            setup()
+            with append_then_patch():
+                old = bench(f"patch_{label}_{size}", triples)
+            setup()
+            new = bench(f"once_{label}_{size}", triples)
+            print(old)
+            print(new)
+            print(f"Size {size:5}: {label} is {old.time_seconds / new.time_seconds:.2f}x faster writing once")
+        cleanup()
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Query Benchmarks
 # ─────────────────────────────────────────────────────────────────────────────
@@ -508,7 +543,10 @@ def run_benchmarks(sizes: List[int] = None, skip_individual: bool = False):
                 speedup = ind_results[0].time_seconds / batch_results[0].time_seconds
                 print(f"Size {size:5}: Batch is {speedup:.2f}x faster than individual puts")
     
-    # Benchmark 5: Query benchmarks
+    # Benchmark 5: Write path
+    run_write_path_benchmarks(sizes)
+
+    # Benchmark 6: Query benchmarks
     query_sizes = [s for s in sizes if s <= 1000]  # cap query graph sizes at 1000
     if not query_sizes:
         query_sizes = [100, 500, 1000]
@@ -0,0 +1,136 @@
+"""Tests for the Bloom filters kept beside index files (cog.bloom)."""
+import os
+import shutil
+import unittest
+
+from cog.bloom import BloomFilter
+from cog.compaction import compact_table
+from cog.config import CogConfig
+from cog.core import Record
+from cog.database import Cog
+
+DIR_NAME = "TestBloom"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.path = os.path.join(DB_PATH, "filter")
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter.create(self.path, 1000, 10)
+        keys = ["key%d" % i for i in range(1000)]
+        self.assertFalse(bloom.add(keys[0]))
+        self.assertTrue(bloom.add(keys[0]))
+        for key in keys:
+            bloom.add(key)
+        bloom.add(b"\x00bytes")
+        bloom.close()
+
+        bloom = BloomFilter.open(self.path)
+        self.assertTrue(all(bloom.might_contain(key) for key in keys))
+        self.assertTrue(bloom.might_contain(b"\x00bytes"))
+        false_positives = sum(bloom.might_contain("other%d" % i) for i in range(10000))
+        self.assertLess(false_positives, 300)
+        bloom.close()
+        self.assertIsNone(BloomFilter.open(self.path + "-missing"))
+
+
+class TestIndexKeyFilter(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101, INDEX_BLOOM_BITS_PER_KEY=10)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _open(self, config=None):
+        cog = Cog(config=config or self.config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("t", "ns")
+        return cog
+
+    def _filter_files(self):
+        return sorted(f for f in os.listdir(self.config.cog_data_dir("ns")) if self.config.INDEX_FILTER in f)
+
+    def test_misses_skip_index_and_store(self):
+        cog = self._open()
+        for i in range(50):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        table = cog.current_table
+        index = table.indexer.live_index
+        self.assertIsNotNone(index.key_filter)
+        reads = table.store.stats()
+        for i in range(200):
+            self.assertIsNone(cog.get("missing%d" % i))
+        self.assertGreater(index.filtered, 180)
+        self.assertLess(index.chain_walks, 50)
+        self.assertEqual(table.store.stats()['key_reads'], reads['key_reads'])
+        self.assertEqual(cog.get("key7").value, "value7")
+        self.assertFalse(table.indexer.delete("missing0", table.store))
+        cog.close()
+
+        # The filter is persisted and still used with the setting off.
+        cog = self._open(CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101))
+        cog.put(Record("late", "value"))
+        cog.close()
+        cog = self._open()
+        self.assertEqual(cog.get("late").value, "value")
+        self.assertTrue(all(cog.get("key%d" % i).value == "value%d" % i for i in range(50)))
+        self.assertIsNone(cog.get("missing0"))
+        self.assertEqual(cog.current_table.indexer.live_index.filtered, 1)
+        cog.close()
+
+    def test_growth_builds_a_new_filter(self):
+        cog = self._open(CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=11, INDEX_BLOOM_BITS_PER_KEY=10))
+        for i in range(200):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        indexer = cog.current_table.indexer
+        self.assertGreater(indexer.index_id, 0)
+        self.assertEqual(self._filter_files(), [os.path.basename(indexer.live_index.filter_name)])
+        self.assertTrue(all(cog.get("key%d" % i).value == "value%d" % i for i in range(200)))
+        cog.close()
+
+    def test_compaction_rebuilds_or_adds_the_filter(self):
+        cog = self._open(CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101))
+        for i in range(30):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        self.assertEqual(self._filter_files(), [])
+        cog.close()
+
+        cog = self._open()
+        cog.delete("key3")
+        compact_table(cog.current_table)
+        index = cog.current_table.indexer.live_index
+        self.assertIsNotNone(index.key_filter)
+        self.assertEqual(len(self._filter_files()), 1)
+        self.assertTrue(index.key_filter.might_contain("key4"))
+        self.assertFalse(index.key_filter.might_contain("key3"))  # deleted keys are dropped
+        self.assertTrue(all(cog.get("key%d" % i).value == "value%d" % i for i in range(30) if i != 3))
+        self.assertIsNone(cog.get("key3"))
+        cog.put(Record("key3", "back"))
+        self.assertEqual(cog.get("key3").value, "back")
+        cog.close()
+
+    def test_off_by_default(self):
+        cog = self._open(CogConfig(CUSTOM_COG_DB_PATH=DB_PATH))
+        cog.put(Record("key", "value"))
+        self.assertIsNone(cog.current_table.indexer.live_index.key_filter)
+        self.assertEqual(self._filter_files(), [])
+        cog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
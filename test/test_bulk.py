@@ -0,0 +1,116 @@
+"""Tests for cog.bulk — building graph files without going through put."""
+import os
+import random
+import shutil
+import unittest
+
+from cog.bulk import BulkLoader
+from cog.config import CogConfig
+from cog.core import Record
+from cog.database import hash_predicate, out_nodes
+from cog.torque import Graph
+
+DIR_NAME = "TestBulkLoader"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestBulkLoader(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.bulk_config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH + "/bulk")
+        self.put_config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH + "/put")
+        rng = random.Random(7)
+        self.triples = [("v%d" % rng.randrange(60), rng.choice(["follows", "likes", "knows"]),
+                         "v%d" % rng.randrange(60)) for _ in range(800)]
+        self.nt_path = DB_PATH + "/data.nt"
+        with open(self.nt_path, "w") as f:
+            for s, p, o in self.triples:
+                f.write('"%s" "%s" "%s" .\n' % (s, p, o))
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _snapshot(self, g):
+        vertices = sorted(r['id'] for r in g.v().all()['result'])
+        edges = {}
+        for v in vertices:
+            for p in ("follows", "likes", "knows"):
+                edges[(v, p, 'out')] = sorted(r['id'] for r in g.v(v).out(p).all()['result'])
+                edges[(v, p, 'in')] = sorted(r['id'] for r in g.v(v).inc(p).all()['result'])
+        return vertices, edges
+
+    def test_matches_graph_put(self):
+        # A tiny chunk size forces many spilled runs.
+        report = BulkLoader("g", config=self.bulk_config, chunk_size=97).add_triples(self.nt_path).run()
+        self.assertEqual(report['triples'], 800)
+        self.assertEqual(report['tables'], 5)
+
+        expected = Graph("g", config=self.put_config)
+        expected.put_batch(self.triples)
+        loaded = Graph("g", config=self.bulk_config)
+        self.assertEqual(self._snapshot(loaded), self._snapshot(expected))
+        self.assertEqual(sorted(r['id'] for r in loaded.scan(10, 'e')['result']), ["follows", "knows", "likes"])
+        # Folds each catalog's log into its catalog file (see cog.catalog).
+        expected.sync()
+        loaded.sync()
+        self.assertEqual(sorted(os.listdir(self.bulk_config.cog_data_dir("g"))),
+                         sorted(f.replace(expected.cog.instance_id, loaded.cog.instance_id)
+                                for f in os.listdir(self.put_config.cog_data_dir("g"))))
+
+        loaded.put("v1", "follows", "new_vertex")
+        self.assertIn({'id': 'new_vertex'}, loaded.v("v1").out("follows").all()['result'])
+        expected.close()
+        loaded.close()
+
+    def test_adjacency_written_contiguously(self):
+        BulkLoader("g", config=self.bulk_config).add_triples(self.nt_path).run()
+        g = Graph("g", config=self.bulk_config)
+        table = g.cog.get_table(hash_predicate("follows"), "g")
+        for v in ("v%d" % i for i in range(60)):
+            head, head_pos = table.indexer.get_head_only(out_nodes(v), table.store)
+            if head is None:
+                continue
+            positions = [head_pos]
+            link = head.value_link
+            while link != Record.VALUE_LINK_NULL:
+                positions.append(link)
+                link = table.store.read(link).value_link
+            self.assertEqual(positions, sorted(positions, reverse=True))
+            gaps = {a - b for a, b in zip(positions, positions[1:])}
+            self.assertLess(max(gaps, default=0), 64)
+        g.close()
+
+    def test_csv_and_edgelist(self):
+        csv_path = DB_PATH + "/people.csv"
+        with open(csv_path, "w") as f:
+            f.write("id,name,city\n1,alice,paris\n2,bob,rome\n")
+        edges_path = DB_PATH + "/edges.txt"
+        with open(edges_path, "w") as f:
+            f.write("1 2\n2 1\n\n")
+        BulkLoader("g", config=self.bulk_config).add_csv(csv_path, "id").add_edgelist(edges_path, "knows").run()
+
+        expected = Graph("g", config=self.put_config)
+        expected.load_csv(csv_path, "id")
+        expected.put_batch([("1", "knows", "2"), ("2", "knows", "1")])
+        loaded = Graph("g", config=self.bulk_config)
+        for v in ("1", "2"):
+            for p in ("name", "city", "id", "knows"):
+                self.assertEqual(loaded.v(v).out(p).all(), expected.v(v).out(p).all())
+        self.assertEqual(loaded.v().count(), expected.v().count())
+        expected.close()
+        loaded.close()
+
+    def test_refuses_non_empty_graph(self):
+        g = Graph("g", config=self.bulk_config)
+        g.put("a", "b", "c")
+        g.close()
+        with self.assertRaises(ValueError):
+            BulkLoader("g", config=self.bulk_config).add_triples(self.nt_path).run()
+
+
+if __name__ == '__main__':
+    unittest.main()
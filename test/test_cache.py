@@ -1,5 +1,10 @@
+from cog.config import CogConfig
 from cog.core import Record
+from cog.database import Cog
 from cog.store_cache import StoreCache
+import os
+import shutil
+import threading
 import unittest
 
 DIR_NAME = "TestCore"
@@ -22,3 +27,149 @@ class TestStoreCache(unittest.TestCase):
         self.assertEqual(10075, retrieved.key_link)
         self.assertEqual(record.value_type, retrieved.value_type)
         self.assertEqual(record.value_link, retrieved.value_link)
+
+
+class TestStripedStoreCache(unittest.TestCase):
+
+    def test_size_is_bounded_across_stripes(self):
+        cache = StoreCache("test_cache", max_size=64, stripes=4)
+        for position in range(1000):
+            cache.put(position * 23, position)
+        self.assertLessEqual(cache.size(), 64)
+        self.assertEqual(cache.get(999 * 23), 999)
+        self.assertIsNone(cache.get(0))
+
+    def test_shared_cache_is_shared_by_id(self):
+        shared = {}
+        first = StoreCache("store_a", shared)
+        second = StoreCache("store_a", shared)
+        other = StoreCache("store_b", shared)
+        first.put(40, "record")
+        self.assertEqual(second.peek(40), "record")
+        self.assertIsNone(other.peek(40))
+        second.evict(40)
+        self.assertIsNone(first.get(40))
+
+    def test_concurrent_puts_and_gets(self):
+        cache = StoreCache("test_cache", max_size=1 << 20)
+        errors = []
+
+        def work(offset):
+            try:
+                for position in range(offset, offset + 2000):
+                    cache.put(position, position)
+                    if cache.get(position) != position:
+                        errors.append(position)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+        threads = [threading.Thread(target=work, args=(n * 2000,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.size(), 16000)
+
+
+class _CountingLock:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+
+    def __enter__(self):
+        self.acquired += 1
+        return self._lock.__enter__()
+
+    def __exit__(self, *exc):
+        return self._lock.__exit__(*exc)
+
+
+class TestConcurrentStoreReads(unittest.TestCase):
+
+    def setUp(self):
+        self.path = "/tmp/" + DIR_NAME + "StoreReads"
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+        self.cog = Cog(config=CogConfig(CUSTOM_COG_DB_PATH=self.path))
+        self.cog.create_or_load_namespace("ns")
+        self.cog.create_table("kv", "ns")
+        self.store = self.cog.current_table.store
+        self.positions = {self.store.save(Record("k%d" % i, "v%d" % i)): i for i in range(500)}
+
+    def tearDown(self):
+        self.cog.close()
+        shutil.rmtree(self.path)
+
+    def test_reads_do_not_take_the_write_lock(self):
+        self.store.store_cache.clear()
+        self.store._lock = _CountingLock()
+        for position, i in self.positions.items():
+            self.assertEqual(self.store.read(position).value, "v%d" % i)
+        self.assertEqual(self.store._lock.acquired, 0)
+
+    def test_readers_survive_remapping_during_writes(self):
+        errors = []
+
+        def read():
+            for _ in range(5):
+                self.store.store_cache.clear()
+                for position, i in self.positions.items():
+                    record = self.store.read(position)
+                    if record is None or record.value != "v%d" % i:
+                        errors.append(position)
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for t in readers:
+            t.start()
+        for i in range(500, 1500):
+            self.store.save(Record("k%d" % i, "x" * 100))
+        for t in readers:
+            t.join()
+        self.assertEqual(errors, [])
+
+
+class TestCachePolicies(unittest.TestCase):
+
+    def test_byte_budget_counts_record_sizes(self):
+        cache = StoreCache("test_cache", max_bytes=16 * 10000, stripes=16)
+        for position in range(100):
+            cache.put(position * 4000, "embedding", 3000)
+        self.assertLessEqual(cache.size_bytes(), 16 * 10000)
+        self.assertLess(cache.size(), 60)
+        for position in range(1000):
+            cache.put(10 ** 7 + position * 40, "edge", 30)
+        self.assertGreater(cache.size(), 900)
+
+    def test_slru_survives_a_scan(self):
+        for policy, survivors in (("lru", 0), ("slru", 50)):
+            cache = StoreCache("test_cache", max_size=1600, stripes=16, policy=policy)
+            hot = range(0, 50 * 64, 64)
+            for position in hot:
+                cache.put(position, position)
+                cache.get(position)
+            for position in range(10 ** 6, 10 ** 6 + 20000):
+                cache.put(position, position)
+            self.assertEqual(sum(cache.peek(position) is not None for position in hot), survivors, policy)
+            self.assertLessEqual(cache.size(), 1600)
+
+    def test_unknown_policy_rejected(self):
+        with self.assertRaises(ValueError):
+            StoreCache("test_cache", policy="clock")
+
+    def test_store_uses_configured_cache(self):
+        path = "/tmp/" + DIR_NAME + "CachePolicy"
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        cog = Cog(config=CogConfig(CUSTOM_COG_DB_PATH=path, STORE_CACHE_POLICY="slru", STORE_CACHE_BYTES=1 << 16))
+        cog.create_or_load_namespace("ns")
+        cog.create_table("kv", "ns")
+        for i in range(2000):
+            cog.put(Record("k%d" % i, "v" * 100))
+        store_cache = cog.current_table.store.store_cache
+        self.assertEqual(store_cache.policy, "slru")
+        self.assertLessEqual(store_cache.size_bytes(), 1 << 16)
+        self.assertEqual(cog.get("k5").value, "v" * 100)
+        cog.close()
+        shutil.rmtree(path)
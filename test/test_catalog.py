@@ -0,0 +1,118 @@
+"""Tests for the per-namespace catalog (cog.catalog)."""
+import json
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from cog.catalog import CATALOG_FILE, CATALOG_LOG
+from cog.config import CogConfig
+from cog.database import hash_predicate
+from cog.torque import Graph
+
+DIR_NAME = "TestCatalog"
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join("/tmp", DIR_NAME)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _graph(self, **overrides):
+        return Graph("g", config=CogConfig(CUSTOM_COG_DB_PATH=self.path, **overrides))
+
+    def _catalog_path(self, g):
+        return os.path.join(g.config.cog_data_dir("g"), CATALOG_FILE)
+
+    def test_puts_do_not_list_the_directory(self):
+        g = self._graph()
+        g.put("a", "knows", "b")
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir:
+            for i in range(50):
+                g.put("a", "knows", "v{}".format(i))
+            g.put_batch([("b", "likes", "c"), ("c", "knows", "d")])
+        self.assertEqual(listdir.call_count, 0)
+        self.assertIn(hash_predicate("likes"), g.all_predicates)
+        self.assertEqual(g.v("b").out("likes").all(), {'result': [{'id': 'c'}]})
+        g.close()
+
+    def test_reopen_reads_predicate_names_from_catalog(self):
+        g = self._graph()
+        g.put_batch([("a", "knows", "b"), ("b", "likes", "c")])
+        g.close()
+        with open(self._catalog_path(g)) as f:
+            data = json.load(f)
+        self.assertEqual(data['predicates'], {hash_predicate("knows"): "knows",
+                                              hash_predicate("likes"): "likes"})
+        self.assertIn(g.config.GRAPH_EDGE_SET_TABLE_NAME, data['tables'])
+
+        g = self._graph()
+        with mock.patch('cog.core.Indexer.get', autospec=True) as get:
+            names = g._load_predicate_names()
+        get.assert_not_called()
+        self.assertEqual(names[hash_predicate("likes")], "likes")
+        self.assertEqual(g.v("a").out("knows").out("likes").all(), {'result': [{'id': 'c'}]})
+        g.close()
+
+    def test_new_tables_are_appended_not_rewritten(self):
+        g = self._graph()
+        g.put("a", "p0", "b")
+        g.sync()
+        with mock.patch('cog.catalog.os.replace', wraps=os.replace) as replace:
+            g.put_batch([("a", "p%d" % i, "b") for i in range(1, 60)])
+            for i in range(60, 80):
+                g.put("a", "p%d" % i, "b")
+        self.assertEqual(replace.call_count, 0)
+        log_path = os.path.join(g.config.cog_data_dir("g"), CATALOG_LOG)
+        with open(log_path) as f:
+            self.assertEqual(sum(1 for line in f if '"table"' in line), 79)
+        g.sync()
+        self.assertFalse(os.path.exists(log_path))
+        with open(self._catalog_path(g)) as f:
+            data = json.load(f)
+        self.assertEqual(len(data['predicates']), 80)
+        g.put("a", "p80", "b")
+        # A torn last line, as a crash mid-append leaves it, is ignored.
+        with open(log_path, 'a') as f:
+            f.write('{"table":"torn')
+        g.cog.catalogs.clear()
+        self.assertIn(hash_predicate("p80"), g.cog.list_tables("g"))
+        self.assertEqual(g.cog.catalog("g").predicates[hash_predicate("p80")], "p80")
+        g.close()
+        self.assertFalse(os.path.exists(log_path))
+
+    def test_missing_catalog_is_rebuilt(self):
+        # A graph written before the catalog existed, with a grown index.
+        g = self._graph(INDEX_CAPACITY=11)
+        g.put_batch([("v{}".format(i), "knows", "v{}".format(i + 1)) for i in range(40)])
+        g.close()
+        os.remove(self._catalog_path(g))
+
+        g = self._graph(INDEX_CAPACITY=11)
+        self.assertEqual(g._predicate_reverse_lookup_cache[hash_predicate("knows")], "knows")
+        self.assertEqual(g.v("v3").out("knows").all(), {'result': [{'id': 'v4'}]})
+        table = g.cog.get_table(hash_predicate("knows"), "g")
+        self.assertGreater(table.indexer.index_id, 0)
+        g.close()
+        with open(self._catalog_path(g)) as f:
+            entry = json.load(f)['tables'][hash_predicate("knows")]
+        # Growth can still be moving keys, so the old index may remain.
+        self.assertEqual(entry['indexes'], sorted(idx.index_id for idx in table.indexer.index_list))
+        self.assertEqual(entry['indexes'][-1], table.indexer.index_id)
+        self.assertEqual(entry['capacity'], table.indexer.live_index.capacity)
+
+        # A stale entry is not trusted: the index files are listed instead.
+        catalog = g.cog.catalog("g")
+        self.assertEqual(catalog.index_ids(hash_predicate("knows"), g.cog.instance_id), entry['indexes'])
+        catalog._tables[hash_predicate("knows")]['indexes'] = [0]
+        self.assertIsNone(catalog.index_ids(hash_predicate("knows"), g.cog.instance_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
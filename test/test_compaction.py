@@ -0,0 +1,237 @@
+"""Tests for cog.compaction — rewriting stores with only live records."""
+import os
+import shutil
+import threading
+import unittest
+from unittest import mock
+
+from cog import compaction
+from cog.compaction import compact_table
+from cog.config import CogConfig
+from cog.core import COMPACT_TMP_SUFFIX, COMPACT_BACKUP_SUFFIX
+from cog.database import Cog
+from cog.core import Record
+from cog.torque import Graph
+
+DIR_NAME = "TestCompaction"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestCompactTable(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.cog = Cog(config=CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=7,
+                                        INDEX_MAX_LOAD_FACTOR=0))
+        self.cog.create_or_load_namespace("ns")
+        self.cog.create_table("kv", "ns")
+
+    def tearDown(self):
+        self.cog.close()
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_reclaims_overwritten_and_deleted_records(self):
+        for version in range(5):
+            for i in range(40):
+                self.cog.put(Record("key_%d" % i, "value_%d_%d" % (i, version)))
+        for i in range(0, 40, 4):
+            self.cog.delete("key_%d" % i)
+        table = self.cog.current_table
+        timestamps = {i: self.cog.get("key_%d" % i).timestamp for i in range(1, 40, 4)}
+
+        report = compact_table(table)
+
+        self.assertEqual(report['live_keys'], 30)
+        self.assertEqual(report['records_written'], 30)
+        self.assertGreater(report['bytes_reclaimed'], 0)
+        self.assertEqual(report['bytes_after'], os.path.getsize(table.store.store))
+        for i in range(40):
+            record = self.cog.get("key_%d" % i)
+            if i % 4 == 0:
+                self.assertIsNone(record)
+            else:
+                self.assertEqual(record.value, "value_%d_4" % i)
+        for i, ts in timestamps.items():
+            self.assertEqual(self.cog.get("key_%d" % i).timestamp, ts)
+        leftovers = [f for f in os.listdir(self.cog.config.cog_data_dir("ns"))
+                     if f.endswith((COMPACT_TMP_SUFFIX, COMPACT_BACKUP_SUFFIX))]
+        self.assertEqual(leftovers, [])
+
+    def test_value_chains_written_contiguously(self):
+        for i in range(10):
+            for j in range(6):
+                self.cog.put_set(Record("set_%d" % i, "member_%d" % j))
+        compact_table(self.cog.current_table)
+        self.cog.cache.clear()
+
+        store = self.cog.current_table.store
+        for i in range(10):
+            head, head_pos = self.cog.current_table.indexer.get_head_only("set_%d" % i, store)
+            positions = [head_pos]
+            link = head.value_link
+            while link != Record.VALUE_LINK_NULL:
+                positions.append(link)
+                link = store.read(link).value_link
+            self.assertEqual(positions, sorted(positions, reverse=True))
+            self.assertEqual(sorted(self.cog.get("set_%d" % i).value),
+                             ["member_%d" % j for j in range(6)])
+
+    def test_writes_after_compaction(self):
+        for i in range(20):
+            self.cog.put(Record("key_%d" % i, "a"))
+        compact_table(self.cog.current_table)
+        for i in range(20, 30):
+            self.cog.put(Record("key_%d" % i, "b"))
+        self.cog.put(Record("key_3", "c"))
+        self.assertEqual(self.cog.get("key_3").value, "c")
+        self.assertEqual(self.cog.get("key_25").value, "b")
+        self.assertEqual(len(list(self.cog.scanner())), 30)
+
+
+class TestOnlineCompaction(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.cog = Cog(config=CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=7))
+        self.cog.create_or_load_namespace("ns")
+        self.cog.create_table("kv", "ns")
+        self.lock = threading.RLock()
+
+    def tearDown(self):
+        self.cog.close()
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _compact_with_writes_during_copy(self, writes):
+        live_heads = compaction._live_heads
+
+        def live_heads_with_writes(indexer, store):
+            for n, item in enumerate(live_heads(indexer, store)):
+                if n == 2:
+                    with self.lock:
+                        writes()
+                yield item
+        with mock.patch.object(compaction, '_live_heads', live_heads_with_writes):
+            return compact_table(self.cog.current_table, lock=self.lock)
+
+    def test_writes_during_copy_are_replayed(self):
+        for version in range(3):
+            for i in range(30):
+                self.cog.put(Record("key_%d" % i, "v%d" % version))
+        for i in range(5):
+            self.cog.put_set(Record("set_%d" % i, "a"))
+
+        def writes():
+            for i in range(0, 30, 2):
+                self.cog.put(Record("key_%d" % i, "during"))
+            for i in range(30, 60):
+                self.cog.put(Record("key_%d" % i, "new"))
+            self.cog.delete("key_1")
+            self.cog.put_set(Record("set_0", "b"))
+
+        self._compact_with_writes_during_copy(writes)
+        self.cog.cache.clear()
+
+        for i in range(60):
+            record = self.cog.get("key_%d" % i)
+            if i == 1:
+                self.assertIsNone(record)
+            elif i >= 30:
+                self.assertEqual(record.value, "new")
+            else:
+                self.assertEqual(record.value, "during" if i % 2 == 0 else "v2")
+        self.assertEqual(sorted(self.cog.get("set_0").value), ["a", "b"])
+        self.assertEqual(self.cog.get("set_3").value, ["a"])
+        self.assertEqual(len(list(self.cog.scanner())), 59 + 5)
+
+    def test_growth_deferred_during_copy(self):
+        for i in range(5):
+            self.cog.put(Record("key_%d" % i, "a"))
+        capacity = self.cog.current_table.indexer.live_index.capacity
+
+        def writes():
+            for i in range(5, 100):
+                self.cog.put(Record("key_%d" % i, "b"))
+            self.assertEqual(self.cog.current_table.indexer.live_index.capacity, capacity)
+
+        self._compact_with_writes_during_copy(writes)
+        for i in range(100, 110):
+            self.cog.put(Record("key_%d" % i, "c"))
+        self.assertGreater(self.cog.current_table.indexer.live_index.capacity, capacity)
+        self.assertEqual(len(list(self.cog.scanner())), 110)
+        self.assertEqual(self.cog.get("key_50").value, "b")
+
+
+class TestGraphCompact(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_graph_compact_preserves_queries(self):
+        g = Graph("social", config=self.config)
+        for i in range(30):
+            g.put("user_%d" % i, "follows", "user_%d" % ((i + 1) % 30))
+            g.put("user_%d" % i, "follows", "user_%d" % ((i + 2) % 30))
+        for i in range(0, 30, 3):
+            g.delete("user_%d" % i, "follows", "user_%d" % ((i + 1) % 30))
+        g.put("user_1", "status", "cool", update=True)
+        g.put("user_1", "status", "cooler", update=True)
+
+        expected_out = {i: sorted(r['id'] for r in g.v("user_%d" % i).out("follows").all()['result'])
+                        for i in range(30)}
+        expected_in = sorted(r['id'] for r in g.v("user_5").inc("follows").all()['result'])
+
+        report = g.compact()
+        self.assertGreater(report['bytes_reclaimed'], 0)
+        self.assertEqual(report['bytes_before'] - report['bytes_after'], report['bytes_reclaimed'])
+
+        for i in range(30):
+            self.assertEqual(sorted(r['id'] for r in g.v("user_%d" % i).out("follows").all()['result']),
+                             expected_out[i])
+        self.assertEqual(sorted(r['id'] for r in g.v("user_5").inc("follows").all()['result']), expected_in)
+        self.assertEqual(g.v("user_1").out("status").all()['result'], [{'id': 'cooler'}])
+
+        g.put("user_0", "follows", "user_29")
+        self.assertIn({'id': 'user_29'}, g.v("user_0").out("follows").all()['result'])
+        g.close()
+
+        g = Graph("social", config=self.config)
+        self.assertIn({'id': 'user_29'}, g.v("user_0").out("follows").all()['result'])
+        self.assertEqual(g.v().count(), 30 + 2)
+        g.close()
+
+    def test_background_compact_while_writing(self):
+        g = Graph("social", config=self.config)
+        for i in range(50):
+            g.put("user_%d" % i, "follows", "user_%d" % ((i + 1) % 50))
+            g.put("user_%d" % i, "likes", "post_%d" % i, update=True)
+            g.put("user_%d" % i, "likes", "post_%d_new" % i, update=True)
+
+        thread = g.compact(background=True)
+        for i in range(50):
+            g.put("user_%d" % i, "follows", "user_%d" % ((i + 7) % 50))
+        thread.join()
+        self.assertIsNone(thread.error)
+        self.assertGreater(thread.report['bytes_reclaimed'], 0)
+
+        for i in range(50):
+            self.assertEqual(sorted(r['id'] for r in g.v("user_%d" % i).out("follows").all()['result']),
+                             sorted({"user_%d" % ((i + 1) % 50), "user_%d" % ((i + 7) % 50)}))
+            self.assertEqual(g.v("user_%d" % i).out("likes").all()['result'], [{'id': "post_%d_new" % i}])
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
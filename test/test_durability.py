@@ -0,0 +1,131 @@
+"""Tests for durability modes and group commit (cog.durability)."""
+import os
+import shutil
+import threading
+import time
+import unittest
+from unittest import mock
+
+from cog.config import CogConfig
+from cog.core import Record
+from cog.database import Cog
+from cog.durability import GroupCommitter
+from cog.torque import Graph
+
+DIR_NAME = "TestDurability"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestDurability(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _cog(self, durability, **overrides):
+        cog = Cog(config=CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, **overrides), durability=durability)
+        cog.create_or_load_namespace("ns")
+        return cog
+
+    def test_unknown_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            Cog(config=CogConfig(CUSTOM_COG_DB_PATH=DB_PATH), durability="always")
+
+    def test_none_keeps_writes_buffered_until_sync(self):
+        cog = self._cog("none")
+        cog.create_table("kv", "ns")
+        store = cog.current_table.store
+        size = os.path.getsize(store.store)
+        for i in range(10):
+            store.save(Record("k%d" % i, "v"))
+        self.assertEqual(os.path.getsize(store.store), size)
+        cog.sync()
+        self.assertGreater(os.path.getsize(store.store), size)
+        cog.close()
+
+    def test_group_commit_coalesces_writers_across_tables(self):
+        # A long interval: only the byte threshold or sync() commits.
+        cog = self._cog("fsync-group", GROUP_COMMIT_INTERVAL_MS=60000, GROUP_COMMIT_BYTES=1 << 30)
+        tables = []
+        for name in ("t0", "t1", "t2", "t3"):
+            cog.create_table(name, "ns")
+            tables.append(cog.current_table)
+        committer = tables[0].group_commit
+        self.assertIs(committer, tables[3].group_commit)
+
+        def write(table, n):
+            for i in range(200):
+                position = table.store.save(Record("k%d_%d" % (n, i), "v"))
+                table.indexer.put("k%d_%d" % (n, i), position, table.store)
+
+        with mock.patch('cog.core.os.fsync', wraps=os.fsync) as fsync:
+            threads = [threading.Thread(target=write, args=(t, n)) for n, t in enumerate(tables)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(fsync.call_count, 0)
+            cog.sync()
+            self.assertEqual(fsync.call_count, 4)
+        for n, table in enumerate(tables):
+            self.assertEqual(table.indexer.get("k%d_199" % n, table.store).value, "v")
+        cog.close()
+
+    def test_group_commit_on_interval_and_bytes(self):
+        stores = [mock.Mock(), mock.Mock()]
+        committer = GroupCommitter(interval_ms=20, max_bytes=100)
+        committer.note_write(stores[0], 10)
+        committer.note_write(stores[1], 10)
+        deadline = time.time() + 5
+        while committer.commits == 0 and time.time() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(committer.commits, 1)
+        stores[0].fsync.assert_called_once_with()
+        stores[1].fsync.assert_called_once_with()
+
+        committer.interval = 60
+        committer.note_write(stores[0], 10)
+        committer.note_write(stores[0], 200)
+        deadline = time.time() + 5
+        while committer.commits == 1 and time.time() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(committer.commits, 2)
+        self.assertEqual(stores[0].fsync.call_count, 2)
+
+    def test_group_commit_covers_batched_writes(self):
+        g = Graph("batched", config=CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, GROUP_COMMIT_INTERVAL_MS=20),
+                  durability="fsync-group")
+        g.put("a", "knows", "b")
+        time.sleep(0.1)
+        store = g.cog.get_table(g.cog.list_tables("batched")[0], "batched").store
+        fsyncs = store.fsyncs
+        g.put_batch([("n%d" % i, "knows", "n%d" % (i + 1)) for i in range(200)])
+        deadline = time.time() + 5
+        while store.fsyncs == fsyncs and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(store.fsyncs, fsyncs)
+        g.close()
+
+    def test_graph_durability_survives_reopen(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH)
+        g = Graph("durable", config=config, durability="fsync-group")
+        for i in range(20):
+            g.put("n%d" % i, "next", "n%d" % (i + 1))
+        g.sync()
+        g.truncate()
+        self.assertEqual(g.cog.durability, "fsync-group")
+        g.put("a", "b", "c")
+        g.close()
+
+        g = Graph("durable", config=config)
+        self.assertEqual(g.v("a").out("b").all()['result'], [{'id': 'c'}])
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
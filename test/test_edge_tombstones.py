@@ -0,0 +1,88 @@
+"""Tests for edge deletes by removal records (Cog.remove_value)."""
+import os
+import shutil
+import unittest
+
+from cog.database import hash_predicate, out_nodes
+from cog.torque import Graph
+
+DIR_NAME = "TestEdgeTombstones"
+DB_PATH = "/tmp/" + DIR_NAME
+FOLLOWERS = 2000
+
+
+def _ids(result):
+    return sorted(v['id'] for v in result['result'])
+
+
+class TestEdgeTombstones(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _graph(self, **kwargs):
+        g = Graph("g", cog_home=DIR_NAME, cog_path_prefix="/tmp", **kwargs)
+        g.put_batch([("hub", "follows", "f%d" % i) for i in range(FOLLOWERS)])
+        return g
+
+    def test_delete_edge_writes_one_record_per_side(self):
+        g = self._graph(use_memory_view=False)
+        writes = g.stats()["follows"]["writes"]
+        g.delete("hub", "follows", "f5")
+        # A removal on hub's list; f5's only in-edge key is deleted.
+        self.assertLessEqual(g.stats()["follows"]["writes"] - writes, 2)
+        expected = sorted("f%d" % i for i in range(FOLLOWERS) if i != 5)
+        self.assertEqual(_ids(g.v("hub").out("follows").all()), expected)
+        self.assertEqual(g.v("f5").inc("follows").all()['result'], [])
+
+        g.delete("hub", "follows", "f6")
+        g.put("hub", "follows", "f5")
+        expected = sorted(set(expected) - {"f6"} | {"f5"})
+        self.assertEqual(_ids(g.v("hub").out("follows").all()), expected)
+        g.close()
+
+        # Reopened, through a memory view and a table scan.
+        g = Graph("g", cog_home=DIR_NAME, cog_path_prefix="/tmp")
+        self.assertEqual(_ids(g.v("hub").out("follows").all()), expected)
+        self.assertEqual(_ids(g.v("f6").inc("follows").all()), [])
+        self.assertEqual(sum(1 for s, p, o in g.triples() if s == "hub"), FOLLOWERS - 1)
+        g.close()
+
+    def test_emptied_list_reads_as_absent_and_compacts_away(self):
+        g = Graph("g", cog_home=DIR_NAME, cog_path_prefix="/tmp", use_memory_view=False)
+        g.put_batch([("a", "knows", "b"), ("a", "knows", "c"), ("a", "knows", "d"), ("e", "knows", "d")])
+        g.delete("a", "knows", "b")
+        g.delete("a", "knows", "c")
+        g.delete("a", "knows", "d")
+        self.assertEqual(g.v("a").out("knows").all()['result'], [])
+        self.assertEqual(_ids(g.v("d").inc("knows").all()), ["e"])
+        table = g.cog.get_table(hash_predicate("knows"), "g")
+        self.assertIsNone(table.indexer.get(out_nodes("a"), table.store))
+        self.assertNotIn(out_nodes("a"), [r.key for r in g.cog.scanner(table)])
+
+        g.compact()
+        table = g.cog.get_table(hash_predicate("knows"), "g")
+        value_types = [value_type for _, _, value_type, _ in table.store.scan_headers()]
+        self.assertNotIn('r', value_types)
+        self.assertIsNone(table.indexer.get(out_nodes("a"), table.store))
+        self.assertEqual(_ids(g.v("d").inc("knows").all()), ["e"])
+        g.close()
+
+    def test_update_edge_removes_old_in_edges(self):
+        g = self._graph()
+        g.put("other", "follows", "f1")
+        g.put("hub", "follows", "solo", update=True)
+        self.assertEqual(_ids(g.v("hub").out("follows").all()), ["solo"])
+        self.assertEqual(_ids(g.v("f1").inc("follows").all()), ["other"])
+        self.assertEqual(g.v("f2").inc("follows").all()['result'], [])
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
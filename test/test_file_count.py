@@ -4,6 +4,7 @@ not with raw predicate names (regression test for duplicate file bug).
 """
 from cog.torque import Graph
 from cog.database import hash_predicate
+from cog.catalog import CATALOG_FILE
 from cog import config as cfg
 import unittest
 import os
@@ -115,11 +116,13 @@ class TestPredicateFileCreation(unittest.TestCase):
         files = os.listdir(graph_dir)
         
         # Expected: 3 predicate tables + 2 system tables = 5 tables
-        # Each table = 2 files (index + store) = 10 files total
+        # Each table = 2 files (index + store) = 10 files, plus the
+        # graph's catalog (see cog.catalog) = 11 files total
         # System tables: TOR_NODE_SET, TOR_EDGE_SET
+        self.assertIn(CATALOG_FILE, files)
         self.assertEqual(
-            len(files), 10,
-            f"Expected 10 files (3 predicates + 2 system tables × 2 files each), "
+            len(files), 11,
+            f"Expected 11 files (3 predicates + 2 system tables × 2 files each, plus the catalog), "
             f"but found {len(files)}: {sorted(files)}"
         )
 
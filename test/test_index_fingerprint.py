@@ -0,0 +1,122 @@
+"""Tests for key fingerprints carried in index slots and key_links."""
+import os
+import shutil
+import struct
+import unittest
+
+from cog.config import CogConfig
+from cog.core import Record, _key_hash, _fingerprint, _POSITION_MASK
+from cog.database import Cog
+
+DIR_NAME = "TestIndexFingerprint"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class CountingReads:
+    """Wraps Store.read on one store instance to count record decodes."""
+
+    def __init__(self, store):
+        self.store = store
+        self.count = 0
+        self._read = store.read
+
+        def read(position):
+            self.count += 1
+            return self._read(position)
+        store.read = read
+
+    def reset(self):
+        self.count = 0
+
+
+class TestIndexFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        # One slot and no growth: every key lands in the same collision chain.
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=1, INDEX_MAX_LOAD_FACTOR=0)
+        self.cog = Cog(config=config)
+        self.cog.create_or_load_namespace("fp")
+        self.cog.create_table("chain", "fp")
+        self.keys = ["key_%d" % i for i in range(20)]
+        for k in self.keys:
+            self.cog.put(Record(k, "value_" + k))
+        self.table = self.cog.current_table
+        self.table.store.store_cache.clear()
+
+    def tearDown(self):
+        self.cog.close()
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _probe_key(self):
+        used = {_fingerprint(_key_hash(k)) for k in self.keys}
+        for i in range(1000):
+            candidate = "missing_%d" % i
+            if _fingerprint(_key_hash(candidate)) not in used:
+                return candidate
+        self.fail("no probe key with a distinct fingerprint")
+
+    def test_slot_carries_fingerprint(self):
+        index = self.table.indexer.live_index
+        link = struct.unpack_from('<q', index.db_mem, 0)[0]
+        head_key = self.keys[-1]
+        self.assertEqual(link >> 48, _fingerprint(_key_hash(head_key)))
+        self.assertEqual(self.table.store.read(link & _POSITION_MASK).key, head_key)
+
+    def test_negative_lookup_decodes_no_records(self):
+        counter = CountingReads(self.table.store)
+        probe = self._probe_key()
+        self.assertIsNone(self.cog.get(probe))
+        self.assertIsNone(self.table.indexer.get_head_only(probe, self.table.store)[0])
+        self.assertFalse(self.table.indexer.delete(probe, self.table.store))
+        self.assertEqual(counter.count, 0)
+
+    def test_hit_decodes_only_matching_record(self):
+        counter = CountingReads(self.table.store)
+        record = self.cog.get(self.keys[0])  # tail of the chain
+        self.assertEqual(record.value, "value_key_0")
+        self.assertEqual(counter.count, 1)
+
+    def test_update_and_delete_inside_chain(self):
+        self.cog.put(Record("key_5", "updated"))
+        self.cog.delete("key_12")
+        self.assertEqual(self.cog.get("key_5").value, "updated")
+        self.assertIsNone(self.cog.get("key_12"))
+        scanned = {r.key: r.value for r in self.cog.scanner()}
+        self.assertEqual(len(scanned), 19)
+        self.assertEqual(scanned["key_5"], "updated")
+
+    def test_links_without_fingerprint_still_resolve(self):
+        """Indexes written by migrate carry bare positions (fingerprint 0)."""
+        store = self.table.store
+        index = self.table.indexer.live_index
+        link = struct.unpack_from('<q', index.db_mem, 0)[0]
+        index.db_mem[0:8] = struct.pack('<q', link & _POSITION_MASK)
+        position = link & _POSITION_MASK
+        while True:
+            next_link = store.read_key_link(position)
+            if next_link == Record.RECORD_LINK_NULL:
+                break
+            store.update_record_link_inplace(position, next_link & _POSITION_MASK)
+            position = next_link & _POSITION_MASK
+
+        for k in self.keys:
+            self.assertEqual(self.cog.get(k).value, "value_" + k)
+        self.assertIsNone(self.cog.get(self._probe_key()))
+
+        # Without fingerprints every record in the chain is a candidate;
+        # only keys are decoded until the match.
+        store.store_cache.clear()
+        counter = CountingReads(store)
+        key_reads = store.key_reads
+        self.assertEqual(self.cog.get(self.keys[0]).value, "value_key_0")
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(store.key_reads - key_reads, len(self.keys))
+        self.assertEqual(store.store_cache.size(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+"""Tests for online index growth (Indexer.grow)."""
+import os
+import shutil
+import unittest
+
+from cog.config import CogConfig
+from cog.core import Record, Table, _next_prime
+from cog.database import Cog
+
+DIR_NAME = "TestIndexGrowth"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestIndexGrowth(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=11)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _index_files(self, namespace, table_name):
+        data_dir = self.config.cog_data_dir(namespace)
+        return [f for f in os.listdir(data_dir)
+                if f.startswith(table_name + self.config.INDEX)]
+
+    def test_next_prime(self):
+        self.assertEqual(_next_prime(2), 2)
+        self.assertEqual(_next_prime(22), 23)
+        self.assertEqual(_next_prime(24), 29)
+        self.assertEqual(_next_prime(200006), 200009)
+
+    def test_index_grows_past_load_factor(self):
+        cog = Cog(config=self.config)
+        cog.create_or_load_namespace("grow")
+        cog.create_table("kv", "grow")
+        for i in range(500):
+            cog.put(Record("key_%d" % i, "value_%d" % i))
+
+        indexer = cog.current_table.indexer
+        indexer.finish_growth(cog.current_table.store)
+        live = indexer.live_index
+        self.assertGreater(live.capacity, 11)
+        self.assertLessEqual(live.key_count, live.capacity * self.config.INDEX_MAX_LOAD_FACTOR)
+        self.assertEqual(len(indexer.index_list), 1)
+        self.assertEqual(self._index_files("grow", "kv"), [os.path.basename(live.name)])
+
+        for i in range(500):
+            record = cog.get("key_%d" % i)
+            self.assertIsNotNone(record, "key_%d lost after growth" % i)
+            self.assertEqual(record.value, "value_%d" % i)
+        cog.close()
+
+    def test_grown_index_reopens_with_its_capacity(self):
+        cog = Cog(config=self.config)
+        cog.create_or_load_namespace("reopen")
+        cog.create_table("kv", "reopen")
+        for i in range(200):
+            cog.put(Record("key_%d" % i, "value_%d" % i))
+        capacity = cog.current_table.indexer.live_index.capacity
+        cog.close()
+
+        table = Table("kv", "reopen", cog.instance_id, self.config)
+        self.assertEqual(table.indexer.live_index.capacity, capacity)
+        for i in range(200):
+            record = table.indexer.get("key_%d" % i, table.store)
+            self.assertEqual(record.value, "value_%d" % i)
+        table.close()
+
+    def test_updates_deletes_and_sets_survive_growth(self):
+        cog = Cog(config=self.config)
+        cog.create_or_load_namespace("mixed")
+        cog.create_table("kv", "mixed")
+        for i in range(100):
+            cog.put(Record("key_%d" % i, "old_%d" % i))
+        for i in range(0, 100, 2):
+            cog.put(Record("key_%d" % i, "new_%d" % i))
+        for i in range(0, 100, 5):
+            cog.delete("key_%d" % i)
+        for i in range(20):
+            cog.put_set(Record("set_%d" % i, "a"))
+            cog.put_set(Record("set_%d" % i, "b"))
+
+        self.assertGreater(cog.current_table.indexer.live_index.capacity, 11)
+        for i in range(100):
+            record = cog.get("key_%d" % i)
+            if i % 5 == 0:
+                self.assertIsNone(record)
+            elif i % 2 == 0:
+                self.assertEqual(record.value, "new_%d" % i)
+            else:
+                self.assertEqual(record.value, "old_%d" % i)
+        for i in range(20):
+            self.assertEqual(sorted(cog.get("set_%d" % i).value), ["a", "b"])
+        scanned = sorted(r.key for r in cog.scanner())
+        self.assertEqual(len(scanned), 100 - 20 + 20)
+        cog.close()
+
+    def test_old_index_is_untouched_while_keys_move(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101)
+        cog = Cog(config=config)
+        cog.create_or_load_namespace("moving")
+        cog.create_table("kv", "moving")
+        for i in range(60):
+            cog.put(Record("key_%d" % i, "value_%d" % i))
+        table = cog.current_table
+        indexer, store = table.indexer, table.store
+        old_index = indexer.live_index
+        store.sync()
+        with open(old_index.name, 'rb') as f:
+            old_slots = f.read()
+        old_links = {slot: old_index.chain_positions(slot, store) for slot in range(old_index.capacity)}
+
+        indexer.grow(store)
+        for i in range(10):
+            cog.put(Record("key_%d" % i, "new_%d" % i))
+        cog.delete("key_59")
+        self.assertIsNotNone(indexer._growing)
+        self.assertEqual(len(indexer.index_list), 2)
+        self.assertIsNone(cog.get("key_59"))
+        for i in range(59):
+            self.assertEqual(cog.get("key_%d" % i).value, ("new_%d" if i < 10 else "value_%d") % i)
+        self.assertEqual(sorted(r.key for r in cog.scanner()), sorted("key_%d" % i for i in range(59)))
+        # Only the delete touched the old index's chains.
+        unchanged = {slot: chain for slot, chain in old_links.items()
+                     if old_index.chain_positions(slot, store) == chain}
+        self.assertGreaterEqual(len(unchanged), old_index.capacity - 1)
+        old_index.flush()
+        with open(old_index.name, 'rb') as f:
+            slots = f.read()
+        self.assertEqual(len(slots), len(old_slots))
+        self.assertLessEqual(sum(1 for off in range(0, len(slots), 8) if slots[off:off + 8] != old_slots[off:off + 8]), 1)
+        cog.close()
+
+        # Reopened mid-way, the table finds both indexes and carries on.
+        table = Table("kv", "moving", cog.instance_id, config)
+        indexer, store = table.indexer, table.store
+        self.assertEqual(len(indexer.index_list), 2)
+        self.assertIsNotNone(indexer._growing)
+        for i in range(59):
+            self.assertEqual(indexer.get("key_%d" % i, store).value, ("new_%d" if i < 10 else "value_%d") % i)
+        indexer.finish_growth(store)
+        self.assertEqual(len(indexer.index_list), 1)
+        self.assertEqual(self._index_files("moving", "kv"), [os.path.basename(indexer.live_index.name)])
+        self.assertIsNone(indexer.get("key_59", store))
+        self.assertEqual(indexer.get("key_30", store).value, "value_30")
+        self.assertEqual(len(list(indexer.scanner(store))), 59)
+        table.close()
+
+    def test_removals_during_growth_do_not_fall_back(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101)
+        cog = Cog(config=config)
+        cog.create_or_load_namespace("removed")
+        cog.create_table("kv", "removed")
+        for value in ("a", "b", "c"):
+            cog.put_list(Record("list", value))
+        table = cog.current_table
+        table.indexer.grow(table.store)
+        cog.remove_value("list", "a")
+        cog.remove_value("list", "b")
+        cog.remove_value("list", "c")
+        self.assertIsNotNone(table.indexer._growing)
+        self.assertIsNone(cog.get("list"))
+        self.assertNotIn("list", [r.key for r in cog.scanner()])
+        cog.close()
+
+        table = Table("kv", "removed", cog.instance_id, config)
+        self.assertEqual(len(table.indexer.index_list), 2)
+        self.assertIsNone(table.indexer.get("list", table.store))
+        table.indexer.finish_growth(table.store)
+        self.assertIsNone(table.indexer.get("list", table.store))
+        table.close()
+
+    def test_growth_disabled(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=11, INDEX_MAX_LOAD_FACTOR=0)
+        cog = Cog(config=config)
+        cog.create_or_load_namespace("fixed")
+        cog.create_table("kv", "fixed")
+        for i in range(100):
+            cog.put(Record("key_%d" % i, "value_%d" % i))
+        self.assertEqual(cog.current_table.indexer.live_index.capacity, 11)
+        self.assertEqual(cog.get("key_42").value, "value_42")
+        cog.close()
+
+    def test_key_count_estimated_on_reopen(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=1009)
+        cog = Cog(config=config)
+        cog.create_or_load_namespace("estimate")
+        cog.create_table("kv", "estimate")
+        for i in range(300):
+            cog.put(Record("key_%d" % i, "value_%d" % i))
+        self.assertEqual(cog.current_table.indexer.live_index.key_count, 300)
+        cog.close()
+
+        table = Table("kv", "estimate", cog.instance_id, config)
+        index = table.indexer.live_index
+        self.assertIsNone(index.key_count)
+        index.ensure_key_count()
+        self.assertAlmostEqual(index.key_count, 300, delta=30)
+        table.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Tests for the process-wide cache budget (cog.memory_governor)."""
+import os
+import shutil
+import unittest
+
+from cog.config import CogConfig
+from cog.core import Record
+from cog.database import Cog, hash_predicate
+from cog.memory_governor import MemoryGovernor, memory_governor
+from cog.torque import Graph
+
+DIR_NAME = "TestMemoryGovernor"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class FakeCache:
+
+    def __init__(self, hits=0, size=0):
+        self.hits = hits
+        self.size = size
+        self.budget = None
+
+    def size_bytes(self):
+        return self.size
+
+    def take_hits(self):
+        hits, self.hits = self.hits, 0
+        return hits
+
+    def set_budget(self, nbytes):
+        self.budget = nbytes
+        self.size = min(self.size, nbytes)
+
+
+class TestMemoryGovernor(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_budget_follows_hits(self):
+        governor = MemoryGovernor(4000)
+        hot, cold, idle = FakeCache(hits=300), FakeCache(hits=100), FakeCache(size=5000)
+        for name, cache in (("hot", hot), ("cold", cold), ("idle", idle)):
+            governor.register(name, cache)
+        self.assertEqual(idle.budget, 4000 // 3)
+        self.assertEqual(idle.size, 4000 // 3)
+        governor.note_growth(4000 // 16)
+        self.assertEqual(governor.rebalances, 1)
+        self.assertEqual([hot.budget, cold.budget, idle.budget], [333 + 2250, 333 + 750, 333])
+        governor.rebalance()
+        self.assertEqual(hot.budget, cold.budget)
+
+    def test_register_only_sizes_the_new_cache(self):
+        governor = MemoryGovernor(1600)
+        caches = [FakeCache(size=1600) for _ in range(4)]
+        for n, cache in enumerate(caches):
+            budgets = [c.budget for c in caches[:n]]
+            governor.register(n, cache)
+            self.assertEqual([c.budget for c in caches[:n]], budgets)
+            self.assertEqual(cache.budget, 1600 // (n + 1))
+        # Growth past a sixteenth of the budget rebalances every cache.
+        governor.note_growth(1600 // 16)
+        self.assertEqual(governor.rebalances, 1)
+        self.assertEqual([c.budget for c in caches], [400] * 4)
+        self.assertLessEqual(governor.size_bytes(), 1600)
+        governor.unregister(3, caches[3])
+        self.assertEqual(caches[0].budget, 400)
+        governor.rebalance()
+        self.assertEqual([c.budget for c in caches[:3]], [1600 // 3] * 3)
+
+    def test_unregister_only_removes_the_registered_cache(self):
+        governor = MemoryGovernor(1000)
+        first, second = FakeCache(), FakeCache()
+        governor.register("store", first)
+        governor.register("store", second)
+        governor.unregister("store", first)
+        self.assertEqual(governor.budget_of("store"), second.budget)
+        governor.unregister("store", second)
+        self.assertIsNone(governor.budget_of("store"))
+
+    def test_shared_per_budget_and_off_by_default(self):
+        self.assertIsNone(memory_governor(CogConfig()))
+        config = CogConfig(MAX_CACHE_BYTES=123456)
+        self.assertIs(memory_governor(config), memory_governor(CogConfig(MAX_CACHE_BYTES=123456)))
+
+    def test_graph_caches_stay_within_budget(self):
+        budget = 256 * 1024
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, MAX_CACHE_BYTES=budget)
+        g = Graph("g", config=config)
+        predicates = ["p%d" % i for i in range(40)]
+        g.put_batch([("v%d" % i, p, "w%d" % (i % 50)) for p in predicates for i in range(200)])
+        for _ in range(20):
+            self.assertEqual(g.v("v7").out("p3").all()['result'], [{'id': 'w7'}])
+        for p in predicates:
+            self.assertEqual(g.v("v1").out(p).count(), 1)
+        governor = g.cog.memory_governor
+        governor.rebalance()
+        self.assertLessEqual(governor.size_bytes(), budget)
+        hot = g.cog.get_table(hash_predicate("p3"), "g").store.store_cache
+        cold = g.cog.get_table(hash_predicate("p30"), "g").store.store_cache
+        self.assertGreaterEqual(hot.budget, cold.budget)
+        self.assertEqual(g.v("v9").out("p30").all()['result'], [{'id': 'w9'}])
+        g.close()
+
+    def test_set_cache_is_governed(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, MAX_CACHE_BYTES=200 * 1024)
+        cog = Cog(config=config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("sets", "ns")
+        for i in range(3000):
+            cog.put_set(Record("key%d" % i, "member"))
+        cog.memory_governor.rebalance()
+        self.assertLessEqual(cog._set_cache_budget.size_bytes(), cog._set_cache_budget.budget)
+        self.assertLess(len(cog.cache), 3000)
+        self.assertEqual(cog.get("key5").value, ["member"])
+        cog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
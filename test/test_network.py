@@ -79,6 +79,7 @@ class TestCogDBServer(unittest.TestCase):
         self.assertIn('nodes', response)
         self.assertIn('uptime_seconds', response)
         self.assertTrue(response['writable'])
+        self.assertIn('cache_hits', response['tables']['knows'])
     
     def test_query_simple(self):
         """POST /{graph}/query executes simple queries."""
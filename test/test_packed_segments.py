@@ -0,0 +1,111 @@
+"""Tests for packed adjacency segments — several set values per chain record."""
+import os
+import shutil
+import unittest
+
+from cog.bulk import BulkLoader
+from cog.config import CogConfig
+from cog.core import Record
+from cog.database import Cog, hash_predicate, out_nodes, in_nodes
+from cog.torque import Graph
+
+DIR_NAME = "TestPackedSegments"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+def chain_records(table, key):
+    head, _ = table.indexer.get_head_only(key, table.store)
+    records = [head]
+    while records[-1].value_link != Record.VALUE_LINK_NULL:
+        records.append(table.store.read(records[-1].value_link))
+    return records
+
+
+class TestPackedSegments(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, ADJACENCY_SEGMENT_SIZE=8)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_put_set_many_writes_segments(self):
+        cog = Cog(config=self.config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("kv", "ns")
+        cog.put_set_many("k", ["v%d" % i for i in range(20)] + ["v3"])
+        cog.put_set(Record("k", "v20"))
+        cog.put_set(Record("k", "v5"))
+        records = chain_records(cog.current_table, "k")
+        self.assertEqual([r.value if type(r.value) is str else len(r.value) for r in records], ["v20", 4, 8, 8])
+        self.assertEqual(records[1].value, ["v19", "v18", "v17", "v16"])
+        self.assertEqual(sorted(cog.get("k").value), sorted("v%d" % i for i in range(21)))
+        cog.close()
+
+    def test_list_order_across_segments(self):
+        cog = Cog(config=self.config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("kv", "ns")
+        table = cog.current_table
+        first = table.indexer.put_record(Record("k", ["c", "b", "a"], value_type='l'), table.store)
+        table.indexer.put_record(Record("k", "d", value_type='l', value_link=first), table.store)
+        self.assertEqual(cog.get("k").value, ["d", "c", "b", "a"])
+        cog.close()
+
+    def test_graph_put_batch_and_reopen(self):
+        triples = [("hub", "follows", "n%d" % i) for i in range(30)]
+        triples += [("n%d" % i, "follows", "hub") for i in range(3)]
+        g = Graph("g", config=self.config)
+        g.put_batch(triples)
+        g.put("hub", "follows", "late")
+        table = g.cog.get_table(hash_predicate("follows"), "g")
+        self.assertEqual(len(chain_records(table, out_nodes("hub"))), 5)
+        self.assertEqual(len(chain_records(table, in_nodes("hub"))), 1)
+        g.close()
+
+        g = Graph("g", config=self.config)
+        self.assertEqual(sorted(r['id'] for r in g.v("hub").out("follows").all()['result']),
+                         sorted(["late"] + ["n%d" % i for i in range(30)]))
+        self.assertEqual(sorted(r['id'] for r in g.v("hub").inc("follows").all()['result']),
+                         ["n0", "n1", "n2"])
+        g.delete("hub", "follows", "n7")
+        self.assertNotIn({'id': 'n7'}, g.v("hub").out("follows").all()['result'])
+        self.assertEqual(g.v("hub").out("follows").count(), 30)
+        g.close()
+
+    def test_compaction_packs_chains(self):
+        g = Graph("g", config=self.config)
+        for i in range(20):
+            g.put("hub", "follows", "n%d" % i)
+        table = g.cog.get_table(hash_predicate("follows"), "g")
+        self.assertEqual(len(chain_records(table, out_nodes("hub"))), 20)
+        newest = chain_records(table, out_nodes("hub"))[0].timestamp
+        g.compact()
+        table = g.cog.get_table(hash_predicate("follows"), "g")
+        records = chain_records(table, out_nodes("hub"))
+        self.assertEqual([len(r.value) for r in records], [4, 8, 8])
+        self.assertEqual(records[0].value, ["n19", "n18", "n17", "n16"])
+        self.assertEqual(records[0].timestamp, newest)
+        self.assertEqual(sorted(r['id'] for r in g.v("hub").out("follows").all()['result']),
+                         sorted("n%d" % i for i in range(20)))
+        g.close()
+
+    def test_bulk_loader_packs_chains(self):
+        path = DB_PATH + "/data.nt"
+        with open(path, "w") as f:
+            for i in range(20):
+                f.write('"hub" "follows" "n%02d" .\n' % i)
+        BulkLoader("g", config=self.config).add_triples(path).run()
+        g = Graph("g", config=self.config)
+        table = g.cog.get_table(hash_predicate("follows"), "g")
+        self.assertEqual([len(r.value) for r in chain_records(table, out_nodes("hub"))], [4, 8, 8])
+        self.assertEqual(g.v("hub").out("follows").count(), 20)
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
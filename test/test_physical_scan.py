@@ -0,0 +1,108 @@
+"""Tests for store-order table scans (Indexer.physical_scanner, SCAN_ORDER)."""
+import os
+import shutil
+import unittest
+
+from cog.config import CogConfig
+from cog.core import Record
+from cog.database import Cog
+from cog.torque import Graph
+
+DIR_NAME = "TestPhysicalScan"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestPhysicalScan(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=1009)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _open(self, config=None):
+        cog = Cog(config=config or self.config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("t", "ns")
+        for i in range(100):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        for i in range(0, 100, 4):
+            cog.put(Record("key%d" % i, "new%d" % i))
+        cog.delete("key1")
+        cog.put_set(Record("set", "a"))
+        cog.put_set(Record("set", "b"))
+        return cog
+
+    def test_same_records_in_store_order(self):
+        cog = self._open()
+        table = cog.current_table
+        indexer = table.indexer
+        by_slot = {r.key: r.value for r in indexer.scanner(table.store)}
+        gets = indexer.stats()['gets']
+        physical = [(r.key, r.value) for r in indexer.scanner(table.store, order="physical")]
+        self.assertEqual(indexer.stats()['gets'], gets)
+        self.assertEqual(dict(physical), by_slot)
+        self.assertEqual(len(physical), len(by_slot))
+        self.assertEqual(sorted(dict(physical)["set"]), ["a", "b"])
+        positions = [indexer.get_head_only(key, table.store)[1] for key, _ in physical]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual([key for key, _ in physical][:3], ["key2", "key3", "key5"])
+        cog.close()
+
+    def test_scan_while_the_index_grows(self):
+        cog = self._open()
+        table = cog.current_table
+        indexer = table.indexer
+        indexer.grow(table.store)
+        indexer._move_keys(table.store, 500)
+        cog.put(Record("key8", "moved"))
+        cog.put(Record("key4", "new4"))
+        self.assertEqual(len(indexer.index_list), 2)
+        by_slot = [(r.key, r.value) for r in indexer.scanner(table.store)]
+        physical = [(r.key, r.value) for r in indexer.scanner(table.store, order="physical")]
+        self.assertEqual(len(by_slot), 100)
+        self.assertEqual(sorted(physical), sorted(by_slot))
+        self.assertEqual(dict(physical)["key8"], "moved")
+        indexer.finish_growth(table.store)
+        self.assertEqual(sorted((r.key, r.value) for r in indexer.scanner(table.store)), sorted(by_slot))
+        cog.close()
+
+    def test_writes_during_the_scan(self):
+        cog = self._open()
+        table = cog.current_table
+        scan = table.indexer.physical_scanner(table.store)
+        first = next(scan)
+        self.assertEqual(first.key, "key2")
+        cog.put(Record("key3", "changed"))
+        cog.delete("key5")
+        cog.put(Record("key2", "after"))
+        cog.put(Record("added", "value"))
+        rest = {r.key: r.value for r in scan}
+        self.assertEqual(rest["key3"], "changed")
+        self.assertNotIn("key5", rest)
+        self.assertNotIn("key2", rest)
+        self.assertEqual(rest["key6"], "value6")
+        cog.close()
+
+    def test_graph_scans(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, SCAN_ORDER="physical")
+        g = Graph("g", config=config)
+        g.put_batch([("v%d" % i, "follows", "v%d" % ((i * 3) % 50)) for i in range(50)])
+        g.delete("v4", "follows", "v12")
+        self.assertEqual(g.v().count(), 50)
+        self.assertEqual(len(g.triples()), 49)
+        g.close()
+        physical = Graph("g", config=config)
+        triples = sorted(physical.triples())
+        physical.close()
+        slot_order = Graph("g", config=CogConfig(CUSTOM_COG_DB_PATH=DB_PATH))
+        self.assertEqual(sorted(slot_order.triples()), triples)
+        slot_order.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Tests for mmap access advice and frontier prefetch (sequential_access, prefetch)."""
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from cog import memory_view
+from cog.config import CogConfig
+from cog.core import Indexer, Record
+from cog.database import Cog
+from cog.torque import Graph, PREFETCH_MIN_FRONTIER
+
+DIR_NAME = "TestPrefetch"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, STORE_SEGMENT_BYTES=4096)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_prefetch_and_nested_sequential_access(self):
+        cog = Cog(config=self.config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("t", "ns")
+        for i in range(300):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        table = cog.current_table
+        self.assertGreater(table.store.segments(), 1)
+        table.indexer.prefetch(["key%d" % i for i in range(0, 300, 7)] + ["missing"], table.store)
+        table.store.prefetch([])
+        with table.indexer.sequential_access(table.store):
+            with table.store.sequential_access():
+                self.assertEqual(table.store._sequential_scans, 2)
+            self.assertEqual(len(list(cog.scanner())), 300)
+        self.assertEqual(table.store._sequential_scans, 0)
+        self.assertEqual(cog.get("key42").value, "value42")
+        cog.close()
+
+    def test_hop_over_prefetched_frontier(self):
+        n = PREFETCH_MIN_FRONTIER * 4
+        for use_memory_view in (False, True):
+            g = Graph("g", cog_home=DIR_NAME, cog_path_prefix="/tmp", use_memory_view=use_memory_view)
+            if use_memory_view is False:
+                for i in range(n):
+                    g.put("hub", "links", "v%d" % i)
+                    g.put("v%d" % i, "links", "w%d" % i)
+            expected = sorted("w%d" % i for i in range(n))
+            self.assertEqual(sorted(v['id'] for v in g.v("hub").out("links").out("links").all()['result']),
+                             expected)
+            self.assertEqual(sorted(v['id'] for v in g.v("hub").out("links").out("links").tag("x").all()['result']),
+                             expected)
+            self.assertEqual({v['id'] for v in g.v("hub").out("links").both("links").all()['result']},
+                             set(expected) | {"hub"})
+            g.close()
+
+    def test_memory_view_prefetches_what_it_has_not_loaded(self):
+        n = PREFETCH_MIN_FRONTIER * 4
+        g = Graph("g", cog_home=DIR_NAME, cog_path_prefix="/tmp", use_memory_view=False)
+        for i in range(n):
+            g.put("hub", "links", "v%d" % i)
+            g.put("v%d" % i, "links", "w%d" % i)
+        g.close()
+        prefetched = []
+        real_prefetch = Indexer.prefetch
+
+        def record_prefetch(indexer, keys, store):
+            prefetched.append(len(keys))
+            return real_prefetch(indexer, keys, store)
+
+        # One record per page leaves nearly the whole graph on disk.
+        with mock.patch.object(memory_view, "DEFAULT_PAGE_SIZE", 1), \
+                mock.patch.object(Indexer, "prefetch", record_prefetch):
+            g = Graph("g", cog_home=DIR_NAME, cog_path_prefix="/tmp")
+            expected = sorted("w%d" % i for i in range(n))
+            self.assertEqual(sorted(v['id'] for v in g.v("hub").out("links").out("links").all()['result']),
+                             expected)
+            self.assertTrue(prefetched)
+            self.assertGreaterEqual(max(prefetched), n - 1)
+            # The view now holds the frontier: nothing left to prefetch.
+            del prefetched[:]
+            self.assertEqual(sorted(v['id'] for v in g.v("hub").out("links").out("links").all()['result']),
+                             expected)
+            self.assertEqual(prefetched, [])
+            g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
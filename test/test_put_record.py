@@ -0,0 +1,81 @@
+"""Tests for Indexer.put_record — records linked before they are written."""
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from cog.config import CogConfig
+from cog.core import Record, Store
+from cog.database import Cog
+from cog.torque import Graph
+
+DIR_NAME = "TestPutRecord"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestPutRecord(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        # Few slots so keys share collision chains.
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=3, INDEX_MAX_LOAD_FACTOR=0)
+        self.cog = Cog(config=self.config)
+        self.cog.create_or_load_namespace("ns")
+        self.cog.create_table("kv", "ns")
+
+    def tearDown(self):
+        self.cog.close()
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_new_keys_and_head_updates_are_written_once(self):
+        with mock.patch.object(Store, 'update_record_link_inplace') as patch_link:
+            for i in range(30):
+                self.cog.put(Record("key_%d" % i, "a"))
+            self.cog.put(Record("key_29", "b"))
+            for i in range(5):
+                self.cog.put_list(Record("list", str(i)))
+                self.cog.put_set(Record("set", str(i)))
+        patch_link.assert_not_called()
+        self.assertEqual(self.cog.get("key_29").value, "b")
+        self.assertEqual(self.cog.get("key_0").value, "a")
+        self.assertEqual(self.cog.get("list").value, ["4", "3", "2", "1", "0"])
+        self.assertEqual(sorted(self.cog.get("set").value), ["0", "1", "2", "3", "4"])
+
+    def test_update_deep_in_chain_patches_only_the_predecessor(self):
+        for i in range(30):
+            self.cog.put(Record("key_%d" % i, "a"))
+        store = self.cog.current_table.store
+        with mock.patch.object(store, 'update_record_link_inplace',
+                               wraps=store.update_record_link_inplace) as patch_link:
+            self.cog.put(Record("key_0", "b"))
+        self.assertEqual(patch_link.call_count, 1)
+        self.assertEqual(self.cog.get("key_0").value, "b")
+        self.assertEqual(sorted(r.key for r in self.cog.scanner()), sorted("key_%d" % i for i in range(30)))
+
+    def test_on_disk_links_survive_reopen(self):
+        for i in range(30):
+            self.cog.put(Record("key_%d" % i, "v%d" % i))
+        for i in range(0, 30, 3):
+            self.cog.put(Record("key_%d" % i, "w%d" % i))
+        self.cog.close()
+        self.cog = Cog(config=self.config)
+        self.cog.create_or_load_namespace("ns")
+        self.cog.load_table("kv", "ns")
+        for i in range(30):
+            self.assertEqual(self.cog.get("key_%d" % i).value, ("w%d" if i % 3 == 0 else "v%d") % i)
+
+    def test_graph_put_batch(self):
+        g = Graph("g", config=self.config)
+        g.put_batch([("a", "follows", "b"), ("a", "follows", "c"), ("b", "follows", "c")])
+        g.put("c", "follows", "a")
+        self.assertEqual(sorted(r['id'] for r in g.v("a").out("follows").all()['result']), ["b", "c"])
+        self.assertEqual(sorted(r['id'] for r in g.v("c").inc("follows").all()['result']), ["a", "b"])
+        self.assertEqual(g.v("c").out("follows").all()['result'], [{'id': 'a'}])
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""Tests for verifying and rebuilding index files from stores (cog.repair)."""
+import os
+import shutil
+import struct
+import unittest
+
+from cog.codec import SpindleCodec
+from cog.config import CogConfig
+from cog.core import Record
+from cog.database import Cog
+from cog.repair import repair, main
+from cog.torque import Graph
+
+DIR_NAME = "TestRepair"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestRepair(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _graph(self):
+        g = Graph("g", config=self.config)
+        g.put_batch([("v%d" % i, "p%d" % (i % 3), "w%d" % (i % 7)) for i in range(200)])
+        g.delete("v1", "p1", "w1")
+        g.put("v2", "p2", "x", update=True)
+        triples = sorted(g.triples())
+        g.close()
+        return triples
+
+    def _files(self, marker):
+        data_dir = self.config.cog_data_dir("g")
+        return sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir) if marker in f)
+
+    def _table(self, name="t"):
+        cog = Cog(config=self.config)
+        cog.create_or_load_namespace("kv")
+        cog.create_table(name, "kv")
+        return cog
+
+    def test_healthy_graph_is_left_alone(self):
+        self._graph()
+        indexes = {path: os.path.getmtime(path) for path in self._files(self.config.INDEX)}
+        report = repair(DB_PATH, config=self.config, workers=1)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual((report['damaged'], report['rebuilt']), (0, 0))
+        self.assertEqual(len(report['tables']), 5)
+        self.assertEqual({path: os.path.getmtime(path) for path in self._files(self.config.INDEX)}, indexes)
+
+    def test_lost_indexes_are_rebuilt_in_parallel(self):
+        triples = self._graph()
+        for path in self._files(self.config.INDEX):
+            os.remove(path)
+        report = repair(DB_PATH, "g", workers=2, config=self.config)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual((report['damaged'], report['rebuilt']), (5, 5))
+        self.assertTrue(all(table['missing'] == table['keys'] for table in report['tables']))
+        g = Graph("g", config=self.config)
+        self.assertEqual(sorted(g.triples()), triples)
+        self.assertEqual(g.v("v2").out("p2").all()['result'], [{'id': 'x'}])
+        self.assertEqual(g.v("v1").out("p1").count(), 0)
+        g.put("v1", "p1", "w9")
+        self.assertEqual(g.v("v1").out("p1").all()['result'], [{'id': 'w9'}])
+        g.close()
+        self.assertEqual(repair(DB_PATH, config=self.config)['damaged'], 0)
+
+    def test_unindexed_writes_deletes_and_bad_links(self):
+        cog = self._table()
+        for i in range(50):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        cog.delete("key3")
+        table = cog.current_table
+        # A crash between the store append and the index update.
+        table.store.save(Record("key5", "newer"))
+        table.store.save(Record("late", "value"))
+        table.store.save_deletion("key6")
+        cog.close()
+
+        report = repair(DB_PATH, verify_only=True, config=self.config)['tables'][0]
+        self.assertEqual((report['keys'], report['deleted']), (49, 2))
+        self.assertEqual((report['stale'], report['missing'], report['extra'], report['broken']), (1, 1, 1, 0))
+        self.assertFalse(report['rebuilt'])
+
+        index_path = self._files_in("kv", self.config.INDEX)[0]
+        with open(index_path, 'r+b') as f:
+            f.write(struct.pack('<q', 1 << 40) * 20)
+        self.assertGreater(repair(DB_PATH, verify_only=True, config=self.config)['tables'][0]['broken'], 0)
+
+        report = repair(DB_PATH, config=self.config)
+        self.assertEqual(report['rebuilt'], 1)
+        cog = self._table()
+        self.assertEqual(cog.get("key5").value, "newer")
+        self.assertEqual(cog.get("late").value, "value")
+        self.assertIsNone(cog.get("key3"))
+        self.assertIsNone(cog.get("key6"))
+        self.assertTrue(all(cog.get("key%d" % i).value == "value%d" % i for i in range(50) if i not in (3, 5, 6)))
+        cog.close()
+
+    def test_torn_tail_is_truncated_and_filter_rebuilt(self):
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101, INDEX_BLOOM_BITS_PER_KEY=10)
+        cog = self._table()
+        for i in range(30):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        store_path = cog.current_table.store.store
+        cog.close()
+        size = os.path.getsize(store_path)
+        torn = SpindleCodec().encode_record(Record("key30", "value30" * 10))[:40]
+        with open(store_path, 'ab') as f:
+            f.write(torn)
+        for path in self._files_in("kv", self.config.INDEX_FILTER):
+            os.remove(path)
+
+        report = repair(DB_PATH, "kv", config=self.config)['tables'][0]
+        self.assertEqual(report['torn_bytes'], 40)
+        self.assertTrue(report['rebuilt'])
+        self.assertEqual(os.path.getsize(store_path), size)
+        self.assertEqual(len(self._files_in("kv", self.config.INDEX_FILTER)), 1)
+        cog = self._table()
+        index = cog.current_table.indexer.live_index
+        self.assertTrue(index.key_filter.might_contain("key29"))
+        self.assertIsNone(cog.get("missing"))
+        self.assertEqual(index.filtered, 1)
+        cog.put(Record("key30", "value30"))
+        self.assertEqual(cog.get("key30").value, "value30")
+        cog.close()
+
+    def test_command_line(self):
+        self._graph()
+        for path in self._files(self.config.INDEX)[:1]:
+            os.remove(path)
+        self.assertEqual(main([DB_PATH, "g", "--verify-only", "--workers", "1"]), 1)
+        self.assertEqual(main([DB_PATH, "g", "--workers", "1"]), 0)
+        self.assertEqual(main([DB_PATH, "--verify-only"]), 0)
+
+    def _files_in(self, namespace, marker):
+        data_dir = self.config.cog_data_dir(namespace)
+        return sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir) if marker in f)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests for point-in-time reads (Graph.as_of, cog.snapshot)."""
+import datetime
+import os
+import shutil
+import time
+import unittest
+
+from cog.config import CogConfig
+from cog.torque import Graph
+
+DIR_NAME = "TestSnapshot"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _ids(self, traversal):
+        return sorted(r['id'] for r in traversal.all()['result'])
+
+    def _history(self, g):
+        g.put("alice", "follows", "bob")
+        g.put("alice", "follows", "carol")
+        first = time.time_ns()
+        g.delete("alice", "follows", "bob")
+        g.put("dave", "follows", "alice")
+        g.put("alice", "likes", "tea")
+        second = time.time_ns()
+        g.put("alice", "follows", "erin", update=True)
+        return first, second
+
+    def test_reads_resolve_to_newest_version_at_time(self):
+        g = Graph("g", config=self.config)
+        first, second = self._history(g)
+
+        past = g.as_of(first)
+        self.assertEqual(self._ids(past.v("alice").out("follows")), ["bob", "carol"])
+        self.assertEqual(self._ids(past.v("bob").inc("follows")), ["alice"])
+        self.assertEqual(self._ids(past.v("alice").inc()), [])
+        self.assertEqual(self._ids(past.v()), ["alice", "bob", "carol"])
+
+        middle = g.as_of(second)
+        self.assertEqual(self._ids(middle.v("alice").out("follows")), ["carol"])
+        self.assertEqual(self._ids(middle.v("bob").inc("follows")), [])
+        self.assertEqual(sorted(middle.triples()),
+                         [("alice", "follows", "carol"), ("alice", "likes", "tea"), ("dave", "follows", "alice")])
+
+        self.assertEqual(sorted(g.as_of(time.time_ns()).triples()), sorted(g.triples()))
+        self.assertEqual(self._ids(g.v("alice").out("follows")), ["erin"])
+        self.assertEqual(self._ids(g.as_of(0).v()), [])
+        g.close()
+
+    def test_view_is_stable_while_writes_continue(self):
+        g = Graph("g", config=self.config)
+        g.put_batch([("v%d" % i, "next", "v%d" % (i + 1)) for i in range(20)])
+        view = g.as_of(time.time_ns())
+        scanned = []
+        for i, vertex in enumerate(view.v().all()['result']):
+            g.put("new%d" % i, "next", vertex['id'])
+            scanned.append(vertex['id'])
+        self.assertEqual(len(scanned), 21)
+        self.assertEqual(view.v().count(), 21)
+        self.assertEqual(self._ids(view.v("v3").inc("next")), ["v2"])
+        self.assertEqual(g.v().count(), 42)
+        g.close()
+
+    def test_datetime_and_vertex_dictionary(self):
+        g = Graph("g", config=self.config, vertex_dictionary=True)
+        g.put("alice", "follows", "bob")
+        time.sleep(0.002)
+        moment = datetime.datetime.now()
+        time.sleep(0.002)
+        g.put("alice", "follows", "carol")
+        self.assertEqual(self._ids(g.as_of(moment).v("alice").out("follows")), ["bob"])
+        self.assertEqual(self._ids(g.v("alice").out("follows")), ["bob", "carol"])
+        g.close()
+
+    def test_views_are_read_only_and_end_at_compaction(self):
+        g = Graph("g", config=self.config)
+        self._history(g)
+        view = g.as_of(time.time_ns())
+        self.assertEqual(self._ids(view.v("alice").out("follows")), ["erin"])
+        with self.assertRaises(RuntimeError):
+            view.put("x", "follows", "y")
+        with self.assertRaises(RuntimeError):
+            view.delete("alice", "follows", "erin")
+        self.assertEqual(self._ids(g.v("alice").out("follows")), ["erin"])
+
+        g.compact()
+        with self.assertRaises(RuntimeError):
+            view.v("alice").out("follows").all()
+        self.assertEqual(self._ids(g.as_of(time.time_ns()).v("alice").out("follows")), ["erin"])
+        g.close()
+
+    def test_times_before_a_compaction_are_refused(self):
+        g = Graph("g", config=self.config)
+        first, _ = self._history(g)
+        g.compact()
+        after = time.time_ns()
+        with self.assertRaisesRegex(RuntimeError, "compacted"):
+            g.as_of(first).v("alice").out("follows").all()
+        self.assertEqual(self._ids(g.as_of(after).v("alice").out("follows")), ["erin"])
+        g.close()
+
+        # The compaction time is kept in the catalog across reopen.
+        g = Graph("g", config=self.config)
+        with self.assertRaisesRegex(RuntimeError, "compacted"):
+            g.as_of(first).v("alice").out("follows").all()
+        self.assertEqual(self._ids(g.as_of(time.time_ns()).v("alice").out("follows")), ["erin"])
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -106,6 +106,38 @@ class TestSpindlePackRoundtrip(unittest.TestCase):
         with self.assertRaises(ValueError):
             packb("k", [1.0, "x", 2.0])
 
+    def test_list_of_strings(self):
+        values = ["alice", "", "b\u00f6b", "x" * 300]
+        self.assertEqual(_roundtrip("k", values), ("k", values))
+
+    def test_list_of_strings_with_non_string_raises(self):
+        with self.assertRaises(ValueError):
+            packb("k", ["a", 1.0])
+
+    def test_truncated_string_array_raises(self):
+        buf = packb("k", ["alpha", "beta"])
+        with self.assertRaises(ValueError):
+            unpackb(buf[:-2])
+
+    def test_list_of_integer_ids(self):
+        values = ["1024", "7", "-3", "0", "9223372036854775807", "-9223372036854775808"]
+        self.assertEqual(_roundtrip("k", values), ("k", values))
+        self.assertEqual(packb("k", values)[3:4], b"I")
+
+    def test_integer_ids_are_smaller_than_strings(self):
+        values = [str(i) for i in range(100000, 100512)]
+        self.assertLess(len(packb("k", values)), len(packb("k", [v + "x" for v in values])) // 3)
+
+    def test_non_canonical_integers_stay_strings(self):
+        for values in (["007"], ["-0"], ["+1"], ["1_000"], [" 1"], ["9223372036854775808"], ["1", "a"]):
+            self.assertEqual(packb("k", values)[3:4], b"S")
+            self.assertEqual(_roundtrip("k", values), ("k", values))
+
+    def test_truncated_integer_ids_raise(self):
+        buf = packb("k", ["100000", "200000"])
+        with self.assertRaises(ValueError):
+            unpackb(buf[:-1])
+
     def test_unknown_type_falls_back_to_str(self):
         # Documented fallback: unsupported value types are str()'d.
         self.assertEqual(_roundtrip("k", None), ("k", "None"))
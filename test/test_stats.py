@@ -0,0 +1,97 @@
+"""Tests for the per-table cache and I/O counters."""
+import os
+import shutil
+import unittest
+
+from cog.config import CogConfig
+from cog.core import Record, Table
+from cog.database import Cog
+from cog.torque import Graph
+
+DIR_NAME = "TestStats"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def test_table_counters(self):
+        os.makedirs(self.config.cog_data_dir("ns"))
+        table = Table("t", "ns", "instance", self.config)
+        for i in range(10):
+            table.indexer.put_record(Record("key%d" % i, "value"), table.store)
+        stats = table.stats()
+        self.assertEqual(stats['writes'], 10)
+        self.assertEqual(stats['flushes'], 10)
+        self.assertGreater(stats['bytes_written'], 0)
+
+        table.store.store_cache.clear()
+        table.indexer.get("key3", table.store)
+        table.indexer.get("key3", table.store)
+        table.indexer.get("missing", table.store)
+        stats = table.stats()
+        self.assertGreaterEqual(stats['cache_hits'], 1)
+        self.assertGreaterEqual(stats['cache_misses'], 1)
+        self.assertEqual(stats['mmap_reads'], stats['cache_misses'])
+        self.assertEqual(stats['file_reads'], 0)
+        self.assertEqual(stats['gets'], 3)
+        self.assertGreaterEqual(stats['chain_walks'], 2)
+        self.assertGreaterEqual(stats['chain_steps'], 2)
+        self.assertGreaterEqual(stats['longest_chain'], 1)
+        self.assertEqual(stats['indexes'], 1)
+        table.close()
+
+    def test_index_counters_survive_growth(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=11, INDEX_MAX_LOAD_FACTOR=0.75)
+        cog = Cog(config=config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("grow", "ns")
+        cog.put(Record("key0", "value"))
+        for _ in range(5):
+            cog.get("key0")
+        for i in range(1, 50):
+            cog.put(Record("key%d" % i, "value"))
+        stats = cog.table_stats("ns")["grow"]
+        self.assertGreater(stats['index_capacity'], 11)
+        self.assertEqual(stats['gets'], 5)
+        cog.close()
+
+    def test_cache_hits_not_reset_by_governor(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, MAX_CACHE_BYTES=1024 * 1024)
+        g = Graph("g", config=config)
+        g.put("alice", "follows", "bob")
+        g.refresh()
+        g.disable_memory_view()
+        for _ in range(3):
+            g.v("alice").out("follows").all()
+        cache = g.cog.get_table(g.cog.list_tables()[0], "g").store.store_cache
+        hits = cache.hits
+        self.assertEqual(cache.take_hits(), hits)
+        self.assertEqual(cache.take_hits(), 0)
+        self.assertEqual(cache.hits, hits)
+        g.close()
+
+    def test_graph_stats_by_predicate(self):
+        g = Graph("g", config=self.config)
+        g.put("alice", "follows", "bob")
+        g.put("bob", "likes", "carol")
+        g.disable_memory_view()
+        g.v("alice").out("follows").all()
+        stats = g.stats()
+        self.assertIn("follows", stats)
+        self.assertIn("likes", stats)
+        self.assertGreater(stats["follows"]["gets"], 0)
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Tests for preallocated store extents (STORE_EXTENT_BYTES)."""
+import os
+import shutil
+import struct
+import time
+import unittest
+from unittest import mock
+
+from cog.codec import V2_DATA_END_OFFSET
+from cog.config import CogConfig
+from cog.core import Record, store_segments
+from cog.database import Cog
+from cog.repair import repair
+from cog.snapshot import Snapshot
+
+DIR_NAME = "TestStoreExtents"
+DB_PATH = "/tmp/" + DIR_NAME
+COPY_PATH = DB_PATH + "Copy"
+EXTENT = 16384
+
+
+def _data_end(path):
+    with open(path, 'rb') as f:
+        f.seek(V2_DATA_END_OFFSET)
+        return struct.unpack('<q', f.read(8))[0]
+
+
+class TestStoreExtents(unittest.TestCase):
+
+    def setUp(self):
+        for path in (DB_PATH, COPY_PATH):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        os.makedirs(DB_PATH)
+
+    def tearDown(self):
+        for path in (DB_PATH, COPY_PATH):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+
+    def _open(self, path=DB_PATH, **overrides):
+        cog = Cog(config=CogConfig(CUSTOM_COG_DB_PATH=path, INDEX_CAPACITY=101, **overrides))
+        cog.create_or_load_namespace("ns")
+        cog.create_table("t", "ns")
+        return cog
+
+    def _fill(self, cog, n=400):
+        for i in range(n):
+            cog.put(Record("key%d" % i, "value%d" % i))
+            self.assertEqual(cog.get("key%d" % i).value, "value%d" % i)
+
+    def test_reads_after_writes_rarely_remap(self):
+        # A tiny record cache: reads go to the mapping.
+        cog = self._open(STORE_EXTENT_BYTES=EXTENT, STORE_CACHE_BYTES=64)
+        self._fill(cog)
+        store = cog.current_table.store
+        size = os.path.getsize(store.store)
+        self.assertEqual(size % EXTENT, 0)
+        self.assertLessEqual(store.stats()['remaps'], size // EXTENT)
+        data_size = store.size()
+        self.assertLess(data_size, size)
+        cog.close()
+        # Closed stores are cut back to their records.
+        self.assertEqual(os.path.getsize(store.store), data_size)
+        self.assertEqual(_data_end(store.store), 0)
+
+        cog = self._open(STORE_EXTENT_BYTES=EXTENT)
+        cog.put(Record("key400", "value400"))
+        self.assertEqual([r.key for r in cog.scanner()].count("key400"), 1)
+        for i in range(401):
+            self.assertEqual(cog.get("key%d" % i).value, "value%d" % i)
+        cog.close()
+
+        shutil.rmtree(DB_PATH)
+        plain = self._open(STORE_CACHE_BYTES=64)
+        self._fill(plain)
+        self.assertGreater(plain.current_table.store.stats()['remaps'], 100)
+        plain.close()
+
+    def test_saves_do_not_stat_the_store(self):
+        cog = self._open(STORE_EXTENT_BYTES=EXTENT)
+        store = cog.current_table.store
+        store.save(Record("first", "value"))
+        with mock.patch('cog.core.os.fstat', wraps=os.fstat) as fstat:
+            for i in range(400):
+                store.save(Record("key%d" % i, "value%d" % i * 20))
+        size = os.path.getsize(store.store)
+        self.assertGreater(size, EXTENT)
+        # One stat per extent the saves ran into, at most.
+        self.assertLessEqual(fstat.call_count, size // EXTENT)
+        cog.close()
+
+    def test_open_after_crash_finds_the_end_of_the_records(self):
+        cog = self._open(STORE_EXTENT_BYTES=EXTENT)
+        self._fill(cog)
+        cog.sync()
+        # Copied while open, as a crash would leave it: preallocated, with
+        # records written after the recorded end.
+        shutil.copytree(DB_PATH, COPY_PATH)
+        store_path = cog.current_table.store.store.replace(DB_PATH, COPY_PATH)
+        cog.close()
+        self.assertNotEqual(_data_end(store_path), 0)
+
+        report = repair(COPY_PATH, verify_only=True, workers=1)
+        self.assertEqual(report['damaged'], 0)
+        self.assertEqual(report['errors'], [])
+
+        copy = self._open(COPY_PATH, STORE_EXTENT_BYTES=EXTENT)
+        copy.put(Record("extra", "x"))
+        self.assertEqual(len(list(copy.scanner())), 401)
+        self.assertEqual(len(Snapshot(copy, time.time_ns()).get_table("t", "ns").indexer), 401)
+        copy.close()
+
+        # Opened without extents, the store is cut back straight away.
+        shutil.rmtree(COPY_PATH)
+        shutil.copytree(DB_PATH, COPY_PATH)
+        copy = self._open(COPY_PATH)
+        self.assertEqual(_data_end(store_path), 0)
+        self.assertEqual(len(list(copy.scanner())), 400)
+        copy.close()
+
+    def test_sealed_segments_are_not_preallocated(self):
+        cog = self._open(STORE_EXTENT_BYTES=EXTENT, STORE_SEGMENT_BYTES=4096)
+        self._fill(cog, 300)
+        paths = store_segments(cog.current_table.store.store)
+        self.assertGreater(len(paths), 2)
+        self.assertTrue(all(os.path.getsize(path) <= 4096 and _data_end(path) == 0 for path in paths[:-1]))
+        cog.close()
+        cog = self._open(STORE_EXTENT_BYTES=EXTENT, STORE_SEGMENT_BYTES=4096)
+        self.assertEqual(len(list(cog.scanner())), 300)
+        cog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Tests for segmented store files (STORE_SEGMENT_BYTES)."""
+import os
+import shutil
+import time
+import unittest
+
+from cog.config import CogConfig
+from cog.core import Record, store_segments, _SEGMENT_SHIFT
+from cog.database import Cog
+from cog.repair import repair
+from cog.torque import Graph
+
+DIR_NAME = "TestStoreSegments"
+DB_PATH = "/tmp/" + DIR_NAME
+
+
+class TestStoreSegments(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101, STORE_SEGMENT_BYTES=4096)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _open(self, config=None):
+        cog = Cog(config=config or self.config)
+        cog.create_or_load_namespace("ns")
+        cog.create_table("t", "ns")
+        return cog
+
+    def test_store_rolls_over_into_segments(self):
+        cog = self._open()
+        for i in range(300):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        store = cog.current_table.store
+        paths = store_segments(store.store)
+        self.assertGreater(len(paths), 2)
+        self.assertEqual(store.segments(), len(paths))
+        self.assertEqual(store.stats()['segments'], len(paths))
+        self.assertTrue(all(os.path.getsize(path) <= 4096 for path in paths))
+        _, position = cog.current_table.indexer.get_head_only("key299", store)
+        self.assertEqual(position >> _SEGMENT_SHIFT, len(paths) - 1)
+
+        # Updates and deletes relink records in sealed segments.
+        for i in range(0, 300, 3):
+            cog.put(Record("key%d" % i, "new%d" % i))
+        for i in range(1, 300, 3):
+            cog.delete("key%d" % i)
+        cog.close()
+
+        cog = self._open()
+        for i in range(300):
+            record = cog.get("key%d" % i)
+            if i % 3 == 1:
+                self.assertIsNone(record)
+            else:
+                self.assertEqual(record.value, ("new%d" if i % 3 == 0 else "value%d") % i)
+        cog.close()
+
+    def test_scan_by_segment(self):
+        # Large enough that the index does not grow and copy keys.
+        cog = self._open(CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=1009, STORE_SEGMENT_BYTES=4096))
+        for i in range(200):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        store = cog.current_table.store
+        everything = list(store.scan_headers())
+        by_segment = [entry for segment in range(store.segments()) for entry in store.scan_headers(segment)]
+        self.assertEqual(by_segment, everything)
+        self.assertEqual([key for _, key, _, _ in everything], ["key%d" % i for i in range(200)])
+        self.assertEqual([store.read(position).key for position, _, _, _ in everything[-3:]],
+                         ["key197", "key198", "key199"])
+        cog.close()
+
+    def test_segmented_graph_compaction_repair_and_history(self):
+        g = Graph("g", config=self.config)
+        g.put_batch([("v%d" % i, "follows", "v%d" % ((i * 7) % 100)) for i in range(100)])
+        middle = time.time_ns()
+        for i in range(0, 100, 2):
+            g.delete("v%d" % i, "follows", "v%d" % ((i * 7) % 100))
+        triples = sorted(g.triples())
+        self.assertEqual(len(g.as_of(middle).triples()), 100)
+
+        table = g.cog.get_table(g.cog.list_tables("g")[0], "g")
+        store_path = table.store.store
+        report = g.compact()
+        self.assertTrue(report)
+        self.assertEqual(sorted(g.triples()), triples)
+        self.assertFalse([f for f in os.listdir(os.path.dirname(store_path)) if f.endswith(".compact_backup")])
+        g.put("v1", "follows", "v2")
+        triples = sorted(g.triples())
+        g.close()
+
+        for name in os.listdir(os.path.dirname(store_path)):
+            if self.config.INDEX in name:
+                os.remove(os.path.join(os.path.dirname(store_path), name))
+        result = repair(DB_PATH, "g", config=self.config, workers=1)
+        self.assertEqual(result['errors'], [])
+        self.assertGreater(result['rebuilt'], 0)
+        g = Graph("g", config=self.config)
+        self.assertEqual(sorted(g.triples()), triples)
+        g.close()
+
+    def test_unsegmented_stores_keep_one_file(self):
+        cog = self._open(CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, INDEX_CAPACITY=101))
+        for i in range(300):
+            cog.put(Record("key%d" % i, "value%d" % i))
+        store = cog.current_table.store
+        self.assertEqual(store_segments(store.store), [store.store])
+        self.assertGreater(os.path.getsize(store.store), 4096)
+        cog.close()
+
+        # Turning segments on later keeps the existing file as segment 0.
+        cog = self._open()
+        cog.put(Record("late", "value"))
+        self.assertEqual(cog.current_table.store.segments(), 2)
+        self.assertEqual(cog.get("key5").value, "value5")
+        self.assertEqual(cog.get("late").value, "value")
+        cog.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -126,6 +126,31 @@ class TestSpindleCodecRoundTrip(unittest.TestCase):
             self.assertEqual(out.value, bytes([byte_val]) * 32,
                              f"roundtrip failed for byte 0x{byte_val:02x}")
 
+    def test_peek_key_at_skips_value(self):
+        embedding = Record("doc", [0.5] * 300)
+        embedding.timestamp = 7
+        linked = Record(b"\x00alice", ["bob", "carol"], value_type="l", key_link=99, value_link=3)
+        linked.timestamp = 8
+        first = self.codec.encode_record(embedding)
+        buf = b"pad" + first + self.codec.encode_record(linked)
+        self.assertEqual(self.codec.peek_key_at(buf, 3), ("doc", -1))
+        self.assertEqual(self.codec.peek_key_at(buf, 3 + len(first)), (b"\x00alice", 99))
+
+    def test_deletion_marker_header(self):
+        marker = Record("gone", "", value_type="d")
+        marker.timestamp = 9
+        raw = self.codec.encode_record(marker)
+        self.assertEqual(self.codec.decode_record(raw).value_type, "d")
+        self.assertEqual(self.codec.peek_header_at(raw, 0), ("gone", "d", 9, len(raw)))
+
+    def test_removal_keeps_its_value_link(self):
+        removal = Record("k", ["a", "b"], value_type="r", value_link=4242)
+        removal.timestamp = 9
+        raw = self.codec.encode_record(removal)
+        decoded = self.codec.decode_record(raw)
+        self.assertEqual((decoded.value_type, decoded.value, decoded.value_link), ("r", ["a", "b"], 4242))
+        self.assertEqual(self.codec.peek_header_at(raw, 0), ("k", "r", 9, len(raw)))
+
 
 class TestV2UpdateKeyLink(unittest.TestCase):
     """update_key_link must overwrite exactly 8 bytes at the given position
@@ -0,0 +1,144 @@
+"""Tests for graphs whose edge tables store dictionary vertex ids."""
+import os
+import shutil
+import unittest
+
+from cog.config import CogConfig
+from cog.database import hash_predicate, out_nodes
+from cog.torque import Graph
+from cog.vertex_dictionary import VertexDictionary
+
+DIR_NAME = "TestVertexDictionary"
+DB_PATH = "/tmp/" + DIR_NAME
+
+TRIPLES = [("alice", "follows", "bob"), ("bob", "follows", "carol"), ("alice", "follows", "carol"),
+           ("carol", "likes", "alice"), ("dave", "follows", "alice")]
+
+
+class TestVertexDictionary(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+        os.makedirs(DB_PATH)
+        self.config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH)
+
+    def tearDown(self):
+        if os.path.exists(DB_PATH):
+            shutil.rmtree(DB_PATH)
+
+    def _ids(self, traversal):
+        return sorted(r['id'] for r in traversal.all()['result'])
+
+    def test_queries_match_plain_graph(self):
+        plain = Graph("plain", config=self.config)
+        packed = Graph("packed", config=self.config, vertex_dictionary=True)
+        for g in (plain, packed):
+            g.put_batch(TRIPLES[:3])
+            for triple in TRIPLES[3:]:
+                g.put(*triple)
+        for use_memory_view in (True, False):
+            for g in (plain, packed):
+                g._use_memory_view = use_memory_view
+                g.refresh()
+            for query in (lambda g: g.v("alice").out("follows"),
+                          lambda g: g.v("alice").inc(),
+                          lambda g: g.v("bob").both("follows"),
+                          lambda g: g.v().out("follows").out("follows"),
+                          lambda g: g.v("alice").out("follows").has("follows", "carol")):
+                self.assertEqual(self._ids(query(packed)), self._ids(query(plain)))
+        self.assertEqual(sorted(packed.triples()), sorted(plain.triples()))
+        plain.close()
+        packed.close()
+
+    def test_edge_tables_hold_ids(self):
+        g = Graph("g", config=self.config, vertex_dictionary=True)
+        g.put_batch(TRIPLES)
+        dictionary = g.cog.vertex_dictionary("g")
+        table = g.cog.get_table(hash_predicate("follows"), "g")
+        record = table.indexer.get(out_nodes(str(dictionary.id_of("alice"))), table.store)
+        self.assertEqual(sorted(dictionary.names_of(record.value)), ["bob", "carol"])
+        self.assertIsNone(table.indexer.get(out_nodes("alice"), table.store))
+        self.assertNotIn(g.config.GRAPH_VERTEX_DICTIONARY_TABLE_NAME, g.all_predicates)
+        g.close()
+
+    def test_reopen_keeps_dictionary_and_ids(self):
+        g = Graph("g", config=self.config, vertex_dictionary=True)
+        g.put_batch(TRIPLES)
+        ids = {v: g.cog.vertex_dictionary("g").id_of(v) for v in ("alice", "bob", "carol", "dave")}
+        g.close()
+
+        g = Graph("g", config=self.config)
+        dictionary = g.cog.vertex_dictionary("g")
+        self.assertEqual(len(dictionary), 4)
+        self.assertEqual({v: dictionary.id_of(v) for v in ids}, ids)
+        g.put("erin", "follows", "alice")
+        self.assertEqual(dictionary.id_of("erin"), 4)
+        self.assertEqual(self._ids(g.v("alice").inc("follows")), ["dave", "erin"])
+        g.close()
+
+    def test_next_id_recovered_without_counter(self):
+        g = Graph("g", config=self.config, vertex_dictionary=True)
+        g.put_batch([("v%d" % i, "next", "v%d" % (i + 1)) for i in range(40)])
+        table = g.cog.vertex_dictionary("g").table
+        self.assertEqual(VertexDictionary(table).next_id, 41)
+        g.close()
+
+    def test_delete_and_update_edges(self):
+        g = Graph("g", config=self.config, vertex_dictionary=True)
+        g.put_batch(TRIPLES)
+        g.delete("alice", "follows", "bob")
+        g.delete("alice", "follows", "nobody")
+        self.assertEqual(self._ids(g.v("alice").out("follows")), ["carol"])
+        self.assertEqual(self._ids(g.v("bob").inc("follows")), [])
+        g.put("dave", "follows", "bob", update=True)
+        self.assertEqual(self._ids(g.v("dave").out("follows")), ["bob"])
+        self.assertEqual(self._ids(g.v("alice").inc("follows")), [])
+        g.close()
+
+    def test_only_empty_graph_can_be_switched(self):
+        g = Graph("g", config=self.config)
+        g.put("a", "b", "c")
+        g.close()
+        with self.assertRaises(ValueError):
+            Graph("g", config=self.config, vertex_dictionary=True)
+
+    def test_cache_is_bounded(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, VERTEX_DICTIONARY_CACHE_SIZE=10)
+        g = Graph("g", config=config, vertex_dictionary=True)
+        g.put_batch([("v%d" % i, "next", "v%d" % (i + 1)) for i in range(50)])
+        dictionary = g.cog.vertex_dictionary("g")
+        self.assertLessEqual(len(dictionary._ids), 10)
+        self.assertEqual(len(dictionary._names), len(dictionary._ids))
+        self.assertEqual(dictionary.name_of(dictionary.id_of("v3")), "v3")
+        self.assertEqual(self._ids(g.v("v7").out("next")), ["v8"])
+        self.assertLessEqual(dictionary.size_bytes(), 10)
+        g.close()
+
+    def test_cache_budgeted_by_governor(self):
+        config = CogConfig(CUSTOM_COG_DB_PATH=DB_PATH, MAX_CACHE_BYTES=8 * 1024 * 1024)
+        g = Graph("g", config=config, vertex_dictionary=True)
+        g.put_batch([("v%d" % i, "next", "v%d" % (i + 1)) for i in range(50)])
+        dictionary = g.cog.vertex_dictionary("g")
+        key = ("vertex-dictionary", id(dictionary))
+        self.assertEqual(g.cog.memory_governor.budget_of(key), dictionary.budget)
+        dictionary.set_budget(2000)
+        self.assertLessEqual(dictionary.size_bytes(), 2000)
+        self.assertLess(len(dictionary._ids), 50)
+        self.assertEqual(self._ids(g.v("v7").out("next")), ["v8"])
+        g.close()
+        self.assertIsNone(g.cog.memory_governor.budget_of(key))
+
+    def test_truncate_keeps_dictionary(self):
+        g = Graph("g", config=self.config, vertex_dictionary=True)
+        g.put_batch(TRIPLES)
+        g.truncate()
+        self.assertIsNotNone(g.cog.vertex_dictionary("g"))
+        g.put("x", "follows", "y")
+        self.assertEqual(g.cog.vertex_dictionary("g").id_of("x"), 0)
+        self.assertEqual(self._ids(g.v("x").out("follows")), ["y"])
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
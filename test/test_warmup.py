@@ -0,0 +1,71 @@
+"""Tests for lazy graph open and Graph.warmup (cog.warmup)."""
+import os
+import shutil
+import unittest
+
+from cog.config import CogConfig
+from cog.database import hash_predicate
+from cog.torque import Graph
+from cog.warmup import WARMUP_CHUNK
+
+DIR_NAME = "TestWarmup"
+
+
+class TestWarmup(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join("/tmp", DIR_NAME)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+        g = self._graph()
+        g.put_batch([("v{}".format(i), "follows", "v{}".format(i + 1)) for i in range(2000)])
+        g.put_batch([("v{}".format(i), "likes", "w{}".format(i)) for i in range(2000)])
+        g.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _graph(self):
+        return Graph("g", config=CogConfig(CUSTOM_COG_DB_PATH=self.path))
+
+    def test_open_reads_no_table(self):
+        g = self._graph()
+        self.assertEqual(g.cog.table_stats("g"), {})
+        self.assertEqual(g.v("v1").out("follows").all(), {'result': [{'id': 'v2'}]})
+        self.assertIn("follows", g.stats())
+        self.assertNotIn("likes", g.stats())
+        g.close()
+
+    def test_warmup_fills_the_cache(self):
+        g = self._graph()
+        report = g.warmup(["follows"], background=False)
+        self.assertTrue(report['complete'])
+        self.assertEqual(report['tables'], {hash_predicate("follows"): 4000})
+        reads = g.stats()["follows"]["mmap_reads"]
+        self.assertEqual(g.v("v7").out("follows").all(), {'result': [{'id': 'v8'}]})
+        self.assertEqual(g.stats()["follows"]["mmap_reads"], reads)
+        self.assertNotIn("likes", g.stats())
+        g.close()
+
+    def test_budget_and_background(self):
+        g = self._graph()
+        thread = g.warmup(budget_bytes=1000)
+        thread.join()
+        self.assertIsNone(thread.error)
+        report = thread.report
+        self.assertFalse(report['complete'])
+        self.assertGreaterEqual(report['bytes_read'], 1000)
+        self.assertLessEqual(report['records'], WARMUP_CHUNK)
+
+        thread = g.warmup()
+        for i in range(200):
+            g.put("x{}".format(i), "follows", "y")
+        thread.join()
+        self.assertIsNone(thread.error)
+        self.assertEqual(g.v("x5").out("follows").all(), {'result': [{'id': 'y'}]})
+        g.close()
+
+
+if __name__ == '__main__':
+    unittest.main()